@@ -1,42 +1,400 @@
 import streamlit as st
 import pandas as pd
-from fpdf import FPDF
-import gspread
-from google.oauth2.service_account import Credentials
 from datetime import datetime, timedelta, date
 import time
-
-# --- Helper: Safe append with retry ---
-def safe_append_row(worksheet, row, retries=3, delay=2):
-    for _ in range(retries):
+import uuid
+import threading
+from collections import Counter
+import profiling
+from profiling import SessionTotals, SlowLog
+from storage import ROW_ID, STOCK_HEADER, StorageError, build_row, open_storage
+from snapshot_cache import Snapshot, SnapshotCache
+from delta_sync import DeltaSync
+from local_snapshots import LocalSnapshots
+from write_queue import WriteQueue
+from write_batch import WriteBatch
+from stock_summary import build_company_dashboard, build_stock_summary
+from stock_index import StockIndex
+from stock_rollforward import STOCK_COLUMNS, delete_stock_entry, plan_stock_save
+from ledger_index import LedgerIndex, amount_text
+from receivables import AGING_BUCKETS, build_receivables
+from ledger_partitions import ROLLUP_TABLE, Rollups, archive_tables, close_periods, period_of, period_start
+from search_index import ColumnSearchIndex
+from request_scheduler import quota_class
+from row_index import RowIdIndex
+from schema import LEDGER_SCHEMA, STOCK_SCHEMA, TypedTable
+from pdf_export import StatementCache, statement_rows
+from bulk_import import file_digest, plan_ledger_import, plan_stock_import, read_chunks, write_in_chunks
+
+# --- Helper: Slow rerun log (rotating JSON lines, one per process) ---
+@st.cache_resource
+def get_slow_log():
+    profiling_cfg = st.secrets.get("profiling", {})
+    return SlowLog(
+        profiling_cfg.get("slow_log_path", "slow_reruns.jsonl"),
+        threshold_ms=profiling_cfg.get("slow_ms", 2000),
+        max_bytes=profiling_cfg.get("max_bytes", 1_000_000),
+        backups=profiling_cfg.get("backups", 3),
+    )
+
+# --- Helper: Close a rerun's profile (session totals + slow log) ---
+def finish_profile(profile, ended_early=False):
+    profile.finish(ended_early)
+    st.session_state.profile_totals.add(profile)
+    get_slow_log().maybe_log(profile, session=st.session_state.profile_session, view=st.session_state.get("active_view"))
+
+# --- Per-rerun profile: Sheets calls and script sections ---
+if "profile_totals" not in st.session_state:
+    st.session_state.profile_totals = SessionTotals()
+    st.session_state.profile_session = uuid.uuid4().hex[:8]
+previous_profile = st.session_state.get("rerun_profile")
+if previous_profile is not None and not previous_profile.finished:
+    # The last run was cut short by st.rerun() / st.stop()
+    finish_profile(previous_profile, ended_early=True)
+rerun_profile = profiling.start_rerun()
+st.session_state.rerun_profile = rerun_profile
+
+# --- Helper: Shared snapshot cache (one per process, shared by all sessions) ---
+@st.cache_resource
+def get_snapshot_cache():
+    cache_cfg = st.secrets.get("cache", {})
+    return SnapshotCache(
+        ttl=cache_cfg.get("ttl_seconds", 60),
+        max_entries=cache_cfg.get("max_entries", 32),
+    )
+
+snapshot_cache = get_snapshot_cache()
+
+# --- Helper: Rendered PDF statements (shared by all sessions) ---
+@st.cache_resource
+def get_statement_cache():
+    return StatementCache(max_entries=st.secrets.get("cache", {}).get("max_pdfs", 64))
+
+statement_cache = get_statement_cache()
+
+# --- STORAGE SETUP (Google Sheets or local SQLite, see [storage] in secrets) ---
+# Client, spreadsheet metadata and worksheet handles are created once per process
+@st.cache_resource
+def get_storage():
+    return open_storage(dict(st.secrets.get("storage", {})), st.secrets.get("service_account"))
+
+rerun_started = time.perf_counter()
+storage = get_storage()
+rerun_auth_seconds = time.perf_counter() - rerun_started
+rerun_metadata_start = storage.metadata_seconds
+
+# --- Helper: Background write queue (one per process) ---
+@st.cache_resource
+def get_write_queue():
+    queue_cfg = st.secrets.get("write_queue", {})
+    return WriteQueue(
+        storage,
+        path=queue_cfg.get("path", "pending_writes.db"),
+        base_delay=queue_cfg.get("base_delay", 1.0),
+        max_delay=queue_cfg.get("max_delay", 60.0),
+        max_attempts=queue_cfg.get("max_attempts", 8),
+        # The parked row drops out of the shared copy; open sessions redraw and warn
+        on_failed=lambda table: snapshot_cache.invalidate(storage.store_id, table, changed=True),
+    )
+
+write_queue = get_write_queue()
+
+# --- Helper: Delta sync (refresh expired snapshots with only the appended rows) ---
+@st.cache_resource
+def get_delta_sync():
+    cache_cfg = st.secrets.get("cache", {})
+    return DeltaSync(
+        storage,
+        samples=cache_cfg.get("probe_rows", 8),
+        full_every=cache_cfg.get("full_sync_seconds", 600),
+    )
+
+delta_sync = get_delta_sync()
+delta_enabled = st.secrets.get("cache", {}).get("delta_sync", True)
+
+# Ledger partitioning: "month" or "financial_year" (April to March)
+ledger_cfg = st.secrets.get("ledger", {})
+partition_scheme = ledger_cfg.get("partition", "month")
+# Bulk import: rows per append_rows call and the gap between calls (Sheets write quota)
+import_cfg = st.secrets.get("import", {})
+rerun_profile.lap("setup")
+
+# --- Helper: Local Parquet copy of every worksheet (fast first load after a restart, offline export) ---
+snapshot_cfg = st.secrets.get("snapshots", {})
+
+@st.cache_resource
+def get_local_snapshots():
+    if not snapshot_cfg.get("enabled", st.secrets.get("storage", {}).get("backend", "sheets") == "sheets"):
+        return None
+    return LocalSnapshots(snapshot_cfg.get("path", "snapshots"), storage.store_id)
+
+local_snapshots = get_local_snapshots()
+
+# --- Helper: Cache key of a table ---
+def cache_key(table):
+    return (storage.store_id, table)
+
+# --- Helper: Keep what was just read from the sheet on disk too ---
+def keep_local(table, values):
+    if local_snapshots is not None:
+        local_snapshots.save_later(table, values)
+    return values
+
+# --- Helper: Give rows without an ID one (written back by row number) ---
+def with_row_ids(table, values):
+    col = values[0].index(ROW_ID) if values and ROW_ID in values[0] else None
+    if not values or col is not None and all(col < len(row) and row[col] for row in values[1:]):
+        return values
+    # Rare (rows typed into the sheet): read again with the worker kept off the table
+    with write_queue.gate(table):
+        return storage.ensure_row_ids(table, storage.read(table))
+
+# --- Helper: Read a table, giving rows without an ID one first ---
+def read_table(table):
+    return keep_local(table, with_row_ids(table, storage.read(table)))
+
+# --- Helper: Rows appended since a snapshot; None means read it all again ---
+def read_new_rows(table, values):
+    if not delta_enabled:
+        return None
+    new_rows = write_queue.when_settled(table, lambda: delta_sync.tail(table, values))
+    # Rows added elsewhere without an ID get one on the next full read
+    if new_rows and ROW_ID in values[0]:
+        col = values[0].index(ROW_ID)
+        if not all(row[col] for row in new_rows):
+            return None
+    return new_rows
+
+# --- Helper: This rerun's snapshot of a table (cached read, writes still in the queue applied) ---
+# Kept for the whole rerun, so its values, frame and indexes agree even if
+# another session changes the table meanwhile
+rerun_snapshots = {}
+
+def table_snapshot(table):
+    snapshot = rerun_snapshots.get(table)
+    if snapshot is None:
+        values = snapshot_cache.get(
+            cache_key(table),
+            lambda: serve_local([table]).get(cache_key(table))
+            or delta_sync.full_read(table, lambda t: write_queue.read_through(t, read_table)),
+            refresh=lambda values: read_new_rows(table, values),
+        )
+        snapshot = rerun_snapshots[table] = snapshot_cache.snapshot(cache_key(table)) or Snapshot(values)
+    return snapshot
+
+# --- Helper: Cached table values, as this rerun sees them ---
+def load_sheet_values(table):
+    return table_snapshot(table).values
+
+# --- Helper: Read several tables in one request (writes still in the queue applied) ---
+def read_tables(tables):
+    def reader(tables):
+        fetched = storage.read_many(tables)
+        return {t: keep_local(t, with_row_ids(t, fetched.get(t, []))) for t in tables}
+
+    fetched = write_queue.read_many_through(tables, reader)
+    return {cache_key(t): delta_sync.full_read(t, lambda t: fetched[t]) for t in tables}
+
+# --- Helper: First read since start: the copy on disk now, the sheet checked in the background ---
+def serve_local(tables):
+    if local_snapshots is None:
+        return {}
+    served = {}
+    for table in local_snapshots.first_use(tables):
+        saved = local_snapshots.load(table)
+        if saved is not None:
+            served[cache_key(table)] = write_queue.read_through(table, lambda t: saved[0])
+    if served:
+        threading.Thread(target=revalidate, args=([k[1] for k in served],), daemon=True).start()
+    return served
+
+# --- Helper: Replace copies served from disk with the sheet (sessions redraw if it changed) ---
+def revalidate(tables):
+    try:
+        fresh = read_tables(tables)
+    except StorageError:
+        # The copy stays until the snapshot expires and is read again
+        return
+    for key, values in fresh.items():
+        snapshot_cache.replace(key, values)
+
+# --- Helper: Derived objects of several tables; only tables not cached are fetched ---
+def load_derived_many(tables, name, builder):
+    def loader(keys):
+        loaded = serve_local([k[1] for k in keys])
+        rest = [k[1] for k in keys if k not in loaded]
+        return {**loaded, **(read_tables(rest) if rest else {})}
+
+    missing = [t for t in tables if t not in rerun_snapshots]
+    loaded = snapshot_cache.get_many([cache_key(t) for t in missing], loader) if missing else {}
+    for t in missing:
+        rerun_snapshots[t] = snapshot_cache.snapshot(cache_key(t)) or Snapshot(loaded[cache_key(t)])
+    return {t: rerun_snapshots[t].derived(name, builder) for t in tables}
+
+# --- Helper: Drop cached snapshot after a write ---
+def invalidate_sheet(table):
+    snapshot_cache.invalidate(storage.store_id, table)
+
+# --- Helper: Index built once per cached snapshot ---
+def get_derived(table, name, builder):
+    return table_snapshot(table).derived(name, builder)
+
+# --- Helper: Typed frame of a table, converted once per snapshot ---
+def get_typed(table, schema):
+    return get_derived(table, "typed", lambda v: TypedTable(v, schema))
+
+# --- Helper: List cells that didn't parse ---
+def show_issues(table, typed):
+    if typed.issues:
+        with st.expander(f"⚠️ {len(typed.issues)} malformed cells in {table}"):
+            st.dataframe(pd.DataFrame(typed.issues[:500], columns=["Row", "Column", "Value"]), hide_index=True)
+
+# --- Helper: Balances carried forward from archived periods ---
+def get_rollups():
+    if ROLLUP_TABLE not in storage.tables():
+        return Rollups([])
+    return get_derived(ROLLUP_TABLE, "rollups", Rollups)
+
+# --- Helper: A party's archived rows, oldest period first (read only on request) ---
+def party_history(party):
+    frames = []
+    for table in archive_tables(storage.tables()):
+        archived = get_typed(table, LEDGER_SCHEMA).frame
+        frames.append(archived[archived["Party"] == party])
+    return frames
+
+# --- Helper: Statement rows, opening with the carried-forward balance ---
+def party_statement(party_data, carried):
+    rows = statement_rows(party_data)
+    if carried:
+        rows = [("Brought forward", "", "", amount_text(carried))] + rows
+    return rows
+
+# --- Helper: Bulk import of a CSV/Excel file (chunked writes, resumable) ---
+def bulk_import_section(kind, table, values, plan_file):
+    result = st.session_state.pop(f"import_result_{kind}", None)
+    if result:
+        st.success(f"✅ Imported {result} rows")
+    upload = st.file_uploader("CSV or Excel file", type=["csv", "xlsx", "xls"], key=f"import_file_{kind}")
+    if upload is None:
+        return
+    skip_duplicates = st.checkbox("Skip rows already in the sheet", value=True, key=f"import_skip_{kind}")
+
+    # The plan is kept until the file or the sheet changes
+    digest = file_digest(upload)
+    plan_key = (digest, table, len(values), skip_duplicates)
+    saved = st.session_state.get(f"import_plan_{kind}")
+    if saved is not None and saved[0] == plan_key:
+        plan = saved[1]
+    else:
         try:
-            worksheet.append_row(row)
-            return True
-        except gspread.exceptions.APIError:
-            time.sleep(delay)
-    st.error("❌ Failed to append row after retries.")
-    return False
-
-# --- Helper: Safe delete row with retry ---
-def safe_delete_row(worksheet, row_index, retries=3, delay=2):
-    for _ in range(retries):
+            with st.spinner("Checking file..."):
+                chunks = read_chunks(upload, upload.name, import_cfg.get("read_rows", 5000))
+                plan = plan_file(chunks, values, digest, skip_duplicates)
+        except ImportError:
+            st.error("❌ Reading Excel files needs the openpyxl package.")
+            return
+        except (ValueError, pd.errors.ParserError) as e:
+            st.error(f"❌ Could not read {upload.name}: {e}")
+            return
+        st.session_state[f"import_plan_{kind}"] = (plan_key, plan)
+
+    summary = plan.summary()
+    st.write(
+        f"Ready to add: {summary['to_write']} | Already imported: {summary['already_imported']} | "
+        f"Duplicates skipped: {summary['duplicates']} | Problems: {summary['problems']}"
+    )
+    if plan.renamed:
+        st.caption("Matched to existing names: " + ", ".join(plan.renamed))
+    if plan.problems:
+        with st.expander(f"⚠️ {len(plan.problems)} rows left out"):
+            st.dataframe(pd.DataFrame(plan.problems[:500], columns=["Line", "Problem"]), hide_index=True)
+    if not plan.rows:
+        return
+    st.dataframe(pd.DataFrame(plan.rows[:20], columns=values[0][:len(plan.rows[0])]).drop(columns=[ROW_ID]), hide_index=True)
+
+    if st.button(f"📥 Import {len(plan.rows)} rows", key=f"import_btn_{kind}"):
+        # Entries already queued go first, so they keep their place before the imported rows
+        if not write_queue.drain(table):
+            st.error("❌ Entries added here are still being saved, so nothing was imported. Try again in a minute.")
+            return
+        progress = st.progress(0.0, text="Importing...")
+        written = [0]
+
+        def on_chunk(done, total):
+            written[0] = done
+            progress.progress(done / total, text=f"{done} of {total} rows written")
+
         try:
-            worksheet.delete_rows(row_index)
-            return True
-        except gspread.exceptions.APIError:
-            time.sleep(delay)
-    st.error("❌ Failed to delete row after retries.")
-    return False
-
-# --- GOOGLE SHEETS SETUP ---
-creds = st.secrets["service_account"]
-scope = ["https://www.googleapis.com/auth/spreadsheets"]
-credentials = Credentials.from_service_account_info(creds, scopes=scope)
-
-gc = gspread.authorize(credentials)
-sheet_key = "1HjTAeI0yCGYySs-FnTpoiN4QShdRkdKomXyHi9uuKXY"
-sh = gc.open_by_key(sheet_key)
-worksheet = sh.sheet1
+            # Entries added meanwhile wait until the import is done. Only this
+            # table is held back, so other sessions keep reading and writing
+            with write_queue.gate(table):
+                write_in_chunks(
+                    storage, table, plan.rows, id_col=values[0].index(ROW_ID) if ROW_ID in values[0] else None,
+                    chunk_rows=import_cfg.get("chunk_rows", 500),
+                    min_interval=import_cfg.get("min_interval", 1.0),
+                    on_chunk=on_chunk,
+                )
+            st.session_state[f"import_result_{kind}"] = written[0]
+            st.session_state.pop(f"import_plan_{kind}", None)
+            invalidate_sheet(table)
+            st.rerun()
+        except StorageError as e:
+            invalidate_sheet(table)
+            st.session_state.pop(f"import_plan_{kind}", None)
+            st.error(f"❌ Import stopped after {written[0]} rows: {e}. Run it again with the same file to carry on.")
+
+# --- Helper: Queue an append; shown right away, written in the background ---
+def safe_append_row(table, row, header):
+    write_queue.append(table, row, row[header.index(ROW_ID)] if ROW_ID in header else None)
+    snapshot_cache.apply_append(cache_key(table), row)
+    return True
+
+# --- Helper: Check that a cached row is still the one with this ID (positions may be from an older snapshot) ---
+def row_is(row_id):
+    return (lambda row: row_id in row) if row_id else None
+
+# --- Helper: Queue a delete of several rows by ID (one request when flushed) ---
+def safe_delete_rows(table, row_ids):
+    row_index = get_derived(table, "row_ids", RowIdIndex)
+    hints = {row_id: row_index.sheet_row(row_id) for row_id in row_ids if row_id in row_index}
+    write_queue.delete(table, hints)
+    for row_id, row in sorted(hints.items(), key=lambda kv: kv[1], reverse=True):
+        snapshot_cache.apply_delete(cache_key(table), row - 2, expect=row_is(row_id))
+    return True
+
+# --- Helper: Delete a stock entry now (rows are found by ID) and roll the item's later rows forward ---
+def safe_delete_stock_entry(table, item_rows, index):
+    row_id = item_rows.at[index, ROW_ID.lower()]
+    deleted, in_step, batch, results = delete_stock_entry(
+        storage, table, load_sheet_values(table), item_rows, index, get_derived(table, "row_ids", RowIdIndex),
+    )
+    if in_step and not batch.stale:
+        snapshot_cache.apply_delete(cache_key(table), deleted - 2, expect=row_is(row_id))
+        for r in results:
+            if r["ok"]:
+                row, first_col, values = r["row"]
+                snapshot_cache.apply_update(cache_key(table), row - 2, first_col, values, expect=row_is(r["row_id"]))
+    else:
+        invalidate_sheet(table)
+    return deleted is not None, results, batch.api_calls
+
+# --- Helper: One line per parked write, for the unsaved-changes list ---
+def parked_row(op):
+    if op["op"] == "append":
+        change, detail = "➕ Add", " · ".join(cell for cell in op["payload"] if cell)
+    else:
+        change, detail = "🗑️ Delete", f"{len(op['payload'])} row(s)"
+    return {
+        "Change": change, "Row": detail, "Tries": op["attempts"], "Error": op["error"],
+        "Queued": time.strftime("%d %b %H:%M", time.localtime(op["created"])),
+    }
+
+# --- Helper: Queue parked writes again; the reload shows them while they wait ---
+def retry_parked(tables):
+    for table in tables:
+        write_queue.retry_failed(table)
+        invalidate_sheet(table)
 
 # --- LOGIN SYSTEM ---
 if "logged_in" not in st.session_state:
@@ -57,304 +415,583 @@ if not st.session_state.logged_in:
 
 # --- PAGE SETUP ---
 st.set_page_config(page_title="Papa Business App", layout="centered")
-tab1, tab2 = st.tabs(["📦 Business Record", "📊 Stock Manager"])
 
-# =============== 📦 BUSINESS RECORD TAB ===============
-with tab1:
-    st.title("📦 Business Record System")
-
-    # --- Load data from worksheet ---
-    data = worksheet.get_all_values()
-    df = pd.DataFrame(data[1:], columns=data[0])
-
-    # --- Sidebar Inputs ---
-    st.sidebar.header("➕ Add New Entry")
-    party = st.sidebar.text_input("Party Name")
-    item = st.sidebar.number_input("Item Amount ₹", min_value=0, step=100)
-    payment = st.sidebar.number_input("Payment Received ₹", min_value=0, step=100)
-    entry_date = st.sidebar.date_input("Date", datetime.now())
-
-    if st.sidebar.button("Add Entry"):
-        prev_balance = float(df[df["Party"] == party]["Balance"].iloc[-1]) if party in df["Party"].values else 0
-        new_balance = item - payment
-        new_row = [party, str(entry_date), str(item), str(payment), str(new_balance)]
-        if safe_append_row(worksheet, new_row):
-            st.success("✅ Entry Added Successfully!")
+# --- Live updates: redraw from the shared copy when another session changes it ---
+hub_cfg = st.secrets.get("hub", {})
+st.session_state.seen_version = snapshot_cache.version(storage.store_id)
+if st.session_state.pop("changed_elsewhere", False):
+    st.toast("🔄 Updated with changes from another device")
+
+@st.fragment(run_every=hub_cfg.get("poll_seconds", 5))
+def watch_shared_data():
+    # Compares version counters in memory only: no Sheets reads
+    if snapshot_cache.version(storage.store_id) != st.session_state.seen_version:
+        st.session_state.changed_elsewhere = True
+        st.rerun(scope="app")
+
+if hub_cfg.get("live_updates", True):
+    watch_shared_data()
+
+# --- Writes that kept failing: not in the sheet, so no longer shown ---
+parked_by_table = {}
+for op in write_queue.failed():
+    parked_by_table.setdefault(op["table"], []).append(op)
+for table, ops in parked_by_table.items():
+    st.warning(f"⚠️ {len(ops)} change(s) to {table} could not be saved and are not shown. Last error: {ops[-1]['error']}")
+    with st.expander(f"🧾 Unsaved changes to {table}"):
+        st.dataframe(pd.DataFrame([parked_row(op) for op in ops]), hide_index=True)
+        if st.button("🔁 Retry", key=f"retry_parked_{table}"):
+            retry_parked([table])
             st.rerun()
 
-    # --- Party Search & Suggestion ---
-    party_list = df["Party"].unique().tolist()
-    if "selected_party" not in st.session_state:
-        st.session_state.selected_party = ""
-
-    typed_party = st.text_input("🔍 Party Name", value=st.session_state.selected_party, placeholder="Type or select...")
-
-    party_suggestions = [p for p in party_list if typed_party.lower() in p.lower()]
-    if typed_party:
-        st.markdown("### 🔍 Suggestions:")
-        for s in party_suggestions[:5]:
-            if st.button(s, key=f"party_suggest_{s}"):
-                st.session_state.selected_party = s
-                typed_party = s
-
-    selected_party = typed_party
-
-    # --- Show Records ---
-    if selected_party:
-        st.subheader(f"📄 Records for {selected_party}")
-        party_data = df[df["Party"] == selected_party]
-        total_balance = party_data["Balance"].astype(float).sum()
-        st.markdown(f"<h4 style='color:#1f77b4;'>🧮 Total Balance for {selected_party}: ₹{total_balance}</h4>", unsafe_allow_html=True)
-
-        # --- Add mobile-friendly scroll style ---
-        st.markdown("""
-            <style>
-            .scrollable-table {
-                overflow-x: auto;
-                white-space: nowrap;
-            }
-            .scrollable-table th, .scrollable-table td {
-                padding: 8px 12px;
-                text-align: left;
-            }
-            </style>
-        """, unsafe_allow_html=True)
-
-        # --- Render Table ---
-        st.markdown("### 🧾 Entries")
-
-        for real_idx, row in party_data.iterrows():
-            with st.container():
-                cols = st.columns([2, 2, 2, 2, 1, 1])
-                cols[0].markdown(f"📅 **{row['Date']}**")
-                cols[1].markdown(f"💰 ₹{row['Amount']}")
-                cols[2].markdown(f"📥 ₹{row['Payment']}")
-                cols[3].markdown(f"🧾 ₹{row['Balance']}")
-                cols[4].markdown(f"🔢 {real_idx}")
-                if cols[5].button("❌", key=f"del_{real_idx}"):
-                    if safe_delete_row(worksheet, real_idx + 2):
-                        st.success("✅ Entry deleted")
-                        st.rerun()
-
-        # --- Generate PDF ---
-        def generate_pdf(party_name, party_data):
-            pdf = FPDF()
-            pdf.add_page()
-            pdf.set_font("Arial", size=12)
-            pdf.cell(200, 10, txt=f"Party: {party_name}", ln=True, align='L')
-            pdf.cell(200, 10, txt=" ", ln=True)
-            pdf.cell(40, 10, "Date", 1)
-            pdf.cell(40, 10, "Amount", 1)
-            pdf.cell(40, 10, "Payment", 1)
-            pdf.cell(40, 10, "Balance", 1)
-            pdf.ln()
-            for i, row in party_data.iterrows():
-                pdf.cell(40, 10, str(row["Date"]), 1)
-                pdf.cell(40, 10, f"Rs. {row['Amount']}", 1)
-                pdf.cell(40, 10, f"Rs. {row['Payment']}", 1)
-                pdf.cell(40, 10, f"Rs. {row['Balance']}", 1)
-                pdf.ln()
-            file_name = f"{party_name}_records.pdf"
-            pdf.output(file_name)
-            return file_name
-
-        if st.button("📥 Download PDF"):
-            party_data = df[df["Party"] == selected_party].reset_index(drop=True)
-            file_path = generate_pdf(selected_party, party_data)
-            with open(file_path, "rb") as f:
-                st.download_button("⬇️ Click to Download", f, file_name=file_path)
+# --- Cache stats ---
+with st.sidebar.expander("⚙️ Cache & Sync Stats"):
+    cache_stats = snapshot_cache.stats()
+    st.write(f"Hits: {cache_stats['hits']} | Misses: {cache_stats['misses']} | Evictions: {cache_stats['evictions']}")
+    st.write(f"Cached sheets: {cache_stats['entries']} | Hit rate: {cache_stats['hit_rate']:.0%}")
+    st.write(f"Data version: {st.session_state.seen_version} | Loads shared with other sessions: {cache_stats['shared_loads']}")
+    sync_stats = delta_sync.stats()
+    sync_totals = sync_stats["totals"]
+    st.write(
+        f"Syncs: {sync_totals.get('delta', 0)} delta ({sync_totals.get('delta_rows', 0)} rows, "
+        f"{sync_totals.get('delta_bytes', 0) / 1024:.0f} KB) | {sync_totals.get('full', 0)} full "
+        f"({sync_totals.get('full_rows', 0)} rows, {sync_totals.get('full_bytes', 0) / 1024:.0f} KB) | "
+        f"Changed in the middle: {sync_totals.get('changed', 0)}"
+    )
+    for table, last in sync_stats["last"].items():
+        st.caption(f"{table}: {last['mode']} sync at {last['at']}, {last['rows']} rows, {last['bytes']} bytes")
+    if storage.scheduler is not None:
+        quota = storage.scheduler.stats()
+        st.write(
+            f"Quota (last minute): reads {quota['read']['last_minute']}/{quota['read']['per_minute']}, "
+            f"writes {quota['write']['last_minute']}/{quota['write']['per_minute']} | "
+            f"Waited: {quota['read']['wait_seconds'] + quota['write']['wait_seconds']:.1f}s | "
+            f"Merged reads: {quota['coalesced']} | 429s: {quota['rate_limited']}"
+        )
+        # How many sessions at this one's pace the quotas would carry
+        session_minutes = max(1.0, (time.monotonic() - st.session_state.profile_totals.started) / 60)
+        pace = Counter()
+        for row in st.session_state.profile_totals.calls.table():
+            pace[quota_class(row["op"])] += row["calls"] / session_minutes
+        if pace:
+            capacity = min(quota[kind]["per_minute"] / rate for kind, rate in pace.items())
+            st.caption(
+                f"This session: {pace['read']:.1f} reads/min, {pace['write']:.1f} writes/min "
+                f"→ room for about {capacity:.0f} sessions like it"
+            )
+    if local_snapshots is not None:
+        saved = local_snapshots.tables()
+        if saved:
+            last_sync = max(info["synced_at"] for info in saved.values())
+            st.write(
+                f"Local copies: {len(saved)} sheets, {sum(info['bytes'] for info in saved.values()) / 1024:.0f} KB | "
+                f"Last sync {time.strftime('%d %b %H:%M', time.localtime(last_sync))} | "
+                f"Served from disk: {local_snapshots.metrics['served']}"
+            )
+            # Zipped only when clicked, off the script thread
+            st.download_button(
+                "💾 Download snapshots (Parquet)", local_snapshots.export_zip,
+                file_name="snapshots.zip", mime="application/zip", key="snapshot_export_btn",
+            )
+    if st.button("🔄 Refresh Data", key="refresh_cache_btn"):
+        snapshot_cache.clear()
+        st.rerun()
+
+    timing_slot = st.empty()
+
+    queue_stats = write_queue.stats()
+    st.write(f"Pending writes: {queue_stats['depth']} (oldest {queue_stats['oldest_age']}s) | Retries: {queue_stats['retries']}")
+    st.write(f"Written: {queue_stats['flushed']} in {queue_stats['flush_calls']} calls | Failed: {queue_stats['parked']}")
+    if queue_stats["last_error"]:
+        st.caption(f"Last error: {queue_stats['last_error']}")
+    if parked_by_table and st.button("🔁 Retry Failed Writes", key="retry_failed_writes"):
+        retry_parked(parked_by_table)
+        st.rerun()
+    st.checkbox("🐞 Show debug panel", key="show_debug_panel")
+rerun_profile.lap("sidebar")
+# Stateful tabs: only the open view loads its data and builds its tables
+tab1, tab2, tab3 = st.tabs(["📦 Business Record", "📊 Stock Manager", "🏬 All Companies"], key="active_view", on_change="rerun")
+view_timings = {}
 
-# =============== 📊 STOCK MANAGER TAB ===============
-with tab2:
-    # 📊 Main Tab: Stock Manager System (Date-wise)
-    st.title("📊 Stock Manager System (Date-wise)")
-
-    # 🏢 COMPANY MANAGEMENT SECTION
-    with st.container():
-        # 🏢 Select or Create Company
-        st.subheader("🏢 Select or Create Company")
-        sheet_list = [ws.title for ws in sh.worksheets() if ws.title != worksheet.title]
-        selected_company = st.selectbox("Choose Company", options=sheet_list + ["➕ Add New Company"], key="select_company_main")
-
-        if selected_company == "➕ Add New Company":
-            new_company_name = st.text_input("Enter new company name", key="new_company_input")
-            if st.button("✅ Create Company", key="create_company_button"):
-                if new_company_name and new_company_name not in sheet_list:
-                    new_ws = sh.add_worksheet(title=new_company_name, rows="1000", cols="10")
-                    new_ws.append_row(["item", "date", "current_stock", "new_stock", "sold_qty", "final_stock"])
-                    st.success(f"✅ Company '{new_company_name}' created successfully!")
-                    st.rerun()
-                else:
-                    st.warning("⚠️ Company name invalid or already exists.")
-            st.stop()
-
-        # 🗑️ Delete Company
-        st.divider()
-        st.subheader("🗑️ Delete Company")
-        delete_company = st.selectbox("Select company to delete", [s for s in sheet_list], key="delete_company_select")
-        if st.button("❌ Delete Selected Company", key="delete_company_button"):
-            if delete_company:
-                sh.del_worksheet(sh.worksheet(delete_company))
-                st.success(f"✅ Company '{delete_company}' deleted successfully!")
+# =============== 📦 BUSINESS RECORD TAB ===============
+with tab1:
+    if tab1.open:
+        view_started, view_reads = time.perf_counter(), snapshot_cache.misses
+        st.title("📦 Business Record System")
+
+        # --- Load data from the ledger ---
+        ledger = storage.ledger
+        data = load_sheet_values(ledger)
+        ledger_table = get_typed(ledger, LEDGER_SCHEMA)
+        df = ledger_table.frame
+        ledger_index = get_derived(ledger, "ledger_index", LedgerIndex)
+        rollups = get_rollups()
+        show_issues(ledger, ledger_table)
+
+        # --- Archive finished periods, so the ledger only holds the current one ---
+        current_period = period_of(date.today(), partition_scheme)
+        old_entries = int((df["Date"] < pd.Timestamp(period_start(date.today(), partition_scheme))).sum())
+        archive_result = st.session_state.pop("last_archive", None)
+        if archive_result:
+            st.success(f"🗄️ Archived {sum(archive_result.values())} entries from {', '.join(archive_result)}")
+        if old_entries:
+            st.info(f"🗄️ {old_entries} entries are from before {current_period}. Archive them to keep loading fast; balances carry forward.")
+            auto_archive = ledger_cfg.get("auto_archive", False) and not st.session_state.get("auto_archived")
+            if auto_archive or st.button("🗄️ Archive old periods", key="archive_periods_btn"):
+                st.session_state.auto_archived = True
+                try:
+                    # Queued ledger entries go first; the worker then keeps off the ledger only
+                    with st.spinner("Archiving old periods..."):
+                        drained = write_queue.drain(ledger)
+                        if drained:
+                            with write_queue.gate(ledger):
+                                st.session_state.last_archive = close_periods(storage, date.today(), partition_scheme)
+                    if drained:
+                        snapshot_cache.invalidate(storage.store_id)
+                        st.rerun()
+                    st.error("❌ Entries added here are still being saved, so nothing was archived. Try again in a minute.")
+                except StorageError as e:
+                    snapshot_cache.invalidate(storage.store_id)
+                    st.error(f"❌ Archiving stopped, run it again to finish: {e}")
+        rerun_profile.lap("ledger: load")
+
+        # --- Receivables of every party (built once per ledger snapshot and day) ---
+        with st.expander("📒 Receivables: who owes what, and for how long"):
+            today = date.today()
+            receivables = get_derived(ledger, f"receivables {today}", lambda v: build_receivables(
+                df, today, rollups.carried, period_start(today, partition_scheme) - timedelta(days=1),
+            ))
+            col1, col2 = st.columns(2)
+            owing_only = col1.checkbox("Only parties that owe", value=True, key="receivables_owing_only")
+            sort_by = col2.selectbox("Sort by", ["Outstanding"] + AGING_BUCKETS[::-1] + ["Days since payment"], key="receivables_sort")
+            shown = receivables[receivables["Outstanding"] > 0] if owing_only else receivables
+            # Never paid counts as the longest wait
+            shown = shown.sort_values(sort_by, ascending=False, na_position="first", kind="stable")
+            st.caption(
+                f"{len(shown)} parties · ₹{amount_text(shown['Outstanding'].sum())} outstanding · "
+                + " · ".join(f"{bucket}: ₹{amount_text(shown[bucket].sum())}" for bucket in AGING_BUCKETS)
+            )
+            st.dataframe(shown, hide_index=True, column_config={
+                "Last payment": st.column_config.DateColumn(format="YYYY-MM-DD"),
+                "Last entry": st.column_config.DateColumn(format="YYYY-MM-DD"),
+            })
+            st.download_button(
+                "⬇️ Download CSV", shown.to_csv(index=False, date_format="%Y-%m-%d").encode("utf-8"),
+                file_name=f"receivables_{today}.csv", mime="text/csv", key="receivables_csv",
+            )
+        rerun_profile.lap("ledger: receivables")
+
+        # --- Sidebar Inputs ---
+        st.sidebar.header("➕ Add New Entry")
+        party = st.sidebar.text_input("Party Name")
+        item = st.sidebar.number_input("Item Amount ₹", min_value=0, step=100)
+        payment = st.sidebar.number_input("Payment Received ₹", min_value=0, step=100)
+        entry_date = st.sidebar.date_input("Date", datetime.now())
+
+        if st.sidebar.button("Add Entry"):
+            prev_balance = rollups.balance(party) + ledger_index.balance(party)
+            new_balance = item - payment
+            running_balance = prev_balance + new_balance
+            header = data[0]
+            if "Running Balance" not in header:
+                header = header + ["Running Balance"]
+                storage.set_header(ledger, header)
+                invalidate_sheet(ledger)
+            new_row = build_row(header, {
+                "Party": party, "Date": entry_date, "Amount": item, "Payment": payment,
+                "Balance": new_balance, "Running Balance": amount_text(running_balance),
+            })
+            if safe_append_row(ledger, new_row, header):
+                st.success("✅ Entry Added Successfully!")
                 st.rerun()
-            else:
-                st.warning("⚠️ Please select a company.")
 
-    st.markdown("---")
+        # --- Party Search & Suggestion ---
+        party_search = get_derived(ledger, "party_search", lambda v: ColumnSearchIndex(v, "Party", extra=rollups.parties()))
+        if "selected_party" not in st.session_state:
+            st.session_state.selected_party = ""
 
-    if selected_company and selected_company != "➕ Add New Company":
-        # 📥 Load or Create DataFrame
-        stock_sheet = sh.worksheet(selected_company)
-        data = stock_sheet.get_all_values()
-        if data and len(data) > 1:
-            df = pd.DataFrame(data[1:], columns=[c.strip().lower() for c in data[0]])
-        else:
-            df = pd.DataFrame(columns=["item", "date", "current_stock", "new_stock", "sold_qty", "final_stock"])
-
-        # 📥 Add or Update Stock Entries
-        st.subheader(f"📥 Add or Update Stock for: {selected_company}")
-
-        item_names = df["item"].dropna().unique().tolist()
-
-        # ✅ Step 1: Session default set karo
-                # ✅ Session state default
-        if "selected_item" not in st.session_state:
-            st.session_state.selected_item = ""
+        typed_party = st.text_input("🔍 Party Name", value=st.session_state.selected_party, placeholder="Type or select...")
 
-        # ✅ Text input (manual typing or suggestion result)
-        typed_item = st.text_input("🧾 Item Name", value=st.session_state.selected_item, placeholder="Type to search or add")
-
-        # ✅ Suggestions based on typed input
-        suggestions = [name for name in item_names if typed_item.lower() in name.lower()]
-        if typed_item:
+        if typed_party:
             st.markdown("### 🔍 Suggestions:")
-            for s in suggestions[:5]:
-                if st.button(s, key=f"suggest_{s}"):
-                    st.session_state.selected_item = s
-                    typed_item = s  # Update displayed input without rerun
-
-        # ✅ Final usable item name
-        item_name = typed_item
-
-        selected_dates = st.date_input(
-            "📅 Select up to 10 dates",
-            [],
-            min_value=date(2023, 1, 1),
-            max_value=date.today(),
-            help="Max 10 dates",
-            key="date_input"
-        )
-        if isinstance(selected_dates, tuple) and len(selected_dates) == 2:
-            start_date, end_date = selected_dates
-            selected_dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
-        else:
-            selected_dates = list(selected_dates)
-
-        item_df = df[df["item"] == item_name]
-        if not item_df.empty:
-            item_df["date"] = pd.to_datetime(item_df["date"], errors="coerce")
-            latest_row = item_df.sort_values("date").iloc[-1]
-            autofill_stock = int(latest_row["final_stock"])
-        else:
-            autofill_stock = 0
-
-        current_stock = st.number_input("📦 Current Stock", min_value=0, value=autofill_stock)
-        new_stock = st.number_input("➕ New Stock Arrived", min_value=0, key="new_stock_input")
-
-        sold_entries = {}
-        for dt in selected_dates:
-            sold = st.number_input(
-                f"📤 Sold on {dt.strftime('%d %b %Y')}",
-                min_value=0,
-                key=f"sold_{dt.strftime('%Y%m%d')}"
+            for s in party_search.search(typed_party, limit=5):
+                if st.button(s, key=f"party_suggest_{s}"):
+                    st.session_state.selected_party = s
+                    typed_party = s
+
+        selected_party = typed_party
+        rerun_profile.lap("ledger: add entry + search")
+
+        # --- Show Records ---
+        if selected_party:
+            st.subheader(f"📄 Records for {selected_party}")
+            party_data = df.iloc[ledger_index.rows(selected_party)]
+            carried = rollups.balance(selected_party)
+            total_balance = carried + ledger_index.balance(selected_party)
+            st.markdown(f"<h4 style='color:#1f77b4;'>🧮 Total Balance for {selected_party}: ₹{total_balance}</h4>", unsafe_allow_html=True)
+
+            # --- Closed periods: carried-forward balance, full history on request ---
+            closed = rollups.periods(selected_party)
+            show_history = False
+            if closed:
+                st.caption(f"Brought forward from closed periods: ₹{amount_text(carried)} · this view shows {current_period} onwards")
+                with st.expander("📅 Closing balance per period"):
+                    st.dataframe(pd.DataFrame(closed, columns=["Period", "Entries", "Net", "Closing Balance"]), hide_index=True)
+                show_history = st.checkbox("📜 Show full history (loads archived periods)", key="show_full_history")
+                if show_history:
+                    party_data = pd.concat(party_history(selected_party) + [party_data], ignore_index=True)
+
+            # --- Add mobile-friendly scroll style ---
+            st.markdown("""
+                <style>
+                .scrollable-table {
+                    overflow-x: auto;
+                    white-space: nowrap;
+                }
+                .scrollable-table th, .scrollable-table td {
+                    padding: 8px 12px;
+                    text-align: left;
+                }
+                </style>
+            """, unsafe_allow_html=True)
+
+            # --- Render Table (one page at a time) ---
+            st.markdown("### 🧾 Entries")
+
+            page_cols = st.columns([2, 1, 1])
+            sort_order = page_cols[0].radio("Sort by date", ["Newest first", "Oldest first"], horizontal=True, key="entries_sort")
+            page_size = page_cols[1].selectbox("Rows", [25, 50, 100], key="entries_page_size")
+            page_count = max(1, -(-len(party_data) // page_size))
+            if st.session_state.get("entries_page", 1) > page_count:
+                st.session_state.entries_page = page_count
+            page = page_cols[2].number_input("Page", min_value=1, max_value=page_count, value=1, key="entries_page")
+
+            ordered = party_data.sort_values(
+                "Date", ascending=(sort_order == "Oldest first"), kind="stable", na_position="last"
+            )
+            page_rows = ordered.iloc[(page - 1) * page_size:page * page_size]
+            st.caption(f"Page {page} of {page_count} · {len(party_data)} entries")
+
+            view_cols = [c for c in ["Date", "Amount", "Payment", "Balance", "Running Balance"] if c in data[0]]
+            page_view = page_rows[view_cols].copy()
+            page_view.insert(0, "🗑️", False)
+            page_view[ROW_ID] = page_rows[ROW_ID]
+            edited = st.data_editor(
+                page_view,
+                hide_index=True,
+                disabled=view_cols + [ROW_ID] + (["🗑️"] if show_history else []),
+                column_config={ROW_ID: None, "Date": st.column_config.DateColumn(format="YYYY-MM-DD")},
+                key=f"entries_{selected_party}_{page}_{sort_order}_{page_size}",
             )
-            sold_entries[str(dt)] = sold
-
-        if st.button("💾 Save Stock Entry", key="save_stock_btn"):
-            df["date"] = pd.to_datetime(df["date"], errors="coerce")
-            final = current_stock
-
-            for dt_str, sold_qty in sold_entries.items():
-                dt_obj = pd.to_datetime(dt_str).strftime("%Y-%m-%d")
-                mask = (df["item"] == item_name) & (df["date"].dt.strftime("%Y-%m-%d") == dt_obj)
-
-                if mask.any():
-                    row_idx = df[mask].index[0] + 2
-                    old_sold = int(df.loc[mask, "sold_qty"].values[0])
-                    new_sold = old_sold + sold_qty
-                    final = final + new_stock - sold_qty
-                    stock_sheet.update(f"C{row_idx}:F{row_idx}", [[current_stock, new_stock, new_sold, final]])
-                else:
-                    final = final + new_stock - sold_qty
-                    new_row = [item_name, dt_obj, current_stock, new_stock, sold_qty, final]
-                    stock_sheet.append_row([str(x) for x in new_row])
-
-                current_stock = final
-                new_stock = 0
-
-            st.success("✅ Stock data saved successfully!")
-            st.rerun()
 
-        # 📊 Stock Summary Table
-        st.subheader("📊 Filtered Stock Summary")
+            rerun_profile.lap("ledger: entries table")
 
-        summary_range = st.date_input(
-            "📅 Select date range (max 10 days)",
-            [],
-            min_value=date(2023, 1, 1),
-            max_value=date.today(),
-            help="Choose 7–10 days for summary"
-        )
-        if isinstance(summary_range, tuple) and len(summary_range) == 2:
-            s_date, e_date = summary_range
-            summary_dates = [s_date + timedelta(days=i) for i in range((e_date - s_date).days + 1)]
-        else:
-            summary_dates = list(summary_range)
-
-        if summary_dates:
-            df["date"] = pd.to_datetime(df["date"], errors="coerce")
-            summary_data = df[df["date"].isin(summary_dates)]
-            all_items = df["item"].dropna().unique()
+            selected_rows = edited.loc[edited["🗑️"], ROW_ID].tolist()
+            if selected_rows and st.button(f"❌ Delete {len(selected_rows)} selected", key="delete_selected_entries"):
+                if safe_delete_rows(ledger, selected_rows):
+                    st.success("✅ Entries deleted")
+                    st.rerun()
 
-            summary_rows = []
+            # --- Generate PDF ---
+            if st.button("📥 Download PDF"):
+                pdf_bytes = statement_cache.statement(selected_party, party_statement(party_data, 0 if show_history else carried))
+                st.download_button("⬇️ Click to Download", pdf_bytes, file_name=f"{selected_party}_records.pdf", mime="application/pdf")
+            rerun_profile.lap("ledger: delete + pdf")
+
+        # --- Bulk PDF Export ---
+        with st.expander("📦 Bulk PDF Export"):
+            all_parties = sorted(set(ledger_index.parties()) | set(rollups.parties()))
+            export_parties = st.multiselect("Parties (leave empty for all)", all_parties, key="bulk_pdf_parties")
+            if st.button("🗂️ Build ZIP", key="bulk_pdf_button"):
+                with st.spinner("Rendering statements..."):
+                    zip_bytes = statement_cache.statements_zip({
+                        p: party_statement(df.iloc[ledger_index.rows(p)], rollups.balance(p))
+                        for p in (export_parties or all_parties)
+                    })
+                st.download_button("⬇️ Download ZIP", zip_bytes, file_name="statements.zip", mime="application/zip")
+        rerun_profile.lap("ledger: bulk export")
+
+        # --- Bulk Import ---
+        with st.expander("📥 Bulk Import (CSV / Excel)"):
+            st.caption("Columns: Party, Date, Amount (or Item Amount), Payment. Balances are worked out here.")
+            bulk_import_section("ledger", ledger, data, lambda chunks, values, digest, skip: plan_ledger_import(
+                chunks, values, digest,
+                parties=ledger_index.parties() + rollups.parties(),
+                opening=lambda p: rollups.balance(p) + ledger_index.balance(p),
+                skip_duplicates=skip,
+            ))
+        rerun_profile.lap("ledger: bulk import")
+
+        view_timings["📦 Business Record"] = (time.perf_counter() - view_started, snapshot_cache.misses - view_reads)
 
-            for item in all_items:
-                item_data = df[df["item"] == item]
-                item_summary = {
-                    "item": item,
-                    "current stock": item_data.sort_values("date")["final_stock"].dropna().iloc[-1] if not item_data.empty else 0,
-                    "new stock": int(summary_data[summary_data["item"] == item]["new_stock"].astype(float).sum())
-                }
-                for dt in summary_dates:
-                    dt_str = dt.strftime("%d %b")
-                    sold_qty = df[
-                        (df["item"] == item) & (df["date"] == pd.to_datetime(dt))
-                    ]["sold_qty"]
-
-                    item_summary[dt_str] = int(float(sold_qty.sum())) if not sold_qty.empty else 0
-
-                item_summary["total sold"] = sum(item_summary[dt.strftime("%d %b")] for dt in summary_dates)
-                summary_rows.append(item_summary)
-
-            summary_df = pd.DataFrame(summary_rows)
-            st.dataframe(summary_df)
-
-        # ❌ Delete Item Entry
-        st.subheader("➖ Delete Item Entry")
-        if st.checkbox("Enable Delete Mode", key="delete_mode_checkbox"):
-            if not df.empty and "item" in df.columns:
-                del_item = st.selectbox("Select item to delete", df["item"].unique().tolist())
-                del_date = st.date_input("Select date to delete entry")
-                if st.button("❌ Confirm Delete", key="delete_row_btn"):
-                    mask = (df["item"] == del_item) & (df["date"] == pd.to_datetime(str(del_date)))
-                    idx_to_del = df[mask].index
-                    if not idx_to_del.empty:
-                        stock_sheet.delete_rows(int(idx_to_del[0]) + 2)
-                        st.success("✅ Entry Deleted")
+# =============== 📊 STOCK MANAGER TAB ===============
+with tab2:
+    if tab2.open:
+        view_started, view_reads = time.perf_counter(), snapshot_cache.misses
+        # 📊 Main Tab: Stock Manager System (Date-wise)
+        st.title("📊 Stock Manager System (Date-wise)")
+
+        # 🏢 COMPANY MANAGEMENT SECTION
+        with st.container():
+            # 🏢 Select or Create Company
+            st.subheader("🏢 Select or Create Company")
+            sheet_list = storage.companies()
+            selected_company = st.selectbox("Choose Company", options=sheet_list + ["➕ Add New Company"], key="select_company_main")
+
+            if selected_company == "➕ Add New Company":
+                new_company_name = st.text_input("Enter new company name", key="new_company_input")
+                if st.button("✅ Create Company", key="create_company_button"):
+                    if new_company_name and new_company_name not in sheet_list:
+                        storage.create_company(new_company_name)
+                        invalidate_sheet(new_company_name)
+                        st.success(f"✅ Company '{new_company_name}' created successfully!")
                         st.rerun()
                     else:
-                        st.warning("❗ Entry not found")
+                        st.warning("⚠️ Company name invalid or already exists.")
+                st.stop()
+
+            # 🗑️ Delete Company
+            st.divider()
+            st.subheader("🗑️ Delete Company")
+            delete_company = st.selectbox("Select company to delete", [s for s in sheet_list], key="delete_company_select")
+            if st.button("❌ Delete Selected Company", key="delete_company_button"):
+                if delete_company:
+                    storage.delete_company(delete_company)
+                    invalidate_sheet(delete_company)
+                    st.success(f"✅ Company '{delete_company}' deleted successfully!")
+                    st.rerun()
+                else:
+                    st.warning("⚠️ Please select a company.")
+
+        st.markdown("---")
+        rerun_profile.lap("stock: companies")
+
+        if selected_company and selected_company != "➕ Add New Company":
+            # 📥 Load or Create DataFrame
+            data = load_sheet_values(selected_company)
+            stock_header = data[0] if data else STOCK_HEADER
+            stock_table = get_typed(selected_company, STOCK_SCHEMA)
+            df = stock_table.frame
+            show_issues(selected_company, stock_table)
+            row_id_col = ROW_ID.lower()
+            stock_ids = get_derived(selected_company, "row_ids", RowIdIndex)
+            stock_index = get_derived(selected_company, "stock_index", StockIndex)
+            rerun_profile.lap("stock: load")
+
+            # 📥 Add or Update Stock Entries
+            st.subheader(f"📥 Add or Update Stock for: {selected_company}")
+
+            item_search = get_derived(selected_company, "item_search", lambda v: ColumnSearchIndex(v, "item"))
+
+            # ✅ Step 1: Session default set karo
+                    # ✅ Session state default
+            if "selected_item" not in st.session_state:
+                st.session_state.selected_item = ""
+
+            # ✅ Text input (manual typing or suggestion result)
+            typed_item = st.text_input("🧾 Item Name", value=st.session_state.selected_item, placeholder="Type to search or add")
+
+            # ✅ Suggestions based on typed input
+            if typed_item:
+                st.markdown("### 🔍 Suggestions:")
+                for s in item_search.search(typed_item, limit=5):
+                    if st.button(s, key=f"suggest_{s}"):
+                        st.session_state.selected_item = s
+                        typed_item = s  # Update displayed input without rerun
+
+            # ✅ Final usable item name
+            item_name = typed_item
+
+            selected_dates = st.date_input(
+                "📅 Select up to 10 dates",
+                [],
+                min_value=date(2023, 1, 1),
+                max_value=date.today(),
+                help="Max 10 dates",
+                key="date_input"
+            )
+            if isinstance(selected_dates, tuple) and len(selected_dates) == 2:
+                start_date, end_date = selected_dates
+                selected_dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+            else:
+                selected_dates = list(selected_dates)
 
+            # Opening stock: the item's last row before the first selected date
+            if selected_dates:
+                autofill_stock = stock_index.stock_before(item_name, min(selected_dates).isoformat())
+            else:
+                autofill_stock = (stock_index.latest(item_name) or (None, None))[1]
+            autofill_stock = max(autofill_stock or 0, 0)
+
+            current_stock = st.number_input("📦 Current Stock", min_value=0, value=autofill_stock)
+            new_stock = st.number_input("➕ New Stock Arrived", min_value=0, key="new_stock_input")
+
+            sold_entries = {}
+            for dt in selected_dates:
+                sold = st.number_input(
+                    f"📤 Sold on {dt.strftime('%d %b %Y')}",
+                    min_value=0,
+                    key=f"sold_{dt.strftime('%Y%m%d')}"
+                )
+                sold_entries[str(dt)] = sold
+
+            rerun_profile.lap("stock: entry form")
+            if st.button("💾 Save Stock Entry", key="save_stock_btn"):
+                batch = WriteBatch(storage, selected_company)
+
+                # The selected dates, plus later rows of the item whose running stock changes
+                updates, appends = plan_stock_save(df[df["item"] == item_name], sold_entries, current_stock, new_stock)
+                for index, label, values in updates:
+                    row_id = df.at[index, row_id_col]
+                    batch.update(stock_ids.sheet_row(row_id) or index + 2, 3, values, label=label, row_id=row_id, expect=data[index + 1])
+                for label, values in appends:
+                    new_row = build_row(stock_header, dict(zip(STOCK_COLUMNS, values), item=item_name, date=label))
+                    batch.append(new_row, label=label)
+
+                results = batch.flush()
+                rerun_profile.lap("stock: save")
+                if batch.stale:
+                    # Someone else changed the sheet: reload it
+                    invalidate_sheet(selected_company)
+                else:
+                    for r in results:
+                        if r["ok"] and r["op"] == "update":
+                            row, first_col, values = r["row"]
+                            snapshot_cache.apply_update(cache_key(selected_company), row - 2, first_col, values, expect=row_is(r["row_id"]))
+                        elif r["ok"]:
+                            snapshot_cache.apply_append(cache_key(selected_company), r["row"])
+                st.session_state.last_stock_save = {"results": results, "api_calls": batch.api_calls}
+                st.rerun()
 
+            # 🧾 Result of the last save
+            last_save = st.session_state.pop("last_stock_save", None)
+            if last_save:
+                failed = [r for r in last_save["results"] if not r["ok"]]
+                saved = len(last_save["results"]) - len(failed)
+                if failed:
+                    st.error(f"❌ {len(failed)} of {len(last_save['results'])} rows failed to save.")
+                    for r in failed:
+                        st.write(f"📅 {r['label']} ({r['op']}): {r['error']}")
+                if saved:
+                    st.success(f"✅ Stock data saved successfully! ({saved} rows, {last_save['api_calls']} API calls)")
+
+            # 📊 Stock Summary Table
+            st.subheader("📊 Filtered Stock Summary")
+
+            summary_range = st.date_input(
+                "📅 Select date range",
+                [],
+                min_value=date(2023, 1, 1),
+                max_value=date.today(),
+                help="Choose any range, e.g. a week or a month"
+            )
+            if isinstance(summary_range, tuple) and len(summary_range) == 2:
+                s_date, e_date = summary_range
+                summary_dates = [s_date + timedelta(days=i) for i in range((e_date - s_date).days + 1)]
+            else:
+                summary_dates = list(summary_range)
+
+            if summary_dates:
+                summary_df = build_stock_summary(df, summary_dates, current=stock_index.current_stock())
+                st.dataframe(summary_df)
+            rerun_profile.lap("stock: summary")
+
+            # ❌ Delete Item Entry
+            st.subheader("➖ Delete Item Entry")
+            if st.checkbox("Enable Delete Mode", key="delete_mode_checkbox"):
+                if not df.empty and "item" in df.columns:
+                    del_item = st.selectbox("Select item to delete", df["item"].unique().tolist())
+                    del_date = st.date_input("Select date to delete entry")
+                    if st.button("❌ Confirm Delete", key="delete_row_btn"):
+                        mask = (df["item"] == del_item) & (df["date"] == pd.Timestamp(del_date))
+                        idx_to_del = df[mask].index
+                        if not idx_to_del.empty:
+                            try:
+                                found, results, api_calls = safe_delete_stock_entry(selected_company, df[df["item"] == del_item], idx_to_del[0])
+                                if any(not r["ok"] for r in results):
+                                    st.session_state.last_stock_save = {"results": results, "api_calls": api_calls}
+                                st.success("✅ Entry Deleted" if found else "✅ Entry was already deleted")
+                                st.rerun()
+                            except StorageError as e:
+                                invalidate_sheet(selected_company)
+                                st.error(f"❌ Failed to delete entry: {e}")
+                        else:
+                            st.warning("❗ Entry not found")
+            rerun_profile.lap("stock: delete")
+
+            # 📥 Bulk Import
+            with st.expander(f"📥 Bulk Import into {selected_company} (CSV / Excel)"):
+                st.caption("Columns: item, date, sold_qty; optional current_stock, new_stock, final_stock.")
+                bulk_import_section("stock", selected_company, data, lambda chunks, values, digest, skip: plan_stock_import(
+                    chunks, values, digest, skip_duplicates=skip,
+                ))
+            rerun_profile.lap("stock: bulk import")
+
+        view_timings["📊 Stock Manager"] = (time.perf_counter() - view_started, snapshot_cache.misses - view_reads)
+
+# =============== 🏬 ALL COMPANIES TAB ===============
+with tab3:
+    if tab3.open:
+        view_started, view_reads = time.perf_counter(), snapshot_cache.misses
+        st.title("🏬 All Companies")
+        companies = storage.companies()
+        if not companies:
+            st.info("No companies yet. Create one in 📊 Stock Manager.")
+        else:
+            # Every company sheet that isn't cached comes in one request
+            company_tables = load_derived_many(companies, "typed", lambda v: TypedTable(v, STOCK_SCHEMA))
+            frames = {c: company_tables[c].frame for c in companies}
+            indexes = load_derived_many(companies, "stock_index", StockIndex)
+            rerun_profile.lap("dashboard: load")
+
+            col1, col2 = st.columns(2)
+            low_limit = col1.number_input("⚠️ Low stock at or below", min_value=0, value=10, key="low_stock_limit")
+            sold_days = col2.number_input("🏆 Top sellers over last N days", min_value=1, value=30, key="top_seller_days")
+            stock, low, top = build_company_dashboard(frames, indexes, date.today() - timedelta(days=sold_days - 1), low_limit)
+
+            st.subheader(f"📦 Stock per item ({len(companies)} companies)")
+            st.dataframe(stock)
+            st.subheader(f"⚠️ Low stock ({len(low)})")
+            st.dataframe(low, hide_index=True, column_config={"as of": st.column_config.DateColumn(format="YYYY-MM-DD")})
+            st.subheader("🏆 Top sellers")
+            st.dataframe(top, hide_index=True)
+            rerun_profile.lap("dashboard: tables")
+
+        view_timings["🏬 All Companies"] = (time.perf_counter() - view_started, snapshot_cache.misses - view_reads)
+
+# --- Startup / per-rerun connection and view timing ---
+timing_slot.caption(
+    f"Startup: {storage.startup_seconds:.2f}s | This rerun: client {rerun_auth_seconds * 1000:.0f} ms, "
+    f"metadata {(storage.metadata_seconds - rerun_metadata_start) * 1000:.0f} ms "
+    f"({storage.metadata_calls} metadata fetches since start)"
+    + "".join(f" | {view}: {secs * 1000:.0f} ms, {reads} sheet reads" for view, (secs, reads) in view_timings.items())
+)
+# Everything this run changed has been drawn; only later changes need a redraw
+st.session_state.seen_version = snapshot_cache.version(storage.store_id)
+finish_profile(rerun_profile)
+
+# --- Debug panel: where this rerun (and this session) spent its time ---
+if st.session_state.get("show_debug_panel"):
+    with st.sidebar.expander("🐞 Debug Profile", expanded=True):
+        st.write(
+            f"This rerun: {rerun_profile.seconds * 1000:.0f} ms | Sheets: {len(rerun_profile.calls)} calls, "
+            f"{rerun_profile.call_seconds() * 1000:.0f} ms"
+        )
+        st.dataframe(pd.DataFrame(
+            [{"section": name, "ms": round(secs * 1000, 1)} for name, secs in rerun_profile.sections.items()]
+        ), hide_index=True)
+        if rerun_profile.calls:
+            st.dataframe(pd.DataFrame(rerun_profile.calls).assign(
+                ms=lambda d: (d["seconds"] * 1000).round(1)).drop(columns="seconds"), hide_index=True)
+
+        totals = st.session_state.profile_totals
+        st.write(f"This session: {totals.reruns} reruns, {totals.seconds:.1f}s total, slowest {totals.slowest * 1000:.0f} ms")
+        if totals.calls.count:
+            st.dataframe(pd.DataFrame(totals.calls.table()), hide_index=True)
+
+        background = profiling.BACKGROUND.table()
+        st.write(f"Background writes (all sessions) | Retry sleep: {write_queue.stats()['retry_sleep']:.1f}s")
+        if background:
+            st.dataframe(pd.DataFrame(background), hide_index=True)
 
 #================ Version 2.3 ================
\ No newline at end of file
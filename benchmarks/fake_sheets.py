@@ -0,0 +1,249 @@
+"""In-process stand-in for the parts of the gspread API the app uses.
+
+``install(spreadsheet)`` patches ``gspread.authorize`` and the service
+account loader so ``open_storage`` opens the fake spreadsheet instead of
+going to Google. Every call that would be a network request is counted
+in ``spreadsheet.calls`` and can be slowed down by ``latency`` seconds.
+"""
+
+import random
+import re
+import time
+import uuid
+from collections import Counter
+from datetime import date, timedelta
+
+import gspread
+from google.oauth2 import service_account
+
+from storage import LEDGER_HEADER, STOCK_HEADER
+
+
+def _a1(cell):
+    m = re.fullmatch(r"([A-Z]+)(\d+)", cell)
+    col = 0
+    for ch in m.group(1):
+        col = col * 26 + ord(ch) - 64
+    return int(m.group(2)), col
+
+
+def _range(a1):
+    """(first row, first col, last row, last col) of an A1 range; None = open end."""
+    a1 = a1.split("!")[-1]
+    start, _, end = a1.partition(":")
+    if re.fullmatch(r"\d+", start):  # whole rows, e.g. "1:1"
+        return int(start), 1, int(end or start), None
+    row, col = _a1(start)
+    if not end:
+        return row, col, row, col
+    if re.fullmatch(r"[A-Z]+", end):  # open-ended column, e.g. "A2:F"
+        return row, col, None, _a1(end + "1")[1]
+    end_row, end_col = _a1(end)
+    return row, col, end_row, end_col
+
+
+# --- Worksheet ---
+class FakeWorksheet:
+    def __init__(self, spreadsheet, title, rows, sheet_id):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.rows = rows
+        self.id = sheet_id
+
+    def _request(self, name):
+        self.spreadsheet._request(name)
+
+    def _width(self):
+        return max((len(r) for r in self.rows), default=0)
+
+    def _padded(self, rows):
+        # Like the API: every row as wide as the widest one
+        width = self._width()
+        return [list(r) + [""] * (width - len(r)) for r in rows]
+
+    def get_all_values(self, **kwargs):
+        self._request("get_all_values")
+        return self._padded(self.rows)
+
+    def get_values(self, range_name=None, **kwargs):
+        self._request("get_values")
+        return self._read(range_name) if range_name else self._padded(self.rows)
+
+    def _read(self, a1):
+        row, col, end_row, end_col = _range(a1)
+        rows = self.rows[row - 1:end_row]
+        values = [r[col - 1:end_col] for r in rows]
+        while values and not any(values[-1]):
+            values.pop()
+        return [list(v) for v in values]
+
+    def batch_get(self, ranges, **kwargs):
+        self._request("batch_get")
+        return [self._read(a1) for a1 in ranges]
+
+    def row_values(self, row, **kwargs):
+        self._request("row_values")
+        return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def col_values(self, col, **kwargs):
+        self._request("col_values")
+        values = [r[col - 1] if col <= len(r) else "" for r in self.rows]
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def append_row(self, row, **kwargs):
+        self._request("append_row")
+        self.rows.append([str(x) for x in row])
+
+    def append_rows(self, rows, **kwargs):
+        self._request("append_rows")
+        self.rows.extend([str(x) for x in row] for row in rows)
+
+    def _write(self, a1, values):
+        row, col, _, _ = _range(a1)
+        for i, new in enumerate(values):
+            while len(self.rows) < row + i:
+                self.rows.append([])
+            target = self.rows[row - 1 + i]
+            target.extend([""] * (col - 1 + len(new) - len(target)))
+            target[col - 1:col - 1 + len(new)] = [str(v) for v in new]
+
+    def update(self, values=None, range_name=None, **kwargs):
+        self._request("update")
+        self._write(range_name or "A1", values)
+
+    def batch_update(self, data, **kwargs):
+        self._request("batch_update")
+        for d in data:
+            self._write(d["range"], d["values"])
+
+
+# --- Spreadsheet ---
+class FakeSpreadsheet:
+    def __init__(self, spreadsheet_id="fake-sheet", latency=0.0):
+        self.id = spreadsheet_id
+        self.latency = latency
+        self.calls = Counter()
+        self._sheets = []
+        self._next_id = 0
+
+    def _request(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def add(self, title, rows):
+        """Add a worksheet without counting it as a request (test setup)."""
+        self._next_id += 1
+        ws = FakeWorksheet(self, title, rows, self._next_id)
+        self._sheets.append(ws)
+        return ws
+
+    @property
+    def sheet1(self):
+        return self._sheets[0]
+
+    def worksheets(self, **kwargs):
+        self._request("worksheets")
+        return list(self._sheets)
+
+    def worksheet(self, title):
+        self._request("worksheet")
+        for ws in self._sheets:
+            if ws.title == title:
+                return ws
+        raise gspread.exceptions.WorksheetNotFound(title)
+
+    def add_worksheet(self, title, rows, cols, **kwargs):
+        self._request("add_worksheet")
+        return self.add(title, [])
+
+    def del_worksheet(self, worksheet):
+        self._request("del_worksheet")
+        self._sheets.remove(worksheet)
+
+    def batch_update(self, body):
+        self._request("spreadsheet_batch_update")
+        for req in body["requests"]:
+            r = req["deleteDimension"]["range"]
+            ws = next(w for w in self._sheets if w.id == r["sheetId"])
+            del ws.rows[r["startIndex"]:r["endIndex"]]
+
+    def values_batch_get(self, ranges, params=None):
+        self._request("values_batch_get")
+        out = []
+        for a1 in ranges:
+            title = a1.split("!")[0]
+            if title.startswith("'"):
+                title = title[1:-1].replace("''", "'")
+            ws = next(w for w in self._sheets if w.title == title)
+            values = ws._read(a1) if "!" in a1 else ws._padded(ws.rows)
+            out.append({"range": a1, "values": values})
+        return {"valueRanges": out}
+
+
+class FakeClient:
+    def __init__(self, spreadsheet):
+        self.spreadsheet = spreadsheet
+
+    def open_by_key(self, key):
+        self.spreadsheet._request("open_by_key")
+        return self.spreadsheet
+
+
+def install(spreadsheet):
+    """Route gspread logins to ``spreadsheet``."""
+    gspread.authorize = lambda credentials: FakeClient(spreadsheet)
+    service_account.Credentials.from_service_account_info = classmethod(lambda cls, *a, **k: object())
+
+
+# --- Synthetic data ---
+PARTY_WORDS = ["Sharma", "Gupta", "Verma", "Agarwal", "Singh", "Jain", "Mehta", "Patel", "Kumar", "Yadav"]
+PARTY_KINDS = ["Traders", "Stores", "Enterprises", "Kirana", "Agencies", "& Sons", "Distributors", "Mart"]
+ITEMS = ["soap", "rice", "atta", "sugar", "dal", "oil", "salt", "tea", "biscuit", "shampoo"]
+
+
+def party_names(count):
+    names = [f"{w} {k}" for w in PARTY_WORDS for k in PARTY_KINDS]
+    return [names[i % len(names)] + (f" {i // len(names)}" if i >= len(names) else "") for i in range(count)]
+
+
+def ledger_rows(n, parties, seed=1):
+    """Header + ``n`` ledger rows spread over ``parties`` and the last two years."""
+    rng = random.Random(seed)
+    names = party_names(parties)
+    today = date.today()
+    rows = [list(LEDGER_HEADER) + ["Running Balance"]]
+    running = Counter()
+    for _ in range(n):
+        party = rng.choice(names)
+        amount = rng.randrange(0, 5000, 100)
+        payment = rng.randrange(0, 5000, 100)
+        running[party] += amount - payment
+        day = today - timedelta(days=rng.randrange(1, 730))
+        rows.append([party, str(day), str(amount), str(payment), str(amount - payment),
+                     uuid.UUID(int=rng.getrandbits(128)).hex[:12], str(running[party])])
+    return rows
+
+
+def item_names(count):
+    return [ITEMS[i % len(ITEMS)] + (f" {i // len(ITEMS)}" if i >= len(ITEMS) else "") for i in range(count)]
+
+
+def stock_rows(n, items, seed=2):
+    """Header + ``n`` stock rows: one row per item per day, ending yesterday."""
+    rng = random.Random(seed)
+    names = item_names(items)
+    days = -(-n // items)
+    start = date.today() - timedelta(days=days)
+    rows = [list(STOCK_HEADER)]
+    stock = dict.fromkeys(names, 100)
+    for i in range(n):
+        item, day = names[i % items], start + timedelta(days=i // items)
+        new, sold = rng.choice([0, 0, 0, 50]), rng.randrange(0, 20)
+        current = stock[item]
+        stock[item] = current + new - sold
+        rows.append([item, str(day), str(current), str(new), str(sold), str(stock[item]),
+                     uuid.UUID(int=rng.getrandbits(128)).hex[:12]])
+    return rows
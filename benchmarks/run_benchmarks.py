@@ -0,0 +1,277 @@
+"""Benchmark the app's hot paths against an in-process fake of Google Sheets.
+
+Generates a ledger and a company stock sheet at each size, drives app.py
+headlessly with Streamlit's AppTest and records, per flow, the wall time
+of the rerun the user action triggers, its peak Python memory and the
+number of Sheets API calls (including background queue flushes).
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 1000 10000 --latency-ms 80
+    python benchmarks/run_benchmarks.py --baseline benchmarks/results/old.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from importlib import metadata
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+import fake_sheets  # noqa: E402
+
+COMPANY = "Company A"
+LEDGER_VIEW = "📦 Business Record"
+STOCK_VIEW = "📊 Stock Manager"
+
+
+# --- One app session against the fake spreadsheet ---
+def new_session(bench, view):
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=bench["timeout"])
+    at.secrets["service_account"] = {}
+    at.secrets["storage"] = {"backend": "sheets", "sheet_key": bench["spreadsheet"].id}
+    at.secrets["write_queue"] = {"path": bench["queue_path"]}
+    at.session_state["logged_in"] = True
+    at.session_state["active_view"] = view
+    return checked(at.run())
+
+
+def checked(at):
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return at
+
+
+def by_label(widgets, prefix):
+    return next(w for w in widgets if w.label.startswith(prefix))
+
+
+# --- Flows: (view, setup, action); only the action is measured ---
+def flow_load_cold(bench):
+    def action(at):
+        at.button(key="refresh_cache_btn").click().run()
+    return LEDGER_VIEW, None, action
+
+
+def flow_party_search(bench):
+    def action(at):
+        by_label(at.main.text_input, "🔍 Party").input(bench["party"][:8].lower()).run()
+    return LEDGER_VIEW, None, action
+
+
+def flow_party_view(bench):
+    def action(at):
+        by_label(at.main.text_input, "🔍 Party").input(bench["party"]).run()
+    return LEDGER_VIEW, None, action
+
+
+def flow_add_entry(bench):
+    def setup(at):
+        by_label(at.sidebar.text_input, "Party Name").input(bench["party"]).run()
+        by_label(at.sidebar.number_input, "Item Amount").set_value(500).run()
+
+    def action(at):
+        by_label(at.sidebar.button, "Add Entry").click().run()
+    return LEDGER_VIEW, setup, action
+
+
+def flow_save_stock(bench):
+    def setup(at):
+        by_label(at.text_input, "🧾 Item").input(bench["item"]).run()
+        end = date.today() - timedelta(days=1)
+        at.date_input(key="date_input").set_value((end - timedelta(days=9), end)).run()
+
+    def action(at):
+        at.button(key="save_stock_btn").click().run()
+    return STOCK_VIEW, setup, action
+
+
+def flow_stock_summary(bench):
+    def action(at):
+        end = date.today() - timedelta(days=1)
+        by_label(at.date_input, "📅 Select date range").set_value((end - timedelta(days=29), end)).run()
+    return STOCK_VIEW, None, action
+
+
+def flow_pdf_export(bench):
+    def setup(at):
+        by_label(at.main.text_input, "🔍 Party").input(bench["party"]).run()
+
+    def action(at):
+        by_label(at.button, "📥 Download PDF").click().run()
+    return LEDGER_VIEW, setup, action
+
+
+FLOWS = {
+    "load_cold": flow_load_cold,
+    "party_search": flow_party_search,
+    "party_view": flow_party_view,
+    "add_entry": flow_add_entry,
+    "save_stock_10_dates": flow_save_stock,
+    "stock_summary_30_days": flow_stock_summary,
+    "pdf_export": flow_pdf_export,
+}
+
+
+# --- Measuring ---
+def wait_for_queue(queue_path, timeout=60):
+    """Block until the app's write queue has flushed everything."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not os.path.exists(queue_path):
+            return
+        with sqlite3.connect(queue_path) as conn:
+            try:
+                (depth,) = conn.execute("SELECT COUNT(*) FROM ops WHERE failed = 0").fetchone()
+            except sqlite3.OperationalError:
+                return
+        if depth == 0:
+            return
+        time.sleep(0.05)
+    raise RuntimeError("write queue did not drain")
+
+
+def measure(bench, flow, trace_memory):
+    view, setup, action = FLOWS[flow](bench)
+    at = new_session(bench, view)
+    if setup:
+        setup(at)
+        checked(at)
+    wait_for_queue(bench["queue_path"])
+
+    calls = bench["spreadsheet"].calls
+    calls.clear()
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    action(at)
+    seconds = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    if trace_memory:
+        tracemalloc.stop()
+    checked(at)
+    wait_for_queue(bench["queue_path"])
+    return seconds, peak, dict(calls)
+
+
+def run_size(rows, args, workdir):
+    parties = max(50, rows // 20)
+    items = max(10, rows // 500)
+    spreadsheet = fake_sheets.FakeSpreadsheet(f"bench-{rows}", latency=args.latency_ms / 1000)
+    spreadsheet.add("Sheet1", fake_sheets.ledger_rows(rows, parties))
+    spreadsheet.add(COMPANY, fake_sheets.stock_rows(rows, items))
+    fake_sheets.install(spreadsheet)
+    # Fresh storage, caches and write queue for every size
+    st.cache_resource.clear()
+
+    bench = {
+        "spreadsheet": spreadsheet,
+        "queue_path": os.path.join(workdir, f"queue-{rows}.db"),
+        "party": fake_sheets.party_names(parties)[parties // 2],
+        "item": fake_sheets.item_names(items)[0],
+        "timeout": args.timeout,
+    }
+    results = []
+    for flow in args.flows:
+        try:
+            timings = []
+            for _ in range(args.repeat):
+                seconds, _, calls = measure(bench, flow, trace_memory=False)
+                timings.append(seconds)
+            _, peak, _ = measure(bench, flow, trace_memory=True)
+            result = {
+                "flow": flow, "rows": rows,
+                "seconds": round(statistics.median(timings), 4), "seconds_min": round(min(timings), 4),
+                "peak_mib": round(peak / 2 ** 20, 2), "api_calls": sum(calls.values()), "calls": calls,
+                "error": None,
+            }
+            print(f"  {flow}: {result['seconds'] * 1000:.0f} ms, {result['peak_mib']} MiB, {result['api_calls']} calls")
+        except Exception as e:
+            result = {"flow": flow, "rows": rows, "error": repr(e)}
+            print(f"  {flow}: failed ({e})")
+        results.append(result)
+    return results
+
+
+# --- Results ---
+def run_metadata(args):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    packages = {}
+    for name in ["streamlit", "pandas", "gspread", "fpdf"]:
+        try:
+            packages[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            packages[name] = None
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "packages": packages,
+        "latency_ms": args.latency_ms,
+        "repeat": args.repeat,
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["flow"], r["rows"]): r for r in json.load(f)["results"] if not r.get("error")}
+    print(f"\nCompared with {baseline_path}:")
+    for r in results:
+        old = baseline.get((r["flow"], r["rows"]))
+        if old is None or r.get("error"):
+            continue
+        ratio = r["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        print(
+            f"  {r['flow']:<24}{r['rows']:>8}  {old['seconds'] * 1000:8.0f} -> {r['seconds'] * 1000:8.0f} ms"
+            f"  ({ratio:.2f}x)  calls {old['api_calls']} -> {r['api_calls']}"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--flows", nargs="+", choices=list(FLOWS), default=list(FLOWS))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per flow (median is reported)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated delay per API call")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds allowed per app rerun")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    output = Path(args.output or ROOT / "benchmarks" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.sizes:
+            print(f"{rows} rows")
+            results += run_size(rows, args, workdir)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"meta": run_metadata(args), "results": results}, f, indent=2)
+    print(f"\nWrote {output}")
+    if args.baseline:
+        compare(results, args.baseline)
+    return 1 if any(r.get("error") for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+import hashlib
+import re
+import time
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+
+from ledger_index import amount_text
+from storage import ROW_ID, StorageError, build_row, column_of
+
+# Accepted spellings of each column (compared lower-case, spaces collapsed)
+LEDGER_COLUMNS = {
+    "Party": ["party", "party name", "name", "customer"],
+    "Date": ["date", "entry date"],
+    "Amount": ["amount", "item amount", "item", "bill", "bill amount"],
+    "Payment": ["payment", "payment received", "received", "paid"],
+}
+STOCK_COLUMNS = {
+    "item": ["item", "item name", "product"],
+    "date": ["date"],
+    "current_stock": ["current_stock", "current stock", "opening", "opening stock"],
+    "new_stock": ["new_stock", "new stock", "received", "arrived"],
+    "sold_qty": ["sold_qty", "sold", "sold qty", "quantity sold"],
+    "final_stock": ["final_stock", "final stock", "closing", "closing stock"],
+}
+REQUIRED = {"ledger": ["Party", "Date", "Amount"], "stock": ["item", "date", "sold_qty"]}
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y", "%d %b %Y", "%d %B %Y", "%d-%b-%Y"]
+
+
+# --- File identity: same file, same import row IDs (this is what makes resuming work) ---
+def file_digest(upload):
+    digest = hashlib.sha1()
+    upload.seek(0)
+    for block in iter(lambda: upload.read(1 << 20), b""):
+        digest.update(block)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def import_row_id(digest, line):
+    return hashlib.sha1(f"{digest}:{line}".encode()).hexdigest()[:12]
+
+
+# --- Read a CSV (streamed in chunks) or Excel file as text cells ---
+def read_chunks(upload, name, chunk_rows=5000):
+    upload.seek(0)
+    if name.lower().endswith((".xlsx", ".xls")):
+        # Excel can't be streamed; read once and hand it out in the same chunks
+        frame = pd.read_excel(upload, dtype=str, keep_default_na=False)
+        for start in range(0, len(frame), chunk_rows):
+            yield frame.iloc[start:start + chunk_rows]
+        return
+    yield from pd.read_csv(upload, dtype=str, keep_default_na=False, chunksize=chunk_rows, skipinitialspace=True)
+
+
+def _key(text):
+    return " ".join(str(text).split()).casefold()
+
+
+def map_columns(columns, spec):
+    """{canonical name: file column} for the columns of ``spec`` found in the file."""
+    found = {_key(c): c for c in columns}
+    mapping = {}
+    for name, aliases in spec.items():
+        for alias in aliases:
+            if alias in found:
+                mapping[name] = found[alias]
+                break
+    return mapping
+
+
+# --- Cell parsing ---
+def parse_date(text):
+    text = str(text).strip()
+    if not text:
+        return None
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text[:10] if fmt == "%Y-%m-%d" else text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_number(text):
+    """Amount or quantity as a float; blank is 0, unreadable is None."""
+    text = re.sub(r"(?i)^(rs\.?|inr|₹)\s*", "", str(text).strip()).replace(",", "")
+    if not text:
+        return 0.0
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+# --- Import plan ---
+class ImportPlan:
+    """Normalised rows ready to append, and everything that was left out.
+
+    ``rows`` are laid out for the target header and carry IDs derived from
+    the file, so re-running an interrupted import skips what was written.
+    ``problems`` lists (file line, reason) of rows that didn't validate.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.problems = []
+        self.already_imported = 0
+        self.duplicates = 0
+        self.renamed = Counter()
+
+    def summary(self):
+        return {
+            "to_write": len(self.rows),
+            "already_imported": self.already_imported,
+            "duplicates": self.duplicates,
+            "problems": len(self.problems),
+        }
+
+
+def _columns(chunk, kind):
+    spec = LEDGER_COLUMNS if kind == "ledger" else STOCK_COLUMNS
+    mapping = map_columns(chunk.columns, spec)
+    missing = [name for name in REQUIRED[kind] if name not in mapping]
+    if missing:
+        raise ValueError(f"Missing column(s): {', '.join(missing)}")
+    return mapping
+
+
+def _existing_ids(values):
+    if not values or ROW_ID not in values[0]:
+        return {}
+    col = values[0].index(ROW_ID)
+    return {row[col]: row for row in values[1:] if len(row) > col and row[col]}
+
+
+def plan_ledger_import(chunks, values, digest, parties, opening, skip_duplicates=True):
+    """Plan appending a register to the ledger ``values`` (header + rows).
+
+    Party names are matched to ``parties`` ignoring case and spacing.
+    Balance is Amount - Payment, and the running balance continues from
+    ``opening(party)`` in file order, as if each row were added by hand.
+    Rows equal to an existing entry (party, date, amount, payment) are
+    skipped when ``skip_duplicates``, once per existing copy.
+    """
+    plan = ImportPlan()
+    header = values[0]
+    party_col, date_col = column_of(header, "Party"), column_of(header, "Date", 1)
+    amount_col, payment_col = column_of(header, "Amount", 2), column_of(header, "Payment", 3)
+    done = _existing_ids(values)
+    known = {_key(p): p for p in parties if p}
+
+    def fingerprint(party, day, amount, payment):
+        return (_key(party), day, amount_text(amount), amount_text(payment))
+
+    existing = Counter()
+    if skip_duplicates:
+        for row in values[1:]:
+            cells = [row[c] if c < len(row) else "" for c in (party_col, date_col, amount_col, payment_col)]
+            day, amount, payment = parse_date(cells[1]), parse_number(cells[2]), parse_number(cells[3])
+            if day and amount is not None and payment is not None:
+                existing[fingerprint(cells[0], day, amount, payment)] += 1
+
+    running = {}
+    line = 1
+    for chunk in chunks:
+        mapping = _columns(chunk, "ledger")
+        for record in chunk.to_dict("records"):
+            line += 1
+            row_id = import_row_id(digest, line)
+            party = " ".join(str(record[mapping["Party"]]).split())
+            day = parse_date(record[mapping["Date"]])
+            amount = parse_number(record[mapping["Amount"]])
+            payment = parse_number(record[mapping["Payment"]]) if "Payment" in mapping else 0.0
+            if not party:
+                plan.problems.append((line, "No party name"))
+                continue
+            if day is None:
+                plan.problems.append((line, f"Unreadable date: {record[mapping['Date']]!r}"))
+                continue
+            if amount is None or payment is None:
+                plan.problems.append((line, "Unreadable amount or payment"))
+                continue
+            if known.get(_key(party), party) != party:
+                plan.renamed[party] += 1
+            party = known.setdefault(_key(party), party)
+
+            key = fingerprint(party, day, amount, payment)
+            # Written by an earlier, interrupted run of this file
+            if row_id in done:
+                plan.already_imported += 1
+                existing[key] -= 1
+                continue
+            if existing[key] > 0:
+                existing[key] -= 1
+                plan.duplicates += 1
+                continue
+            balance = amount - payment
+            running[party] = running.get(party, opening(party)) + balance
+            fields = {
+                "Party": party, "Date": day.isoformat(), "Amount": amount_text(amount),
+                "Payment": amount_text(payment), "Balance": amount_text(balance), ROW_ID: row_id,
+            }
+            if "Running Balance" in header:
+                fields["Running Balance"] = amount_text(running[party])
+            plan.rows.append(build_row(header, fields))
+    return plan
+
+
+def plan_stock_import(chunks, values, digest, skip_duplicates=True):
+    """Plan appending stock history to a company sheet's ``values``.
+
+    Rows for an (item, date) the sheet already has are skipped when
+    ``skip_duplicates``. Missing current stock carries over from the
+    item's previous final stock; missing final stock is computed.
+    """
+    plan = ImportPlan()
+    header = values[0]
+    done = _existing_ids(values)
+    item_col, date_col, final_col = column_of(header, "item"), column_of(header, "date", 1), column_of(header, "final_stock", 5)
+    existing = set()
+    last_final = {}
+    for row in values[1:]:
+        if len(row) > max(item_col, date_col):
+            existing.add((_key(row[item_col]), row[date_col][:10]))
+            last_final[_key(row[item_col])] = parse_number(row[final_col] if final_col < len(row) else "") or 0.0
+    known = {_key(row[item_col]): row[item_col] for row in values[1:] if item_col < len(row) and row[item_col]}
+
+    line = 1
+    for chunk in chunks:
+        mapping = _columns(chunk, "stock")
+        for record in chunk.to_dict("records"):
+            line += 1
+            row_id = import_row_id(digest, line)
+            item = " ".join(str(record[mapping["item"]]).split())
+            day = parse_date(record[mapping["date"]])
+            numbers = {
+                name: parse_number(record[mapping[name]]) if name in mapping and str(record[mapping[name]]).strip() else None
+                for name in ["current_stock", "new_stock", "sold_qty", "final_stock"]
+            }
+            if not item:
+                plan.problems.append((line, "No item name"))
+                continue
+            if day is None:
+                plan.problems.append((line, f"Unreadable date: {record[mapping['date']]!r}"))
+                continue
+            bad = [name for name in numbers if name in mapping and str(record[mapping[name]]).strip() and numbers[name] is None]
+            if bad:
+                plan.problems.append((line, f"Unreadable {', '.join(bad)}"))
+                continue
+            item = known.setdefault(_key(item), item)
+            current = numbers["current_stock"] if numbers["current_stock"] is not None else last_final.get(_key(item), 0.0)
+            new, sold = numbers["new_stock"] or 0.0, numbers["sold_qty"] or 0.0
+            final = numbers["final_stock"] if numbers["final_stock"] is not None else current + new - sold
+            last_final[_key(item)] = final
+            if row_id in done:
+                plan.already_imported += 1
+                continue
+            if skip_duplicates and (_key(item), day.isoformat()) in existing:
+                plan.duplicates += 1
+                continue
+            existing.add((_key(item), day.isoformat()))
+            plan.rows.append(build_row(header, {
+                "item": item, "date": day.isoformat(), "current_stock": amount_text(current),
+                "new_stock": amount_text(new), "sold_qty": amount_text(sold), "final_stock": amount_text(final),
+                ROW_ID: row_id,
+            }))
+    return plan
+
+
+# --- Chunked writer ---
+def write_in_chunks(storage, table, rows, id_col=None, chunk_rows=500, min_interval=1.0, max_attempts=5, on_chunk=None):
+    """Append ``rows`` with one ``append_rows`` call per chunk.
+
+    Calls are spaced at least ``min_interval`` seconds apart to stay under
+    the Sheets write quota, and a failed chunk is retried with backoff
+    before giving up with StorageError. A failure can come after the rows
+    were written (a lost response), so before a retry the chunk's row IDs
+    (column ``id_col``) are looked up and only rows not found are sent.
+    ``on_chunk(written, total)`` is called after each chunk. Returns the
+    number of rows written.
+    """
+    written = 0
+    last_call = 0.0
+    for start in range(0, len(rows), chunk_rows):
+        chunk = rows[start:start + chunk_rows]
+        to_send = chunk
+        for attempt in range(1, max_attempts + 1):
+            time.sleep(max(0.0, last_call + min_interval - time.monotonic()))
+            last_call = time.monotonic()
+            try:
+                if attempt > 1 and id_col is not None:
+                    landed = storage.locate_rows(table, {row[id_col]: None for row in to_send})
+                    to_send = [row for row in to_send if row[id_col] not in landed]
+                if to_send:
+                    storage.append_rows(table, to_send)
+                break
+            except StorageError:
+                if attempt == max_attempts:
+                    raise
+                time.sleep(min(60.0, min_interval * 2 ** attempt))
+        written += len(chunk)
+        if on_chunk:
+            on_chunk(written, len(rows))
+    return written
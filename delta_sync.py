@@ -0,0 +1,90 @@
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+
+import profiling
+
+
+# --- Fingerprint of some rows (trailing blank cells ignored) ---
+def fingerprint(rows):
+    trimmed = []
+    for row in rows:
+        row = list(row)
+        while row and row[-1] == "":
+            row.pop()
+        trimmed.append(row)
+    return hashlib.sha1(json.dumps(trimmed).encode()).hexdigest()
+
+
+# --- Sheet rows checked before a snapshot is trusted ---
+def probe_rows(count, samples):
+    """The header, ``samples`` evenly spaced rows and the last known row.
+
+    A row inserted or deleted anywhere above the last known row shifts
+    that row, so its probe catches every insert and delete; the spaced
+    rows catch some in-place edits as well.
+    """
+    if count < 2:
+        return [1]
+    step = max(1, (count - 1) // (samples + 1))
+    return sorted({1, count} | set(list(range(1 + step, count, step))[:samples]))
+
+
+# --- Delta sync of cached snapshots ---
+class DeltaSync:
+    """Brings expired snapshots up to date by fetching only appended rows.
+
+    ``tail(table, values)`` fetches the probe rows and everything below
+    the last known row in one request. If the probes still match the
+    snapshot, the new rows are returned for the cache to append;
+    otherwise (an edit or delete in the middle) it returns None and the
+    caller does a full read. A full read is also forced every
+    ``full_every`` seconds, since edits between probes can't be seen.
+
+    Every sync is recorded with the rows and bytes it transferred.
+    """
+
+    def __init__(self, storage, samples=8, full_every=600):
+        self.storage = storage
+        self.samples = samples
+        self.full_every = full_every
+        self._full_at = {}
+        self._lock = threading.Lock()
+        self.last = {}
+        self.totals = Counter()
+
+    def full_read(self, table, reader):
+        values = reader(table)
+        self._full_at[table] = time.monotonic()
+        self._record(table, "full", values)
+        return values
+
+    def tail(self, table, values):
+        """Rows appended to ``table`` since ``values`` was read, or None."""
+        full_at = self._full_at.get(table)
+        if not values or full_at is None or time.monotonic() - full_at >= self.full_every:
+            return None
+        probes = probe_rows(len(values), self.samples)
+        fetched = self.storage.read_tail(table, probes, len(values) + 1, len(values[0]))
+        if fetched is None:
+            return None
+        seen, new_rows = fetched
+        if fingerprint(seen) != fingerprint(values[row - 1] for row in probes):
+            self._record(table, "changed", seen)
+            return None
+        self._record(table, "delta", seen + new_rows)
+        return new_rows
+
+    def _record(self, table, mode, rows):
+        rows, size = profiling.payload_size(list(rows))
+        with self._lock:
+            self.last[table] = {"mode": mode, "rows": rows, "bytes": size, "at": time.strftime("%H:%M:%S")}
+            self.totals[mode] += 1
+            self.totals[f"{mode}_rows"] += rows
+            self.totals[f"{mode}_bytes"] += size
+
+    def stats(self):
+        with self._lock:
+            return {"totals": dict(self.totals), "last": dict(self.last)}
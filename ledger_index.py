@@ -0,0 +1,107 @@
+import copy
+from bisect import bisect_right, insort
+
+
+# --- Parse a sheet amount, treating blanks and junk as 0 ---
+def to_amount(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# --- Amount as sheet text: whole numbers without ".0", else 2 decimals ---
+def amount_text(value):
+    value = float(value)
+    return str(int(value)) if value.is_integer() else f"{value:.2f}"
+
+
+# --- Party ledger index ---
+class LedgerIndex:
+    """Party -> row positions and running balance.
+
+    Built once from a ledger snapshot (header row + data rows) and kept in
+    step with it through the SnapshotCache hooks, so party lookups and
+    balances never rescan the whole sheet. Positions are 0-based data rows,
+    i.e. sheet row = position + 2. The hooks return a changed copy and
+    leave this index as it was, for readers of the older snapshot.
+    """
+
+    def __init__(self, values):
+        header = values[0] if values else []
+        self.party_col = header.index("Party") if "Party" in header else 0
+        self.balance_col = header.index("Balance") if "Balance" in header else 4
+        self.positions = {}
+        self.balances = {}
+        # Data rows indexed so far; the next appended row goes at this position
+        self.size = 0
+        for row in values[1:]:
+            self._add(row)
+
+    def _cell(self, row, col):
+        return row[col] if col < len(row) else ""
+
+    def _add(self, row):
+        party = self._cell(row, self.party_col)
+        self.positions.setdefault(party, []).append(self.size)
+        self.size += 1
+        self.balances[party] = self.balances.get(party, 0.0) + to_amount(self._cell(row, self.balance_col))
+
+    # --- Lookups ---
+    def parties(self):
+        return list(self.positions)
+
+    def rows(self, party):
+        return list(self.positions.get(party, []))
+
+    def balance(self, party):
+        return self.balances.get(party, 0.0)
+
+    # --- Incremental updates (called by SnapshotCache) ---
+    def _copy(self, parties):
+        # Shares the position lists of every party but ``parties``
+        new = copy.copy(self)
+        new.positions = dict(self.positions)
+        new.balances = dict(self.balances)
+        for party in parties:
+            if party in new.positions:
+                new.positions[party] = list(new.positions[party])
+        return new
+
+    def on_append(self, row):
+        return self.on_extend([row])
+
+    def on_extend(self, rows):
+        new = self._copy({self._cell(row, self.party_col) for row in rows})
+        for row in rows:
+            new._add(row)
+        return new
+
+    def on_update(self, position, old_row, new_row):
+        old_party, party = self._cell(old_row, self.party_col), self._cell(new_row, self.party_col)
+        new = self._copy({old_party, party})
+        new.balances[old_party] -= to_amount(self._cell(old_row, self.balance_col))
+        if party != old_party:
+            new.positions[old_party].remove(position)
+            if not new.positions[old_party]:
+                del new.positions[old_party]
+                del new.balances[old_party]
+            insort(new.positions.setdefault(party, []), position)
+        new.balances[party] = new.balances.get(party, 0.0) + to_amount(self._cell(new_row, self.balance_col))
+        return new
+
+    def on_delete(self, position, row):
+        party = self._cell(row, self.party_col)
+        # Rows below the deleted one move up by one, in every party's list
+        new = self._copy(self.positions)
+        if party in new.positions:
+            new.positions[party].remove(position)
+            new.balances[party] -= to_amount(self._cell(row, self.balance_col))
+            if not new.positions[party]:
+                del new.positions[party]
+                del new.balances[party]
+        new.size -= 1
+        for plist in new.positions.values():
+            for i in range(bisect_right(plist, position), len(plist)):
+                plist[i] -= 1
+        return new
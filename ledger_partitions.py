@@ -0,0 +1,171 @@
+import copy
+from collections import Counter, defaultdict
+from datetime import date
+
+from ledger_index import amount_text, to_amount
+from storage import ROW_ID, SYSTEM_PREFIX, column_of, new_row_id, rows_by_id
+
+ARCHIVE_PREFIX = f"{SYSTEM_PREFIX}ledger "
+ROLLUP_TABLE = f"{SYSTEM_PREFIX}ledger balances"
+ROLLUP_HEADER = ["Party", "Period", "Net", "Entries", ROW_ID]
+
+
+# --- Period label of a day: "2025-07" or "FY2025-26" (April to March) ---
+def period_of(day, scheme="month"):
+    if scheme == "financial_year":
+        start = day.year if day.month >= 4 else day.year - 1
+        return f"FY{start}-{(start + 1) % 100:02d}"
+    return f"{day.year}-{day.month:02d}"
+
+
+# --- First day of the period containing a day ---
+def period_start(day, scheme="month"):
+    if scheme == "financial_year":
+        return date(day.year if day.month >= 4 else day.year - 1, 4, 1)
+    return date(day.year, day.month, 1)
+
+
+def archive_table(period):
+    return f"{ARCHIVE_PREFIX}{period}"
+
+
+# --- Archive tables among ``tables``, oldest period first ---
+def archive_tables(tables):
+    return sorted(t for t in tables if t.startswith(ARCHIVE_PREFIX))
+
+
+def _day(text):
+    try:
+        return date.fromisoformat(text.strip()[:10])
+    except ValueError:
+        return None
+
+
+# --- Rows laid out for another header (matched by column name) ---
+def _relayout(rows, header, target):
+    if header == target:
+        return rows
+    cols = [header.index(name) if name in header else None for name in target]
+    return [[row[c] if c is not None and c < len(row) else "" for c in cols] for row in rows]
+
+
+# --- Closed-period balances ---
+class Rollups:
+    """Net balance per party per closed period, read from the rollup table.
+
+    A party's carried-forward balance is the sum of its period nets, and
+    its closing balance for a period the running sum up to that period.
+    """
+
+    def __init__(self, values):
+        header = values[0] if values else ROLLUP_HEADER
+        self.cols = [column_of(header, name, i) for i, name in enumerate(ROLLUP_HEADER[:4])]
+        self.nets = defaultdict(float)
+        self.entries = Counter()
+        self.carried = defaultdict(float)
+        for row in values[1:]:
+            self._add(row)
+
+    def on_append(self, row):
+        # A changed copy; readers of the older snapshot keep this one
+        new = copy.copy(self)
+        new.nets, new.entries, new.carried = defaultdict(float, self.nets), Counter(self.entries), defaultdict(float, self.carried)
+        new._add(row)
+        return new
+
+    def _add(self, row):
+        party, period, net, entries = (row[c] if c < len(row) else "" for c in self.cols)
+        self.nets[(party, period)] += to_amount(net)
+        self.entries[(party, period)] += int(to_amount(entries))
+        self.carried[party] += to_amount(net)
+
+    def parties(self):
+        return list(self.carried)
+
+    def balance(self, party):
+        return self.carried.get(party, 0.0)
+
+    def periods(self, party):
+        """(period, entries, net, closing balance) of a party, oldest first."""
+        closing = 0.0
+        out = []
+        for (p, period), net in sorted(self.nets.items(), key=lambda kv: kv[0][1]):
+            if p == party:
+                closing += net
+                out.append((period, self.entries[(p, period)], net, closing))
+        return out
+
+
+# --- Move finished periods out of the ledger ---
+def close_periods(storage, today, scheme="month"):
+    """Move ledger rows dated before the current period into archive tables.
+
+    For every earlier period found, rows not yet in its archive table are
+    appended (matched by row ID), that period's rollup rows are rebuilt
+    from the whole archive, and only then are the moved rows deleted from
+    the ledger. An interrupted run can therefore simply be repeated.
+    Rows without a readable date stay in the ledger. Returns
+    {period: rows moved}.
+    """
+    ledger = storage.ledger
+    values = storage.ensure_row_ids(ledger, storage.read(ledger))
+    if len(values) < 2:
+        return {}
+    header = values[0]
+    date_col, id_col = column_of(header, "Date", 1), header.index(ROW_ID)
+    cutoff = period_start(today, scheme)
+
+    by_period = defaultdict(list)
+    moving = {}
+    for row_index, row in enumerate(values[1:], start=2):
+        day = _day(row[date_col]) if date_col < len(row) else None
+        if day is None or day >= cutoff:
+            continue
+        by_period[period_of(day, scheme)].append(row)
+        moving[row[id_col]] = row_index
+    if not moving:
+        return {}
+
+    tables = storage.tables()
+    if ROLLUP_TABLE not in tables:
+        storage.create_table(ROLLUP_TABLE, ROLLUP_HEADER)
+    rollup = storage.read(ROLLUP_TABLE)
+    period_col = column_of(rollup[0], "Period", 1)
+
+    for period, rows in sorted(by_period.items()):
+        table = archive_table(period)
+        if table in tables:
+            archived = storage.read(table)
+        else:
+            storage.create_table(table, header)
+            archived = [list(header)]
+        archive_header = archived[0]
+        missing = [name for name in header if name not in archive_header]
+        if missing:
+            archive_header = archive_header + missing
+            storage.set_header(table, archive_header)
+        known = rows_by_id(archived)
+        fresh = _relayout([r for r in rows if r[id_col] not in known], header, archive_header)
+        if fresh:
+            storage.append_rows(table, fresh)
+
+        # Rebuild the period's rollup from everything archived for it
+        party_col, balance_col = column_of(archive_header, "Party"), column_of(archive_header, "Balance", 4)
+        nets, counts = defaultdict(float), Counter()
+        for row in archived[1:] + fresh:
+            party = row[party_col] if party_col < len(row) else ""
+            nets[party] += to_amount(row[balance_col] if balance_col < len(row) else "")
+            counts[party] += 1
+        stale = [i for i, row in enumerate(rollup[1:], start=2) if period_col < len(row) and row[period_col] == period]
+        if stale:
+            storage.delete_rows(ROLLUP_TABLE, stale)
+            stale = set(stale)
+            rollup = [row for i, row in enumerate(rollup, start=1) if i not in stale]
+        new_rows = [[party, period, amount_text(net), str(counts[party]), new_row_id()] for party, net in nets.items()]
+        storage.append_rows(ROLLUP_TABLE, new_rows)
+        rollup += new_rows
+
+    current = storage.locate_rows(ledger, moving)
+    if current:
+        storage.delete_rows(ledger, list(current.values()))
+    return {period: len(rows) for period, rows in sorted(by_period.items())}
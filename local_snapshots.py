@@ -0,0 +1,152 @@
+import io
+import json
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from delta_sync import fingerprint
+
+SUFFIX = ".parquet"
+
+
+# --- Column names for the file: the header where usable, else "column N" ---
+def _column_names(header, width):
+    names, seen = [], set()
+    for i in range(width):
+        name = header[i].strip() if i < len(header) else ""
+        if not name or name in seen:
+            name = f"column {i + 1}"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+# --- Local Parquet copies of worksheets ---
+class LocalSnapshots:
+    """The last full read of every worksheet, kept as one Parquet file each.
+
+    Files live under ``directory``/<spreadsheet id>, with the sheet's exact
+    header, its fingerprint and the time it was read in the file metadata.
+    Cells stay text, as the sheet returned them, so a file loads back into
+    the same values; column names are the header for offline use (pandas
+    ``read_parquet``). Saves run on one background thread.
+
+    ``first_use(tables)`` hands out each table once per process, for
+    serving its first read from disk while the sheet is checked.
+    """
+
+    def __init__(self, directory, spreadsheet_id):
+        self.directory = os.path.join(directory, spreadsheet_id)
+        os.makedirs(self.directory, exist_ok=True)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="local-snapshots")
+        self._lock = threading.Lock()
+        self._used = set()
+        # Info of every saved copy: listed from disk once, then kept up to date by saves
+        self._infos = None
+        self.metrics = {"saved": 0, "skipped": 0, "served": 0, "failed": 0, "last_error": None}
+
+    def _path(self, table):
+        return os.path.join(self.directory, quote(table, safe="") + SUFFIX)
+
+    def first_use(self, tables):
+        with self._lock:
+            fresh = [t for t in tables if t not in self._used]
+            self._used.update(fresh)
+            return fresh
+
+    # --- Save ---
+    def save_later(self, table, values):
+        # The caller may go on changing its list; its rows are not changed in place
+        self._writer.submit(self._save, table, list(values), time.time())
+
+    def _save(self, table, values, synced_at):
+        try:
+            digest = fingerprint(values)
+            info = self.tables().get(table)
+            if info is not None and info["fingerprint"] == digest:
+                self.metrics["skipped"] += 1
+                return
+            header = values[0] if values else []
+            width = max(map(len, values), default=0)
+            names = _column_names(header, width)
+            columns = {name: [row[i] if i < len(row) else "" for row in values[1:]] for i, name in enumerate(names)}
+            data = pa.table({name: pa.array(cells, pa.string()) for name, cells in columns.items()})
+            data = data.replace_schema_metadata({
+                "table": table,
+                "header": json.dumps(header),
+                "fingerprint": digest,
+                "synced_at": str(synced_at),
+            })
+            path = self._path(table)
+            pq.write_table(data, path + ".tmp")
+            os.replace(path + ".tmp", path)
+            with self._lock:
+                self._infos[table] = {
+                    "table": table, "fingerprint": digest, "synced_at": synced_at,
+                    "rows": len(values) - 1 if values else 0, "bytes": os.path.getsize(path),
+                }
+            self.metrics["saved"] += 1
+        except (OSError, pa.ArrowException) as e:
+            self.metrics["failed"] += 1
+            self.metrics["last_error"] = str(e)
+
+    # --- Load ---
+    def load(self, table):
+        """(values, info) of the saved copy, or None if there is none or it can't be read."""
+        path = self._path(table)
+        if not os.path.exists(path):
+            return None
+        try:
+            data = pq.read_table(path)
+        except (OSError, pa.ArrowException):
+            return None
+        info = self._info(data.schema.metadata, path)
+        columns = [column.to_pylist() for column in data.columns]
+        values = [json.loads(info.pop("header"))] + [list(row) for row in zip(*columns)]
+        self.metrics["served"] += 1
+        return values, info
+
+    def _info(self, meta, path):
+        meta = {k.decode(): v.decode() for k, v in (meta or {}).items()}
+        return {
+            "table": meta.get("table", unquote(os.path.basename(path)[:-len(SUFFIX)])),
+            "header": meta.get("header", "[]"),
+            "fingerprint": meta.get("fingerprint"),
+            "synced_at": float(meta.get("synced_at", 0)),
+        }
+
+    def info(self, table):
+        path = self._path(table)
+        if not os.path.exists(path):
+            return None
+        try:
+            info = self._info(pq.read_schema(path).metadata, path)
+            info["rows"] = pq.read_metadata(path).num_rows
+        except (OSError, pa.ArrowException):
+            return None
+        info.pop("header")
+        info["bytes"] = os.path.getsize(path)
+        return info
+
+    def tables(self):
+        """Info of every saved copy, by table name."""
+        with self._lock:
+            if self._infos is None:
+                names = [unquote(f[:-len(SUFFIX)]) for f in sorted(os.listdir(self.directory)) if f.endswith(SUFFIX)]
+                self._infos = {name: info for name in names if (info := self.info(name)) is not None}
+            return dict(self._infos)
+
+    # --- Offline export: every saved copy in one zip ---
+    def export_zip(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for f in sorted(os.listdir(self.directory)):
+                if f.endswith(SUFFIX):
+                    zf.write(os.path.join(self.directory, f), unquote(f[:-len(SUFFIX)]).replace("/", "_") + SUFFIX)
+        return buffer.getvalue()
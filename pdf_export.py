@@ -0,0 +1,194 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from fpdf import FPDF
+
+from ledger_index import amount_text
+
+COLUMNS = ["Date", "Amount", "Payment", "Balance"]
+COL_WIDTH = 45
+ROW_HEIGHT = 8
+# Below this many rows, worker start-up costs more than it saves
+PARALLEL_MIN_ROWS = 20000
+
+
+# --- FPDF core fonts only cover latin-1 ---
+def _latin1(text):
+    return str(text).encode("latin-1", "replace").decode("latin-1")
+
+
+def _money(value):
+    return f"Rs. {value}" if value != "" else ""
+
+
+def _amount(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# --- PDF with page numbers in the footer ---
+class StatementPDF(FPDF):
+    def footer(self):
+        self.set_y(-15)
+        self.set_font("Arial", size=8)
+        self.cell(0, 10, f"Page {self.page_no()}/{{nb}}", align="C")
+
+
+# --- Render one party statement to bytes ---
+def render_statement(party_name, rows):
+    """Build a party statement PDF in memory.
+
+    ``rows`` is a list of (date, amount, payment, balance) tuples. The table
+    header is repeated on every page and a totals row closes the statement.
+    """
+    pdf = StatementPDF()
+    pdf.alias_nb_pages()
+    pdf.set_auto_page_break(False)
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    pdf.cell(200, 10, txt=_latin1(f"Party: {party_name}"), ln=True, align="L")
+    pdf.cell(200, 10, txt=" ", ln=True)
+
+    def header():
+        pdf.set_font("Arial", "B", 11)
+        for col in COLUMNS:
+            pdf.cell(COL_WIDTH, ROW_HEIGHT, col, 1)
+        pdf.ln()
+        pdf.set_font("Arial", size=11)
+
+    header()
+    totals = [0.0, 0.0, 0.0]
+    for date, amount, payment, balance in rows:
+        if pdf.get_y() + 2 * ROW_HEIGHT > pdf.page_break_trigger:
+            pdf.add_page()
+            header()
+        pdf.cell(COL_WIDTH, ROW_HEIGHT, _latin1(date), 1)
+        pdf.cell(COL_WIDTH, ROW_HEIGHT, _latin1(_money(amount)), 1)
+        pdf.cell(COL_WIDTH, ROW_HEIGHT, _latin1(_money(payment)), 1)
+        pdf.cell(COL_WIDTH, ROW_HEIGHT, _latin1(_money(balance)), 1)
+        pdf.ln()
+        for i, value in enumerate((amount, payment, balance)):
+            totals[i] += _amount(value)
+
+    # Totals footer
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(COL_WIDTH, ROW_HEIGHT, f"Total ({len(rows)} entries)", 1)
+    for total in totals:
+        pdf.cell(COL_WIDTH, ROW_HEIGHT, f"Rs. {amount_text(total)}", 1)
+    pdf.ln()
+
+    return pdf.output(dest="S").encode("latin-1")
+
+
+# --- Text of a typed column: ISO dates, amounts as on the sheet ---
+def _column_text(column):
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column.dt.strftime("%Y-%m-%d").fillna("")
+    if pd.api.types.is_numeric_dtype(column):
+        return column.map(amount_text)
+    return column.astype(str)
+
+
+# --- Statement rows of a party DataFrame ---
+def statement_rows(party_data):
+    text = pd.DataFrame({col: _column_text(party_data[col]) for col in COLUMNS})
+    return list(text.itertuples(index=False, name=None))
+
+
+# --- Cache key: the party name and every row of its statement ---
+def statement_digest(party_name, rows):
+    digest = hashlib.sha1(party_name.encode("utf-8"))
+    for row in rows:
+        digest.update("\x1f".join(row).encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+
+# --- ZIP entry names: unsafe characters replaced, clashes numbered ---
+def zip_entry_names(party_names):
+    # Compared case-blind, since the ZIP may be unpacked on Windows or macOS
+    used, entries = set(), {}
+    for name in party_names:
+        base = re.sub(r'[\\/:*?"<>|]', "_", f"{name}_records")
+        entry, n = f"{base}.pdf", 1
+        while entry.lower() in used:
+            n += 1
+            entry = f"{base} ({n}).pdf"
+        used.add(entry.lower())
+        entries[name] = entry
+    return entries
+
+
+# --- Rendered statements, keyed by digest ---
+class StatementCache:
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._pdfs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            pdf = self._pdfs.get(digest)
+            if pdf is not None:
+                self._pdfs.move_to_end(digest)
+            return pdf
+
+    def put(self, digest, pdf):
+        with self._lock:
+            self._pdfs[digest] = pdf
+            self._pdfs.move_to_end(digest)
+            while len(self._pdfs) > self.max_entries:
+                self._pdfs.popitem(last=False)
+
+    def statement(self, party_name, rows):
+        digest = statement_digest(party_name, rows)
+        pdf = self.get(digest)
+        if pdf is None:
+            pdf = render_statement(party_name, rows)
+            self.put(digest, pdf)
+        return pdf
+
+    def statements_zip(self, parties, max_workers=None):
+        """ZIP of statements for ``parties`` ({name: rows}).
+
+        Statements not in the cache are rendered in parallel worker
+        processes when the batch is big enough (FPDF is pure Python, so
+        threads would serialise on the GIL).
+        """
+        max_workers = max_workers or os.cpu_count() or 1
+        pdfs = {}
+        todo = {}
+        for name, rows in parties.items():
+            digest = statement_digest(name, rows)
+            pdfs[name] = self.get(digest)
+            if pdfs[name] is None:
+                todo[name] = (digest, rows)
+
+        todo_rows = sum(len(rows) for _, rows in todo.values())
+        if len(todo) > 1 and max_workers > 1 and todo_rows >= PARALLEL_MIN_ROWS:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(todo)), mp_context=ctx) as pool:
+                futures = {name: pool.submit(render_statement, name, rows) for name, (_, rows) in todo.items()}
+                rendered = {name: f.result() for name, f in futures.items()}
+        else:
+            rendered = {name: render_statement(name, rows) for name, (_, rows) in todo.items()}
+
+        for name, pdf in rendered.items():
+            self.put(todo[name][0], pdf)
+            pdfs[name] = pdf
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, entry in zip_entry_names(pdfs).items():
+                zf.writestr(entry, pdfs[name])
+        return buffer.getvalue()
@@ -0,0 +1,171 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from itertools import chain
+from logging.handlers import RotatingFileHandler
+
+# Profile of the rerun running on this thread (each session's script has its own)
+_active = threading.local()
+
+
+# --- Rows and characters carried by a Sheets request or response ---
+def payload_size(obj):
+    if isinstance(obj, dict):
+        obj = [v for v in obj.values() if isinstance(v, (list, tuple, dict))]
+    if not isinstance(obj, (list, tuple)) or not obj:
+        return 0, 0
+    if isinstance(obj[0], (list, tuple)) and obj[0] and not isinstance(obj[0][0], (list, tuple, dict)):
+        # A block of rows: the common case, kept fast for big reads
+        try:
+            return len(obj), sum(map(len, chain.from_iterable(obj)))
+        except TypeError:
+            return len(obj), sum(len(str(cell)) for cell in chain.from_iterable(obj))
+    if isinstance(obj[0], (str, int, float)):
+        return 1, sum(len(str(cell)) for cell in obj)
+    rows = size = 0
+    for item in obj:
+        if not isinstance(item, (list, tuple, dict)):
+            continue
+        r, s = payload_size(item)
+        rows += r
+        size += s
+    return rows, size
+
+
+# --- Per-op call totals ---
+class CallStats:
+    def __init__(self):
+        self.count = Counter()
+        self.seconds = Counter()
+        self.rows = Counter()
+        self.bytes = Counter()
+        self.errors = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, call):
+        with self._lock:
+            op = call["op"]
+            self.count[op] += 1
+            self.seconds[op] += call["seconds"]
+            self.rows[op] += call["rows"]
+            self.bytes[op] += call["bytes"]
+            self.errors[op] += call["error"] is not None
+
+    def table(self):
+        with self._lock:
+            return [
+                {"op": op, "calls": n, "ms": round(self.seconds[op] * 1000, 1), "rows": self.rows[op],
+                 "bytes": self.bytes[op], "errors": self.errors[op]}
+                for op, n in self.count.most_common()
+            ]
+
+
+# Calls made outside any rerun (the write queue worker)
+BACKGROUND = CallStats()
+
+
+# --- One script run ---
+class RerunProfile:
+    """Timed sections of one rerun and every Sheets call it made.
+
+    ``lap(name)`` charges the time since the previous lap to ``name``, so
+    sections can be marked without re-indenting the script.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.sections = {}
+        self.calls = []
+        self.finished = False
+        self.ended_early = False
+        self.seconds = 0.0
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.sections[name] = self.sections.get(name, 0.0) + now - self.last
+        self.last = now
+
+    def add_call(self, call):
+        self.calls.append(call)
+
+    def finish(self, ended_early=False):
+        # A run cut short by st.rerun()/st.stop() is closed at its last lap
+        if not ended_early:
+            self.lap("rest")
+        self.seconds = self.last - self.started
+        self.ended_early = ended_early
+        self.finished = True
+
+    def call_seconds(self):
+        return sum(c["seconds"] for c in self.calls)
+
+    def as_record(self):
+        return {
+            "total_ms": round(self.seconds * 1000, 1),
+            "ended_early": self.ended_early,
+            "sections_ms": {name: round(s * 1000, 1) for name, s in self.sections.items()},
+            "sheets_calls": len(self.calls),
+            "sheets_ms": round(self.call_seconds() * 1000, 1),
+            "calls": [dict(c, seconds=round(c["seconds"], 4)) for c in self.calls],
+        }
+
+
+def start_rerun():
+    profile = RerunProfile()
+    _active.profile = profile
+    return profile
+
+
+# --- Is this thread drawing a rerun (a user waiting on it)? ---
+def in_rerun():
+    profile = getattr(_active, "profile", None)
+    return profile is not None and not profile.finished
+
+
+def record_call(op, table, seconds, rows, nbytes, error=None):
+    call = {"op": op, "table": table, "seconds": seconds, "rows": rows, "bytes": nbytes, "error": error}
+    profile = getattr(_active, "profile", None)
+    if profile is not None and not profile.finished:
+        profile.add_call(call)
+    else:
+        BACKGROUND.add(call)
+
+
+# --- Totals over every rerun of a session ---
+class SessionTotals:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.reruns = 0
+        self.seconds = 0.0
+        self.slowest = 0.0
+        self.sections = Counter()
+        self.calls = CallStats()
+
+    def add(self, profile):
+        self.reruns += 1
+        self.seconds += profile.seconds
+        self.slowest = max(self.slowest, profile.seconds)
+        self.sections.update(profile.sections)
+        for call in profile.calls:
+            self.calls.add(call)
+
+
+# --- Slow rerun log (rotating JSON lines) ---
+class SlowLog:
+    def __init__(self, path, threshold_ms=2000, max_bytes=1_000_000, backups=3):
+        self.threshold = threshold_ms / 1000
+        self.logger = logging.getLogger(f"slow_reruns.{path}")
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            self.logger.addHandler(RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"))
+
+    def maybe_log(self, profile, **context):
+        if profile.seconds < self.threshold:
+            return False
+        record = dict(context, ts=time.strftime("%Y-%m-%dT%H:%M:%S"), **profile.as_record())
+        self.logger.info(json.dumps(record, ensure_ascii=False))
+        return True
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+# Age of the unpaid part of a bill, in days since its date
+AGING_BUCKETS = ["0–30 days", "31–60 days", "61–90 days", "90+ days"]
+AGING_EDGES = [-np.inf, 30, 60, 90, np.inf]
+# Undated bills count as the oldest
+UNDATED = pd.Timestamp("1900-01-01")
+
+
+# --- Receivables of every party ---
+def build_receivables(frame, today, carried=None, carried_as_of=None):
+    """Outstanding balance and its aging for every party of a typed ledger frame.
+
+    Payments settle the oldest bills first, so what a party still owes is
+    the newest bills that add up to its balance. Each of those is aged from
+    its date into AGING_BUCKETS. ``carried`` ({party: balance}, from the
+    closed-period rollups) adds to the balance and, where the ledger's
+    bills don't cover it, is aged from ``carried_as_of``. Parties that are
+    owed money show a negative balance and nothing to age.
+
+    One grouped pass over the rows, so the cost follows the ledger size
+    rather than the number of parties.
+    """
+    today = pd.Timestamp(today).normalize()
+    party = frame["Party"].astype(str)
+    dates = frame["Date"]
+    amount = frame["Amount"]
+    paid = frame["Payment"] > 0
+
+    outstanding = frame["Balance"].groupby(party, sort=False).sum()
+    bills = pd.DataFrame({"party": party, "date": dates.fillna(UNDATED), "amount": amount})[amount > 0]
+    if carried:
+        carried = pd.Series(carried, dtype="float64")
+        outstanding = outstanding.add(carried, fill_value=0)
+        brought = carried[carried > 0]
+        bills = pd.concat([bills, pd.DataFrame({
+            "party": brought.index, "amount": brought.values,
+            "date": pd.Timestamp(carried_as_of) if carried_as_of is not None else UNDATED,
+        })], ignore_index=True)
+
+    # Newest bills first; each is unpaid for whatever the balance leaves after newer ones
+    bills = bills.sort_values(["party", "date"], ascending=[True, False], kind="stable")
+    newer = bills.groupby("party", sort=False)["amount"].cumsum() - bills["amount"]
+    unpaid = (bills["party"].map(outstanding) - newer).clip(lower=0)
+    unpaid = unpaid.where(unpaid < bills["amount"], bills["amount"])
+    age = pd.cut((today - bills["date"]).dt.days, AGING_EDGES, labels=AGING_BUCKETS)
+    aging = (
+        unpaid.groupby([bills["party"], age], observed=False).sum()
+        .unstack(fill_value=0.0)
+        .reindex(index=outstanding.index, columns=AGING_BUCKETS, fill_value=0.0)
+    )
+
+    last_payment = dates[paid].groupby(party[paid], sort=False).max().reindex(outstanding.index)
+    report = pd.DataFrame({"Party": outstanding.index, "Outstanding": outstanding.round(2).values})
+    for bucket in AGING_BUCKETS:
+        report[bucket] = aging[bucket].round(2).values
+    report["Last payment"] = last_payment.values
+    report["Days since payment"] = (today - last_payment).dt.days.astype("Int64").values
+    report["Last entry"] = dates.groupby(party, sort=False).max().reindex(outstanding.index).values
+    return report.sort_values("Outstanding", ascending=False, kind="stable").reset_index(drop=True)
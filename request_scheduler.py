@@ -0,0 +1,195 @@
+import copy
+import threading
+import time
+from collections import Counter, deque
+
+import gspread
+
+import profiling
+
+# Sheets API methods charged to the read quota; everything else is a write
+READ_OPS = {
+    "get_all_values", "get_values", "batch_get", "col_values", "row_values",
+    "values_batch_get", "worksheets", "worksheet", "fetch_sheet_metadata",
+}
+
+
+def quota_class(op):
+    return "read" if op in READ_OPS else "write"
+
+
+# --- Token bucket: ``per_minute`` requests a minute, ``burst`` saved up ---
+class TokenBucket:
+    def __init__(self, per_minute, burst=None):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst or max(1, per_minute // 3))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _fill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, reserve=0.0):
+        """Seconds until a token is free with ``reserve`` tokens left over (0 if one is now)."""
+        self._fill()
+        short = 1.0 + reserve - self.tokens
+        return 0.0 if short <= 0 else short / self.rate
+
+    def take(self):
+        self.tokens -= 1.0
+
+    def drain(self, seconds):
+        # After a 429 nothing goes out for ``seconds``
+        self._fill()
+        self.tokens = min(self.tokens, 0.0) - seconds * self.rate
+
+
+# --- Private copy of a coalesced read (callers may change what they get back) ---
+def _copy(result):
+    if isinstance(result, list) and all(isinstance(row, list) for row in result):
+        return [list(row) for row in result]
+    if isinstance(result, list):
+        return list(result)
+    return copy.deepcopy(result)
+
+
+def _status(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+# --- Scheduler every Sheets request goes through ---
+class RequestScheduler:
+    """Keeps Sheets requests of all sessions within the per-minute quotas.
+
+    Reads and writes each draw from their own token bucket. Requests made
+    while a rerun is drawing (a user is waiting) are interactive; the rest
+    (the write queue worker) are background and wait while an interactive
+    request is waiting, and leave ``reserve`` of each bucket for users.
+    Identical reads in flight at the same time are sent once and every
+    caller gets its own copy of the answer. A 429 empties the bucket and
+    the request is retried with exponential backoff, up to ``max_retries``.
+    """
+
+    def __init__(self, reads_per_minute=60, writes_per_minute=60, burst=None, reserve=0.2,
+                 max_retries=4, base_delay=2.0):
+        self.buckets = {
+            "read": TokenBucket(reads_per_minute, burst),
+            "write": TokenBucket(writes_per_minute, burst),
+        }
+        self.reserve = reserve
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._cond = threading.Condition()
+        self._interactive_waiting = 0
+        self._inflight = {}
+        self._sent = {"read": deque(), "write": deque()}
+        self.metrics = Counter()
+
+    def run(self, op, table, fn, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        kind = quota_class(op)
+        if kind == "write":
+            return self._send(kind, fn, args, kwargs)
+
+        key = (op, table, repr(args), repr(sorted(kwargs.items())))
+        with self._cond:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = {"done": threading.Event(), "followers": 0}
+            else:
+                flight["followers"] += 1
+                self.metrics["coalesced"] += 1
+        if not leader:
+            flight["done"].wait()
+            if "error" in flight:
+                raise flight["error"]
+            return flight["copies"].pop()
+        try:
+            result = self._send(kind, fn, args, kwargs)
+        except BaseException as e:
+            flight["error"] = e
+            raise
+        else:
+            # Nobody can join once the flight is gone: one copy per follower,
+            # made before the leader can change its own result
+            with self._cond:
+                self._inflight.pop(key, None)
+            flight["copies"] = [_copy(result) for _ in range(flight["followers"])]
+            return result
+        finally:
+            with self._cond:
+                self._inflight.pop(key, None)
+            flight["done"].set()
+
+    def _send(self, kind, fn, args, kwargs):
+        interactive = profiling.in_rerun()
+        for attempt in range(self.max_retries + 1):
+            self._acquire(kind, interactive)
+            try:
+                return fn(*args, **kwargs)
+            except gspread.exceptions.APIError as e:
+                if _status(e) != 429 or attempt == self.max_retries:
+                    raise
+                with self._cond:
+                    self.metrics["rate_limited"] += 1
+                    self.buckets[kind].drain(self.base_delay * 2 ** attempt)
+                    self._cond.notify_all()
+
+    def _acquire(self, kind, interactive):
+        bucket = self.buckets[kind]
+        started = time.monotonic()
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while True:
+                    if interactive:
+                        wait = bucket.wait_time()
+                    elif self._interactive_waiting:
+                        wait = 0.5
+                    else:
+                        wait = bucket.wait_time(min(bucket.capacity * self.reserve, bucket.capacity - 1))
+                    if wait <= 0:
+                        break
+                    self._cond.wait(min(wait, 1.0))
+                bucket.take()
+                self._note_sent(kind, time.monotonic())
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+                    self._cond.notify_all()
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self.metrics[f"{kind}_waits"] += 1
+                self.metrics[f"{kind}_wait_seconds"] += waited
+
+    def _note_sent(self, kind, now=None):
+        sent = self._sent[kind]
+        if now is not None:
+            sent.append(now)
+        now = time.monotonic()
+        while sent and now - sent[0] > 60:
+            sent.popleft()
+        return len(sent)
+
+    def stats(self):
+        """Quota use per class over the last minute, plus waits, merged reads and 429s."""
+        with self._cond:
+            out = {}
+            for kind, bucket in self.buckets.items():
+                bucket.wait_time()
+                out[kind] = {
+                    "per_minute": bucket.per_minute,
+                    "last_minute": self._note_sent(kind),
+                    "available": max(0, int(bucket.tokens)),
+                    "waits": self.metrics[f"{kind}_waits"],
+                    "wait_seconds": self.metrics[f"{kind}_wait_seconds"],
+                }
+            out["coalesced"] = self.metrics["coalesced"]
+            out["rate_limited"] = self.metrics["rate_limited"]
+            return out
@@ -0,0 +1,69 @@
+import copy
+
+from storage import ROW_ID
+
+
+# --- Row ID index ---
+class RowIdIndex:
+    """Row ID -> data position of a table snapshot.
+
+    Kept in step with the snapshot through the SnapshotCache hooks, so a
+    row can be found by its ID without rescanning or refetching the sheet.
+    Positions are 0-based data rows, i.e. sheet row = position + 2. The
+    hooks return a changed copy and leave this index as it was.
+    """
+
+    def __init__(self, values):
+        header = values[0] if values else []
+        self.col = header.index(ROW_ID) if ROW_ID in header else None
+        self.ids = [self._id(row) for row in values[1:]]
+        self.positions = {row_id: pos for pos, row_id in enumerate(self.ids) if row_id}
+
+    def _id(self, row):
+        return row[self.col] if self.col is not None and self.col < len(row) else ""
+
+    def __contains__(self, row_id):
+        return row_id in self.positions
+
+    def position(self, row_id):
+        return self.positions.get(row_id)
+
+    def sheet_row(self, row_id):
+        pos = self.positions.get(row_id)
+        return None if pos is None else pos + 2
+
+    # --- Incremental updates (called by SnapshotCache) ---
+    def _copy(self):
+        new = copy.copy(self)
+        new.ids = list(self.ids)
+        new.positions = dict(self.positions)
+        return new
+
+    def on_append(self, row):
+        return self.on_extend([row])
+
+    def on_extend(self, rows):
+        new = self._copy()
+        for row in rows:
+            row_id = self._id(row)
+            new.ids.append(row_id)
+            if row_id:
+                new.positions[row_id] = len(new.ids) - 1
+        return new
+
+    def on_update(self, position, old_row, new_row):
+        new = self._copy()
+        new.positions.pop(new.ids[position], None)
+        new.ids[position] = self._id(new_row)
+        if new.ids[position]:
+            new.positions[new.ids[position]] = position
+        return new
+
+    def on_delete(self, position, row):
+        new = self._copy()
+        new.positions.pop(new.ids.pop(position), None)
+        # Rows below the deleted one move up by one
+        for pos in range(position, len(new.ids)):
+            if new.ids[pos]:
+                new.positions[new.ids[pos]] = pos
+        return new
@@ -0,0 +1,170 @@
+import copy
+import threading
+
+import pandas as pd
+
+from storage import ROW_ID
+
+# Column kinds: "category" (repeated names), "date", "amount" (decimal),
+# "count" (whole number) and "text" (kept as is)
+LEDGER_SCHEMA = {
+    "Party": "category",
+    "Date": "date",
+    "Amount": "amount",
+    "Payment": "amount",
+    "Balance": "amount",
+    "Running Balance": "amount",
+    ROW_ID: "text",
+}
+STOCK_SCHEMA = {
+    "item": "category",
+    "date": "date",
+    "current_stock": "count",
+    "new_stock": "count",
+    "sold_qty": "count",
+    "final_stock": "count",
+    ROW_ID.lower(): "text",
+}
+
+
+# --- Convert one column; returns (typed series, mask of malformed cells) ---
+def convert(raw, kind):
+    blank = raw.isna() | (raw == "")
+    if kind == "category":
+        return raw.fillna("").astype("category"), blank & False
+    if kind == "date":
+        typed = pd.to_datetime(raw, format="ISO8601", errors="coerce")
+        return typed, typed.isna() & ~blank
+    if kind in ("amount", "count"):
+        try:
+            # Fast path: every non-blank cell is a plain number
+            typed = raw.mask(blank, "0").astype("float64")
+            bad = blank & False
+        except (TypeError, ValueError):
+            typed = pd.to_numeric(raw, errors="coerce")
+            bad = typed.isna() & ~blank
+        typed = typed.fillna(0)
+        if kind == "count":
+            bad |= typed != typed.round()
+            return typed.round().astype("int64"), bad
+        return typed.astype("float64"), bad
+    return raw.fillna(""), blank & False
+
+
+# --- Typed frame of a sheet snapshot ---
+class TypedTable:
+    """A sheet snapshot converted once into typed columns.
+
+    Columns named in ``schema`` (matched case-insensitively, renamed to
+    the schema's spelling) get their kind's dtype: categorical names,
+    datetime64 dates and numeric amounts, with blanks as 0. Cells that
+    don't parse become NaT/0 and are listed in ``issues`` as
+    (sheet row, column, value). Other columns are kept as text.
+
+    Kept in step with the snapshot through the SnapshotCache hooks, so
+    every view of a session shares one frame per snapshot. The hooks
+    return a new TypedTable; this one and its frame stay as they were.
+    The hooks only note the change: ``frame`` and ``issues`` are worked
+    out on first read, so an append costs the same at any table size and
+    a run of appended rows is parsed and joined in one go.
+    """
+
+    def __init__(self, values, schema):
+        self.schema = schema
+        canonical = {name.lower(): name for name in schema}
+        header = values[0] if values else []
+        self.columns = [canonical.get(h.strip().lower(), h) for h in header]
+        for name in schema:
+            if name not in self.columns:
+                self.columns.append(name)
+        self.size = len(values) - 1 if values else 0
+        self._set(self._parse(values[1:], first_position=0))
+
+    # --- Frame and issues, built on first read ---
+    def _set(self, built=None, base=None, tail=()):
+        # ``base()`` gives (frame, issues) before the rows in ``tail`` are appended
+        self._built = built
+        self._base = base
+        self._tail = list(tail)
+        self._lock = threading.Lock()
+
+    def _build(self):
+        with self._lock:
+            if self._built is None:
+                frame, issues = self._base()
+                if self._tail:
+                    new, new_issues = self._parse(self._tail, first_position=len(frame))
+                    frame, issues = self._concat([frame, new]), issues + new_issues
+                self._built = frame, issues
+                self._base, self._tail = None, []
+            return self._built
+
+    @property
+    def frame(self):
+        return self._build()[0]
+
+    @property
+    def issues(self):
+        return self._build()[1]
+
+    def _parse(self, rows, first_position):
+        width = len(self.columns)
+        rows = [r if len(r) == width else list(r[:width]) + [""] * (width - len(r)) for r in rows]
+        raw = pd.DataFrame(rows, columns=self.columns, dtype=object)
+        raw.index = pd.RangeIndex(first_position, first_position + len(rows))
+        typed = {}
+        issues = []
+        for col in self.columns:
+            typed[col], bad = convert(raw[col], self.schema.get(col, "text"))
+            for pos in bad[bad].index:
+                issues.append((pos + 2, col, raw.at[pos, col]))
+        return pd.DataFrame(typed, index=raw.index), issues
+
+    # --- Incremental updates (called by SnapshotCache) ---
+    def _with(self, size, base, tail=()):
+        new = copy.copy(self)
+        new.size = size
+        new._set(base=base, tail=tail)
+        return new
+
+    def on_append(self, row):
+        return self.on_extend([row])
+
+    def on_extend(self, rows):
+        # Rows still waiting to be parsed are carried over, not built
+        with self._lock:
+            base, tail = ((lambda built=self._built: built), []) if self._built is not None else (self._base, self._tail)
+        return self._with(self.size + len(rows), base, tail + [list(row) for row in rows])
+
+    def on_update(self, position, old_row, new_row):
+        def base():
+            frame, issues = self._build()
+            new, new_issues = self._parse([new_row], first_position=position)
+            frame = self._concat([frame.iloc[:position], new, frame.iloc[position + 1:]])
+            return frame, [i for i in issues if i[0] != position + 2] + new_issues
+
+        return self._with(self.size, base)
+
+    def on_delete(self, position, row):
+        def base():
+            frame, issues = self._build()
+            # Rows below the deleted one move up by one
+            return frame.drop(index=position).reset_index(drop=True), [
+                (r - 1 if r > position + 2 else r, c, v) for r, c, v in issues if r != position + 2
+            ]
+
+        return self._with(self.size - 1, base)
+
+    def _concat(self, parts):
+        # Categoricals only stay categorical if every part has the same
+        # categories; the parts themselves are left as they are
+        parts = [p.copy(deep=False) for p in parts]
+        for col, kind in self.schema.items():
+            if kind == "category":
+                categories = parts[0][col].cat.categories
+                for p in parts[1:]:
+                    categories = categories.union(p[col].cat.categories)
+                for p in parts:
+                    if not p[col].cat.categories.equals(categories):
+                        p[col] = p[col].cat.set_categories(categories)
+        return pd.concat(parts).reset_index(drop=True)
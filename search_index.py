@@ -0,0 +1,230 @@
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from heapq import nlargest
+from math import ceil
+
+
+# --- Character trigrams of a lowercase string ---
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# --- Name search index ---
+class SearchIndex:
+    """Ranked, typo-tolerant lookup over a set of names.
+
+    Keeps sorted lists of lowercase names and of their words for prefix
+    matches, and a trigram -> names map for substring and fuzzy matches.
+    Results are ranked by match quality (whole-name prefix, word prefix,
+    substring, fuzzy), then by how often the name is used. Fuzzy matching
+    only runs when nothing matches the query as typed.
+
+    A one-letter prefix can match thousands of names, so the best ``top_k``
+    prefix matches of each query are kept (at most ``max_prefixes`` queries)
+    and updated as names are added, instead of being ranked on every key.
+
+    Changes and searches take the index's own lock, so one index can be
+    changed in place while other threads search it.
+    """
+
+    top_k = 20
+    max_prefixes = 1024
+
+    def __init__(self, names=(), min_similarity=0.45):
+        self.min_similarity = min_similarity
+        self._lock = threading.RLock()
+        self.top = {}
+        self.counts = Counter()
+        self.names = {}
+        self.gram_sizes = {}
+        self.sorted_names = []
+        self.sorted_words = []
+        self.grams = {}
+        for name, count in Counter(names).items():
+            self._insert(name, count, sort=False)
+        self.sorted_names.sort()
+        self.sorted_words.sort()
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, count=1):
+        with self._lock:
+            self._insert(name, count, sort=True)
+
+    def _insert(self, name, count, sort):
+        if not name:
+            return
+        self.counts[name] += count
+        if name in self.names:
+            self._retop(name, grew=True)
+            return
+        low = name.lower()
+        grams = trigrams(low)
+        self.names[name] = low
+        self.gram_sizes[name] = len(grams)
+        place = insort if sort else list.append
+        place(self.sorted_names, (low, name))
+        for word in set(low.split()):
+            place(self.sorted_words, (word, name))
+        for gram in grams:
+            self.grams.setdefault(gram, set()).add(name)
+        self._retop(name, grew=True)
+
+    def discard(self, name, count=1):
+        with self._lock:
+            self._discard(name, count)
+
+    def _discard(self, name, count):
+        if name not in self.names:
+            return
+        self.counts[name] -= count
+        self._retop(name, grew=False)
+        if self.counts[name] > 0:
+            return
+        del self.counts[name]
+        del self.gram_sizes[name]
+        low = self.names.pop(name)
+        self.sorted_names.pop(bisect_left(self.sorted_names, (low, name)))
+        for word in set(low.split()):
+            self.sorted_words.pop(bisect_left(self.sorted_words, (word, name)))
+        for gram in trigrams(low):
+            self.grams[gram].discard(name)
+            if not self.grams[gram]:
+                del self.grams[gram]
+
+    def _prefix_range(self, keys, prefix):
+        lo = bisect_left(keys, (prefix, ""))
+        hi = bisect_left(keys, (prefix + "\uffff", ""), lo)
+        return [name for _, name in reversed(keys[lo:hi])]
+
+    def _rank_prefixed(self, prefix, k):
+        # Whole-name matches outrank word matches, so the words are only
+        # looked at when fewer than k names start with the prefix. Names come
+        # in reverse order, so equal counts keep the (count, name) ranking.
+        rank = self.counts.__getitem__
+        names = self._prefix_range(self.sorted_names, prefix)
+        top = [(3, self.counts[n], n) for n in nlargest(k, names, key=rank)]
+        if len(top) < k:
+            names = set(names)
+            words = [n for n in dict.fromkeys(self._prefix_range(self.sorted_words, prefix)) if n not in names]
+            top += [(2, self.counts[n], n) for n in nlargest(k - len(top), words, key=rank)]
+        return top
+
+    def _prefix_top(self, query, limit):
+        if limit > self.top_k:
+            return self._rank_prefixed(query, limit)
+        top = self.top.get(query)
+        if top is None:
+            top = self.top[query] = self._rank_prefixed(query, self.top_k)
+            if len(self.top) > self.max_prefixes:
+                self.top.pop(next(iter(self.top)))
+        return top[:limit]
+
+    def _retop(self, name, grew):
+        # Keep the cached top lists of every query this name matches by
+        # prefix. A name that grew can only move up; one that shrank may
+        # fall behind a name that was cut off, so that list is dropped.
+        if not self.top:
+            return
+        low = self.names[name]
+        seen = set()
+        for text in [low] + low.split():
+            for i in range(1, len(text) + 1):
+                prefix = text[:i]
+                if prefix in seen or prefix not in self.top:
+                    continue
+                seen.add(prefix)
+                top = [entry for entry in self.top[prefix] if entry[2] != name]
+                if not grew:
+                    if len(top) < len(self.top[prefix]):
+                        del self.top[prefix]
+                    continue
+                tier = 3 if low.startswith(prefix) else 2
+                top.append((tier, self.counts[name], name))
+                top.sort(reverse=True)
+                self.top[prefix] = top[:self.top_k]
+
+    def search(self, query, limit=5):
+        with self._lock:
+            return self._search(query, limit)
+
+    def _search(self, query, limit):
+        query = " ".join(query.lower().split())
+        if not query:
+            return []
+        scores = {name: (tier, 1.0) for tier, _, name in self._prefix_top(query, limit)}
+
+        def score(name, tier, similarity=1.0):
+            key = (tier, similarity)
+            if name not in scores or key > scores[name]:
+                scores[name] = key
+
+        if len(query) >= 3 and len(scores) < limit:
+            # Substring hits contain every inner trigram of the query
+            inner = sorted((self.grams.get(query[i:i + 3], set()) for i in range(len(query) - 2)), key=len)
+            candidates = set.intersection(*inner) if inner[0] else set()
+            for name in candidates:
+                if query in self.names[name]:
+                    score(name, 1)
+
+        if len(query) >= 3 and not scores:
+            self._fuzzy(query, score)
+
+        ranked = sorted(scores, key=lambda n: (scores[n], self.counts[n], n), reverse=True)
+        return ranked[:limit]
+
+    def _fuzzy(self, query, score):
+        # Typos: rank by shared trigrams (Dice coefficient). A name reaching
+        # min_similarity shares at least `need` trigrams with the query, so it
+        # must appear in one of the (m - need + 1) rarest query postings.
+        query_grams = trigrams(query)
+        postings = sorted((self.grams.get(g, set()) for g in query_grams), key=len)
+        m = len(query_grams)
+        need = max(1, ceil(self.min_similarity * (m + 1) / 2))
+        candidates = set().union(*postings[:m - need + 1])
+        if not candidates:
+            return
+
+        shared = Counter()
+        for posting in postings:
+            shared.update(posting & candidates)
+        for name, common in shared.items():
+            similarity = 2 * common / (m + self.gram_sizes[name])
+            if similarity >= self.min_similarity:
+                score(name, 0, round(similarity, 3))
+
+
+# --- Search index over one column of a sheet snapshot ---
+class ColumnSearchIndex(SearchIndex):
+    """SearchIndex over a sheet column; usage = number of rows per name.
+
+    ``extra`` names (e.g. parties only found in archived periods) are
+    searchable too, counted once. The hooks change the index in place and
+    return it: it holds names only, no row positions, so a rerun that reads
+    an older snapshot's frame can't be misled by it.
+    """
+
+    def __init__(self, values, column, extra=()):
+        header = [c.strip().lower() for c in values[0]] if values else []
+        self.col = header.index(column.lower()) if column.lower() in header else 0
+        super().__init__(Counter(self._name(row) for row in values[1:]) + Counter(set(extra)))
+
+    def _name(self, row):
+        return row[self.col] if self.col < len(row) else ""
+
+    def on_append(self, row):
+        self.add(self._name(row))
+        return self
+
+    def on_update(self, position, old_row, new_row):
+        with self._lock:
+            self.discard(self._name(old_row))
+            self.add(self._name(new_row))
+        return self
+
+    def on_delete(self, position, row):
+        self.discard(self._name(row))
+        return self
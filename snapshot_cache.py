@@ -0,0 +1,318 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import ExitStack
+
+
+# --- One version of a cached table ---
+class Snapshot:
+    """A table's values and the objects derived from them, never changed.
+
+    A change to the table makes a new Snapshot instead: ``successor``
+    carries each derived object over through its hook, which returns the
+    object to keep (a changed copy, or itself if it holds nothing that
+    could disagree with the values). A rerun that keeps one Snapshot per
+    table therefore sees a frame and indexes that agree with each other,
+    whatever other sessions write meanwhile.
+
+    Derived objects are built on first use under a lock of their own, so
+    a slow build holds back only callers waiting for that same object.
+    """
+
+    def __init__(self, values, derived=None):
+        self.values = values
+        self._derived = dict(derived or {})
+        self._building = {}
+        self._lock = threading.Lock()
+
+    def derived(self, name, builder):
+        """``builder(values)``, built once for this snapshot."""
+        with self._lock:
+            if name in self._derived:
+                return self._derived[name]
+            build_lock = self._building.setdefault(name, threading.Lock())
+        with build_lock:
+            with self._lock:
+                if name in self._derived:
+                    return self._derived[name]
+            obj = builder(self.values)
+            with self._lock:
+                self._derived[name] = obj
+                self._building.pop(name, None)
+            return obj
+
+    def successor(self, values, hook, *args):
+        """Snapshot of ``values``; derived objects without ``hook`` are left to be rebuilt."""
+        with self._lock:
+            current = list(self._derived.items())
+        kept = {}
+        for name, obj in current:
+            if hasattr(obj, hook):
+                kept[name] = getattr(obj, hook)(*args)
+            elif hook == "on_extend" and hasattr(obj, "on_append"):
+                for row in args[0]:
+                    obj = obj.on_append(row)
+                kept[name] = obj
+        return Snapshot(values, kept)
+
+
+# --- Snapshot cache for worksheet reads ---
+class SnapshotCache:
+    """Read-through cache of worksheet values, shared by every session.
+
+    Entries are keyed by (spreadsheet id, worksheet title), expire after
+    ``ttl`` seconds and the least recently used entry is evicted once more
+    than ``max_entries`` worksheets are held.
+
+    Each entry is a ``Snapshot``: the values plus derived objects
+    (indexes, frames) built from them. Writes that we make ourselves are
+    applied by swapping in a successor snapshot instead of refetching, and
+    an expired snapshot can be brought up to date with just the rows
+    appended since (see ``get``); derived objects are carried over by
+    their hooks either way. Snapshots already handed out stay as they were.
+
+    It is the one copy of the data for every session: concurrent misses
+    on a worksheet wait for a single load instead of each fetching it, and
+    every change to a spreadsheet's data bumps ``version(spreadsheet id)``
+    so sessions can tell when to redraw from the shared copy.
+    """
+
+    def __init__(self, ttl=60, max_entries=32):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+        self.shared_loads = 0
+        # One load at a time per worksheet; later sessions wait and reuse it
+        self._loading = {}
+        self._versions = Counter()
+
+    def _fresh(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry["loaded_at"] < self.ttl:
+            return entry
+        return None
+
+    def get(self, key, loader, refresh=None):
+        """Cached values of ``key``, else ``loader()``.
+
+        If the snapshot has only expired, ``refresh(values)`` is tried
+        first: it returns the rows appended since, or None to fall back to
+        ``loader``.
+        """
+        with self._lock:
+            entry = self._fresh(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["snapshot"].values
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                # Loaded by another session while we waited
+                entry = self._fresh(key)
+                if entry is not None:
+                    self.hits += 1
+                    self.shared_loads += 1
+                    return entry["snapshot"].values
+                self.misses += 1
+                stale = self._entries.get(key)
+            return self._load(key, loader, refresh, stale)
+
+    def _load(self, key, loader, refresh, stale):
+        if stale is not None and refresh is not None:
+            snapshot = stale["snapshot"]
+            new_rows = refresh(snapshot.values)
+            with self._lock:
+                # Skipped if a write changed, dropped or replaced the entry meanwhile
+                if new_rows is not None and self._entries.get(key) is stale and stale["snapshot"] is snapshot:
+                    if new_rows:
+                        stale["snapshot"] = snapshot.successor(snapshot.values + new_rows, "on_extend", new_rows)
+                        self._versions[key[0]] += 1
+                    stale["loaded_at"] = time.monotonic()
+                    self._entries.move_to_end(key)
+                    self.refreshes += 1
+                    return stale["snapshot"].values
+
+        # Load outside the lock so a slow fetch doesn't block other sheets
+        values = loader()
+        with self._lock:
+            self._store(key, values)
+        return values
+
+    def get_many(self, keys, loader):
+        """{key: values} for ``keys``; ``loader(missing keys)`` fetches the rest at once."""
+        out = {}
+        with self._lock:
+            for key in keys:
+                entry = self._fresh(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    out[key] = entry["snapshot"].values
+            missing = sorted(k for k in keys if k not in out)
+            key_locks = [self._loading.setdefault(k, threading.Lock()) for k in missing]
+        if not missing:
+            return out
+
+        # Locks taken in key order, so two batch loads can't deadlock
+        with ExitStack() as stack:
+            for key_lock in key_locks:
+                stack.enter_context(key_lock)
+            with self._lock:
+                for key in missing:
+                    entry = self._fresh(key)
+                    if entry is not None:
+                        self.hits += 1
+                        self.shared_loads += 1
+                        out[key] = entry["snapshot"].values
+                    else:
+                        self.misses += 1
+            still_missing = [k for k in missing if k not in out]
+            if still_missing:
+                loaded = loader(still_missing)
+                with self._lock:
+                    for key, values in loaded.items():
+                        self._store(key, values)
+                out.update(loaded)
+        return out
+
+    def _store(self, key, values):
+        previous = self._entries.get(key)
+        if previous is None or previous["snapshot"].values != values:
+            self._versions[key[0]] += 1
+        self._entries[key] = {"loaded_at": time.monotonic(), "snapshot": Snapshot(values)}
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def snapshot(self, key):
+        """The current Snapshot of ``key`` (fresh or not), or None if nothing is cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry["snapshot"] if entry is not None else None
+
+    def derived(self, key, name, builder):
+        """Return ``builder(values)`` for the cached snapshot, built once."""
+        with self._lock:
+            entry = self._fresh(key)
+            if entry is None:
+                return None
+            snapshot = entry["snapshot"]
+        # Built outside the cache lock: other tables and sessions carry on
+        return snapshot.derived(name, builder)
+
+    def replace(self, key, values):
+        """Swap in values read elsewhere (e.g. checking a copy served from disk).
+
+        Waits for a load of ``key`` in progress, so these newer values win.
+        Returns True if they differ from the cached ones; an unchanged
+        snapshot keeps its derived objects and just counts as fresh again.
+        """
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock, self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["snapshot"].values == values:
+                entry["loaded_at"] = time.monotonic()
+                return False
+            self._store(key, values)
+            return True
+
+    def apply_append(self, key, row):
+        """Append ``row`` to a cached snapshot; False if nothing is cached."""
+        with self._lock:
+            entry = self._fresh(key)
+            if entry is None:
+                self._entries.pop(key, None)
+                return False
+            snapshot = entry["snapshot"]
+            entry["snapshot"] = snapshot.successor(snapshot.values + [list(row)], "on_append", list(row))
+            self._versions[key[0]] += 1
+            return True
+
+    def _row_at(self, key, position, expect):
+        # The entry, if row ``position`` is there and passes ``expect``; else
+        # it is dropped, to be read again (sessions redraw: the sheet changed)
+        entry = self._fresh(key)
+        if entry is not None and position + 1 < len(entry["snapshot"].values):
+            if expect is None or expect(entry["snapshot"].values[position + 1]):
+                return entry
+            self._versions[key[0]] += 1
+        self._entries.pop(key, None)
+        return None
+
+    def apply_update(self, key, position, first_col, values, expect=None):
+        """Overwrite cells of data row ``position`` from ``first_col`` (1-based).
+
+        ``expect(row)`` can check that the row there is still the one meant
+        (positions may come from an older snapshot); if not, or if nothing
+        is cached, the entry is dropped and False returned.
+        """
+        with self._lock:
+            entry = self._row_at(key, position, expect)
+            if entry is None:
+                return False
+            snapshot = entry["snapshot"]
+            old_row = snapshot.values[position + 1]
+            row = list(old_row)
+            end = first_col - 1 + len(values)
+            row.extend([""] * (end - len(row)))
+            row[first_col - 1:end] = [str(v) for v in values]
+            new_values = list(snapshot.values)
+            new_values[position + 1] = row
+            entry["snapshot"] = snapshot.successor(new_values, "on_update", position, old_row, row)
+            self._versions[key[0]] += 1
+            return True
+
+    def apply_delete(self, key, position, expect=None):
+        """Remove data row ``position`` (0 = first row under the header); ``expect`` as for ``apply_update``."""
+        with self._lock:
+            entry = self._row_at(key, position, expect)
+            if entry is None:
+                return False
+            snapshot = entry["snapshot"]
+            row = snapshot.values[position + 1]
+            new_values = snapshot.values[:position + 1] + snapshot.values[position + 2:]
+            entry["snapshot"] = snapshot.successor(new_values, "on_delete", position, row)
+            self._versions[key[0]] += 1
+            return True
+
+    def version(self, spreadsheet_id):
+        """Changes seen so far to the data of a spreadsheet, from any session."""
+        with self._lock:
+            return self._versions[spreadsheet_id]
+
+    def invalidate(self, spreadsheet_id, title=None, changed=False):
+        """Drop cached tables; ``changed`` also tells open sessions to redraw."""
+        with self._lock:
+            if changed:
+                self._versions[spreadsheet_id] += 1
+            if title is not None:
+                self._entries.pop((spreadsheet_id, title), None)
+                return
+            for key in [k for k in self._entries if k[0] == spreadsheet_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+                "shared_loads": self.shared_loads,
+                "entries": len(self._entries),
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
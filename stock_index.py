@@ -0,0 +1,134 @@
+import copy
+from bisect import bisect_left, insort
+from collections import Counter
+
+from ledger_index import to_amount
+from storage import column_of
+
+# Undated rows sort after every date, as in the sheet view
+UNDATED = "~"
+
+
+# --- Latest stock per item ---
+class StockIndex:
+    """Item -> its rows in date order, plus stock received and sold.
+
+    Built in one pass over a company sheet snapshot and kept in step with
+    it through the SnapshotCache hooks, so the latest stock of an item (or
+    its stock just before a date) is a lookup rather than a filter and
+    sort of the whole sheet. Rows on the same date keep their sheet order.
+    The hooks return a changed copy and leave this index as it was.
+    """
+
+    def __init__(self, values):
+        header = values[0] if values else []
+        self.item_col = column_of(header, "item")
+        self.date_col = column_of(header, "date", 1)
+        self.new_col = column_of(header, "new_stock", 3)
+        self.sold_col = column_of(header, "sold_qty", 4)
+        self.final_col = column_of(header, "final_stock", 5)
+        # item -> sorted [(date, sequence, final stock)]
+        self.entries = {}
+        self.received = Counter()
+        self.sold = Counter()
+        # One pass, then one sort per item
+        width = max(self.item_col, self.date_col, self.new_col, self.sold_col, self.final_col) + 1
+        entries, received, sold = self.entries, {}, {}
+        for seq, row in enumerate(values[1:], start=1):
+            if len(row) < width:
+                row = list(row) + [""] * (width - len(row))
+            item = row[self.item_col]
+            entries.setdefault(item, []).append((row[self.date_col].strip()[:10] or UNDATED, seq, int(to_amount(row[self.final_col]))))
+            received[item] = received.get(item, 0.0) + to_amount(row[self.new_col])
+            sold[item] = sold.get(item, 0.0) + to_amount(row[self.sold_col])
+        for item_entries in entries.values():
+            item_entries.sort()
+        self.received.update(received)
+        self.sold.update(sold)
+        self._seq = len(values)
+
+    def _cell(self, row, col):
+        return row[col] if col < len(row) else ""
+
+    def _entry(self, row):
+        day = self._cell(row, self.date_col).strip()[:10] or UNDATED
+        return self._cell(row, self.item_col), day, int(to_amount(self._cell(row, self.final_col)))
+
+    # --- Lookups ---
+    def items(self):
+        return list(self.entries)
+
+    def latest(self, item):
+        """(date, final stock) of the item's latest row, or None."""
+        entries = self.entries.get(item)
+        if not entries:
+            return None
+        day, _, final = entries[-1]
+        return (None if day == UNDATED else day), final
+
+    def stock_before(self, item, day):
+        """Final stock of the item's last row dated before ``day`` (ISO), or None."""
+        entries = self.entries.get(item, [])
+        i = bisect_left(entries, (day,))
+        return entries[i - 1][2] if i else None
+
+    def current_stock(self):
+        return {item: entries[-1][2] for item, entries in self.entries.items() if entries}
+
+    # --- Incremental updates (called by SnapshotCache) ---
+    def _copy(self, rows):
+        # Shares the entry lists of every item not in ``rows``
+        new = copy.copy(self)
+        new.entries = dict(self.entries)
+        new.received = Counter(self.received)
+        new.sold = Counter(self.sold)
+        for row in rows:
+            item = self._cell(row, self.item_col)
+            if item in new.entries:
+                new.entries[item] = list(new.entries[item])
+        return new
+
+    def on_append(self, row):
+        return self.on_extend([row])
+
+    def on_extend(self, rows):
+        new = self._copy(rows)
+        for row in rows:
+            new._insert(row)
+        return new
+
+    def on_delete(self, position, row):
+        new = self._copy([row])
+        new._remove(row)
+        return new
+
+    def on_update(self, position, old_row, new_row):
+        # The row keeps its place among rows of the same date
+        new = self._copy([old_row, new_row])
+        new._insert(new_row, seq=new._remove(old_row))
+        return new
+
+    def _insert(self, row, seq=None):
+        item, day, final = self._entry(row)
+        if seq is None:
+            seq = self._seq = self._seq + 1
+        insort(self.entries.setdefault(item, []), (day, seq, final))
+        self.received[item] += to_amount(self._cell(row, self.new_col))
+        self.sold[item] += to_amount(self._cell(row, self.sold_col))
+
+    def _remove(self, row):
+        item, day, final = self._entry(row)
+        entries = self.entries.get(item, [])
+        i = bisect_left(entries, (day,))
+        while i < len(entries) and entries[i][0] == day:
+            if entries[i][2] == final:
+                seq = entries.pop(i)[1]
+                break
+            i += 1
+        else:
+            seq = None
+        if not entries:
+            self.entries.pop(item, None)
+        self.received[item] -= to_amount(self._cell(row, self.new_col))
+        self.sold[item] -= to_amount(self._cell(row, self.sold_col))
+        return seq
@@ -0,0 +1,138 @@
+import pandas as pd
+
+from storage import ROW_ID
+from write_batch import WriteBatch
+
+# Stock sheet columns 3-6, written as one range per row
+STOCK_COLUMNS = ["current_stock", "new_stock", "sold_qty", "final_stock"]
+
+
+# --- One item's rows in date order ---
+def item_history(item_rows):
+    """Rows of one item (a slice of the typed stock frame) as dicts, oldest first.
+
+    ``index`` is the row's data position (sheet row = index + 2).
+    """
+    ordered = item_rows.sort_values("date", kind="stable")
+    return [
+        {"index": index, "date": day, "current": int(current), "new": int(new), "sold": int(sold),
+         "final": int(final), "touched": False}
+        for index, day, current, new, sold, final in zip(
+            ordered.index, ordered["date"], *(ordered[c].tolist() for c in STOCK_COLUMNS)
+        )
+    ]
+
+
+# --- Running stock from one row on ---
+def roll_forward(history, start, opening):
+    """Recompute current/final stock of ``history[start:]``.
+
+    Row ``start`` opens with ``opening`` and every later row with the
+    final stock of the row before it. Stops at the first untouched row
+    past the last touched one whose figures already agree, since every
+    row after it agrees too. Returns the rows that changed or were
+    touched, updated in place.
+    """
+    last_touched = max((i for i, row in enumerate(history) if row["touched"]), default=-1)
+    carry = opening
+    changed = []
+    for i in range(start, len(history)):
+        row = history[i]
+        current, final = carry, carry + row["new"] - row["sold"]
+        if row["touched"] or (current, final) != (row["current"], row["final"]):
+            row["current"], row["final"] = current, final
+            changed.append(row)
+        elif i > last_touched:
+            break
+        carry = final
+    return changed
+
+
+def _label(day):
+    return day.strftime("%Y-%m-%d") if pd.notna(day) else ""
+
+
+def _values(row):
+    return [row["current"], row["new"], row["sold"], row["final"]]
+
+
+# --- Stock form save ---
+def plan_stock_save(item_rows, sold_entries, opening, new_stock):
+    """Rows to write for a save of ``sold_entries`` ({ISO date: sold}).
+
+    New stock arrives on the first selected date, which opens with
+    ``opening``; sold quantities add to what a date already has. Later
+    rows of the item are rolled forward. Returns (updates, appends):
+    updates as (index, date label, values) for existing rows, appends as
+    (date label, values), values being STOCK_COLUMNS.
+    """
+    if not sold_entries:
+        return [], []
+    history = item_history(item_rows)
+    by_day = {row["date"]: row for row in history}
+    for i, day in enumerate(sorted(sold_entries)):
+        ts = pd.Timestamp(day)
+        row = by_day.get(ts)
+        if row is None:
+            row = {"index": None, "date": ts, "current": 0, "new": 0, "sold": 0, "final": 0}
+            history.append(row)
+            by_day[ts] = row
+        row["new"] = new_stock if i == 0 else 0
+        row["sold"] += sold_entries[day]
+        row["touched"] = True
+
+    # Undated rows stay last, as in the sheet view
+    history.sort(key=lambda row: (pd.isna(row["date"]), row["date"] if pd.notna(row["date"]) else pd.Timestamp.max))
+    start = next(i for i, row in enumerate(history) if row["touched"])
+    changed = roll_forward(history, start, opening)
+    updates = [(row["index"], _label(row["date"]), _values(row)) for row in changed if row["index"] is not None]
+    appends = [(_label(row["date"]), _values(row)) for row in changed if row["index"] is None]
+    return updates, appends
+
+
+# --- Deleted entry ---
+def plan_stock_delete(item_rows, index):
+    """Later rows of the item to rewrite once the row at ``index`` is gone.
+
+    The row after it opens with the final stock of the row before it, or
+    with the deleted row's own opening stock if it was the first.
+    """
+    history = item_history(item_rows)
+    pos = next((i for i, row in enumerate(history) if row["index"] == index), None)
+    if pos is None:
+        return []
+    deleted = history.pop(pos)
+    opening = history[pos - 1]["final"] if pos > 0 else deleted["current"]
+    return [(row["index"], _label(row["date"]), _values(row)) for row in roll_forward(history, pos, opening)]
+
+
+# --- Delete an entry and carry its stock forward ---
+def delete_stock_entry(storage, table, values, item_rows, index, row_ids):
+    """Delete the row at ``index`` and rewrite the item's later rows.
+
+    ``item_rows`` is the item's slice of the typed frame built from
+    ``values``, ``row_ids`` the snapshot's RowIdIndex. The row is found by
+    ID first; later rows go through a WriteBatch checked against
+    ``values``, so an edit made elsewhere stops them (``batch.stale``).
+    Returns (sheet row deleted or None, in step, batch, results): in step
+    means the row was where the snapshot had it.
+    """
+    id_col = ROW_ID.lower()
+    row_id = item_rows.at[index, id_col]
+    known_row = row_ids.sheet_row(row_id)
+    corrections = [
+        (row_ids.sheet_row(item_rows.at[i, id_col]) or i + 2, item_rows.at[i, id_col], label, figures, values[i + 1])
+        for i, label, figures in plan_stock_delete(item_rows, index)
+    ]
+    current = storage.locate_rows(table, {row_id: known_row})
+    deleted = current.get(row_id)
+    if deleted:
+        storage.delete_rows(table, [deleted])
+
+    # Later rows of the item open with the stock before the deleted one
+    batch = WriteBatch(storage, table)
+    if deleted:
+        for row, later_id, label, figures, seen in corrections:
+            batch.update(row - (row > deleted), 3, figures, label=label, row_id=later_id, expect=seen)
+    results = batch.flush()
+    return deleted, bool(known_row) and deleted == known_row, batch, results
@@ -0,0 +1,101 @@
+import pandas as pd
+
+
+# --- Column label for a summary day ---
+def day_label(day, multi_year=False):
+    return day.strftime("%d %b %y" if multi_year else "%d %b")
+
+
+# --- Stock summary over a date range ---
+def build_stock_summary(df, summary_dates, current=None):
+    """Summarise every item of a stock sheet over ``summary_dates``.
+
+    One column per day with the quantity sold, plus the latest
+    ``final_stock`` ("current stock"), stock received in the range ("new
+    stock") and "total sold". Built from a single group-by over the rows in
+    range, so the cost follows the number of rows rather than items x days.
+    ``current`` ({item: latest final stock}, e.g. from a StockIndex) saves
+    working the current stock out from the whole sheet.
+    """
+    days = pd.DatetimeIndex(pd.to_datetime(sorted(set(summary_dates))))
+    multi_year = len(days) > 0 and days[0].year != days[-1].year
+    labels = [day_label(d, multi_year) for d in days]
+
+    frame = pd.DataFrame({
+        "item": df["item"],
+        "date": pd.to_datetime(df["date"], errors="coerce").dt.normalize(),
+        "new_stock": pd.to_numeric(df["new_stock"], errors="coerce").fillna(0),
+        "sold_qty": pd.to_numeric(df["sold_qty"], errors="coerce").fillna(0),
+        "final_stock": pd.to_numeric(df["final_stock"], errors="coerce"),
+    }).dropna(subset=["item"])
+    items = pd.Index(frame["item"].unique(), name="item")
+
+    if current is None:
+        # Latest final_stock per item (undated rows sort last, like the sheet view)
+        ordered = frame.sort_values("date", kind="stable", na_position="last")
+        current = ordered.groupby("item", sort=False)["final_stock"].last()
+    else:
+        current = pd.Series(current, dtype="float64")
+
+    in_range = frame[frame["date"].isin(days)]
+    grouped = in_range.groupby(["item", "date"])[["new_stock", "sold_qty"]].sum()
+    sold = (
+        grouped["sold_qty"].unstack("date")
+        .reindex(index=items, columns=days)
+        .fillna(0)
+        .astype(int)
+    )
+    sold.columns = labels
+    new_stock = grouped["new_stock"].groupby(level="item").sum().reindex(items).fillna(0).astype(int)
+
+    summary = pd.DataFrame({
+        "current stock": current.reindex(items).fillna(0).astype(int),
+        "new stock": new_stock,
+    }, index=items)
+    summary = summary.join(sold)
+    summary["total sold"] = sold.sum(axis=1).astype(int)
+    return summary.reset_index()
+
+
+# --- Latest row of every item, per company ---
+def latest_stock(indexes):
+    rows = [
+        (company, item, day, final)
+        for company, index in indexes.items()
+        for item in index.items()
+        for day, final in [index.latest(item)]
+    ]
+    latest = pd.DataFrame(rows, columns=["company", "item", "date", "final_stock"])
+    latest["date"] = pd.to_datetime(latest["date"], format="ISO8601", errors="coerce")
+    return latest
+
+
+# --- Dashboard over every company ---
+def build_company_dashboard(frames, indexes, since, low_stock=10, top=10):
+    """Stock across companies.
+
+    ``indexes`` ({company: StockIndex}) give each item's latest stock and
+    ``frames`` (typed stock frames) the sales. Returns (stock per item
+    with one column per company and a total, items at or below
+    ``low_stock`` in some company, the ``top`` items by quantity sold
+    since ``since``).
+    """
+    latest = latest_stock(indexes)
+    stock = latest.pivot_table(index="item", columns="company", values="final_stock", aggfunc="sum", fill_value=0)
+    stock["total"] = stock.sum(axis=1)
+    stock = stock.sort_values("total", ascending=False)
+
+    low = latest[latest["final_stock"] <= low_stock].sort_values(["final_stock", "item"])
+    low = low[["company", "item", "final_stock", "date"]].rename(columns={"final_stock": "stock", "date": "as of"})
+
+    since = pd.Timestamp(since)
+    sold = pd.concat(
+        [df.loc[df["date"] >= since, ["item", "sold_qty"]].assign(item=lambda d: d["item"].astype(str), company=company)
+         for company, df in frames.items()] or [pd.DataFrame(columns=["item", "sold_qty", "company"])],
+        ignore_index=True,
+    )
+    top_sellers = (
+        sold.groupby("item").agg(sold=("sold_qty", "sum"), companies=("company", "nunique"))
+        .nlargest(top, "sold").reset_index()
+    )
+    return stock, low.reset_index(drop=True), top_sellers
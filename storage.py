@@ -0,0 +1,587 @@
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import gspread
+import requests
+from gspread.utils import absolute_range_name, rowcol_to_a1
+
+import profiling
+from request_scheduler import RequestScheduler
+
+DEFAULT_SHEET_KEY = "1HjTAeI0yCGYySs-FnTpoiN4QShdRkdKomXyHi9uuKXY"
+# Stable per-row ID column; rows are addressed by it rather than by position
+ROW_ID = "Row ID"
+LEDGER_HEADER = ["Party", "Date", "Amount", "Payment", "Balance", ROW_ID]
+STOCK_HEADER = ["item", "date", "current_stock", "new_stock", "sold_qty", "final_stock", ROW_ID]
+# Tables the app keeps for itself (ledger archives, rollups) start with this
+SYSTEM_PREFIX = "_"
+
+
+class StorageError(Exception):
+    """A read or write the backend could not complete (safe to retry)."""
+
+
+# --- Group sheet rows into contiguous (start, end) ranges, bottom-up ---
+def row_ranges(row_indexes):
+    ranges = []
+    for row_index in sorted(set(row_indexes), reverse=True):
+        if ranges and ranges[-1][0] == row_index + 1:
+            ranges[-1][0] = row_index
+        else:
+            ranges.append([row_index, row_index])
+    return [tuple(r) for r in ranges]
+
+
+# --- Column position of a header name (case-insensitive) ---
+def column_of(header, name, default=0):
+    lowered = [h.strip().lower() for h in header]
+    return lowered.index(name.lower()) if name.lower() in lowered else default
+
+
+# --- A new stable row ID ---
+def new_row_id():
+    return uuid.uuid4().hex[:12]
+
+
+# --- A new row laid out by header names, with a fresh row ID unless ``fields`` has one ---
+def build_row(header, fields):
+    row = [""] * len(header)
+    for name, value in {ROW_ID: new_row_id(), **fields}.items():
+        row[column_of(header, name)] = str(value)
+    return row
+
+
+# --- Sheet row of every row ID in a table snapshot ---
+def rows_by_id(values):
+    if not values or ROW_ID not in values[0]:
+        return {}
+    col = values[0].index(ROW_ID)
+    return {row[col]: row_index for row_index, row in enumerate(values[1:], start=2) if len(row) > col and row[col]}
+
+
+# --- Storage interface ---
+class Storage(abc.ABC):
+    """Where the ledger and the company stock sheets live.
+
+    Tables are addressed by name (the worksheet title on Google Sheets) and
+    read as a header row followed by data rows of strings, the same shape
+    ``get_all_values()`` returns. Row numbers follow the sheet convention:
+    row 1 is the header and data starts at row 2.
+
+    Every data row carries a stable ID in the ``ROW_ID`` column. Row
+    numbers shift when rows above are deleted (here or on another device),
+    so writes go through ``locate_rows`` to find where an ID is now.
+    """
+
+    store_id = None
+    ledger = None
+    # Quota scheduler the backend's requests go through, if any
+    scheduler = None
+    # Time spent opening the backend, and on metadata lookups since then
+    startup_seconds = 0.0
+    metadata_seconds = 0.0
+    metadata_calls = 0
+
+    @abc.abstractmethod
+    def read(self, table):
+        """The whole table: header row, then data rows."""
+
+    @abc.abstractmethod
+    def append_rows(self, table, rows):
+        """Add ``rows`` after the last data row."""
+
+    @abc.abstractmethod
+    def update_rows(self, table, updates):
+        """Apply ``updates``, a list of (row, first column, values), 1-based."""
+
+    @abc.abstractmethod
+    def delete_rows(self, table, row_indexes):
+        """Delete the rows ``row_indexes`` (sheet row numbers)."""
+
+    @abc.abstractmethod
+    def set_header(self, table, header):
+        """Replace the header row."""
+
+    def write_column(self, table, col, cells):
+        """Write ``cells`` ({row: value}) into column ``col`` (1-based)."""
+        self.update_rows(table, [(row, col, [value]) for row, value in sorted(cells.items())])
+
+    def ensure_row_ids(self, table, values):
+        """Give every data row of ``values`` a row ID, writing new IDs back.
+
+        Adds the ID column after the widest row if the header lacks it.
+        ``values`` is updated in place and returned.
+        """
+        if not values:
+            return values
+        header = values[0]
+        if ROW_ID in header:
+            col = header.index(ROW_ID)
+        else:
+            col = max(len(row) for row in values)
+            header[:] = header + [""] * (col - len(header)) + [ROW_ID]
+            self.set_header(table, header)
+        fresh = {}
+        for row_index, row in enumerate(values[1:], start=2):
+            if len(row) <= col or not row[col]:
+                row.extend([""] * (col + 1 - len(row)))
+                row[col] = fresh[row_index] = new_row_id()
+        if fresh:
+            self.write_column(table, col + 1, fresh)
+        return values
+
+    def read_many(self, tables):
+        """{table: values} for several tables, in one request where possible."""
+        return {table: self.read(table) for table in tables}
+
+    def read_tail(self, table, probes, start, width):
+        """Rows ``probes`` (sheet row numbers) and every row from ``start`` on.
+
+        Lets a cached snapshot be brought up to date by fetching only what
+        was appended; rows come back ``width`` cells wide. Returns None if
+        the backend can't do this more cheaply than a full ``read``.
+        """
+        return None
+
+    def read_rows(self, table, row_indexes):
+        """Rows ``row_indexes`` (sheet row numbers) as they are now; [] past the end."""
+        values = self.read(table)
+        return [list(values[row - 1]) if 0 < row <= len(values) else [] for row in row_indexes]
+
+    def locate_rows(self, table, hints):
+        """Current rows of the IDs in ``hints`` ({row ID: last known row}).
+
+        IDs that are no longer in the table are left out of the result.
+        """
+        where = rows_by_id(self.read(table))
+        return {row_id: where[row_id] for row_id in hints if row_id in where}
+
+    @abc.abstractmethod
+    def tables(self):
+        """Every table name, in sheet order."""
+
+    @abc.abstractmethod
+    def create_table(self, name, header):
+        """Add an empty table with ``header``."""
+
+    def companies(self):
+        return [t for t in self.tables() if t != self.ledger and not t.startswith(SYSTEM_PREFIX)]
+
+    def create_company(self, name):
+        self.create_table(name, STOCK_HEADER)
+
+    @abc.abstractmethod
+    def delete_company(self, name):
+        """Remove a company's stock table."""
+
+
+# --- Google Sheets backend ---
+class GoogleSheetsStorage(Storage):
+    """Storage on one spreadsheet; the first worksheet is the ledger.
+
+    Worksheet handles and the company list are fetched once and reused
+    until ``metadata_ttl`` seconds pass or a company is created/deleted
+    here, so reruns don't spend a metadata round-trip on them. With a
+    ``scheduler`` every request waits for its turn under the API quotas.
+    """
+
+    def __init__(self, spreadsheet, metadata_ttl=300, scheduler=None):
+        self.sh = spreadsheet
+        self.scheduler = scheduler
+        self.store_id = spreadsheet.id
+        self.metadata_ttl = metadata_ttl
+        self._loaded_at = None
+        # Row ID column of each table, as last seen in its header
+        self._id_cols = {}
+        self._refresh_metadata()
+        self.ledger = self._titles[0]
+
+    def _refresh_metadata(self):
+        started = time.perf_counter()
+        sheets = self._call(self.sh.worksheets)
+        self._handles = {ws.title: ws for ws in sheets}
+        self._titles = [ws.title for ws in sheets]
+        self._loaded_at = time.monotonic()
+        self.metadata_calls += 1
+        self.metadata_seconds += time.perf_counter() - started
+
+    def _metadata_stale(self):
+        return time.monotonic() - self._loaded_at >= self.metadata_ttl
+
+    def _call(self, fn, *args, **kwargs):
+        # Every request is timed and sized for the per-rerun profile
+        owner = getattr(fn, "__self__", None)
+        table = None if isinstance(owner, gspread.Spreadsheet) else getattr(owner, "title", None)
+        started = time.perf_counter()
+        result = error = None
+        try:
+            if self.scheduler is not None:
+                result = self.scheduler.run(fn.__name__, table, fn, args, kwargs)
+            else:
+                result = fn(*args, **kwargs)
+            return result
+        except (gspread.exceptions.APIError, requests.exceptions.RequestException) as e:
+            error = str(e)
+            raise StorageError(error) from e
+        finally:
+            sent = profiling.payload_size([args, list(kwargs.values())])
+            received = profiling.payload_size(result)
+            profiling.record_call(
+                fn.__name__, table, time.perf_counter() - started,
+                sent[0] + received[0], sent[1] + received[1], error,
+            )
+
+    def worksheet(self, table):
+        if table not in self._handles or self._metadata_stale():
+            self._refresh_metadata()
+        if table not in self._handles:
+            raise StorageError(f"No such worksheet: {table}")
+        return self._handles[table]
+
+    def read(self, table):
+        values = self._call(self.worksheet(table).get_all_values)
+        if values:
+            self._note_header(table, values[0])
+        return values
+
+    def read_many(self, tables):
+        # Every table in one values.batchGet instead of a request each
+        if not tables:
+            return {}
+        response = self._call(self.sh.values_batch_get, [absolute_range_name(t) for t in tables])
+        out = {}
+        for table, block in zip(tables, response.get("valueRanges", [])):
+            rows = block.get("values", [])
+            width = max(map(len, rows), default=0)
+            out[table] = [list(r) + [""] * (width - len(r)) for r in rows]
+            if out[table]:
+                self._note_header(table, out[table][0])
+        return out
+
+    def read_tail(self, table, probes, start, width):
+        # One request: each probe row, then everything from ``start`` down
+        last_col = rowcol_to_a1(1, width).rstrip("0123456789")
+        ranges = [f"A{row}:{last_col}{row}" for row in probes] + [f"A{start}:{last_col}"]
+        *seen, tail = self._call(self.worksheet(table).batch_get, ranges)
+        pad = lambda rows: [list(r) + [""] * (width - len(r)) for r in rows]
+        return [pad(block)[0] if block else [""] * width for block in seen], pad(tail)
+
+    def read_rows(self, table, row_indexes):
+        # Whole rows, all in one request
+        blocks = self._call(self.worksheet(table).batch_get, [f"{row}:{row}" for row in row_indexes]) if row_indexes else []
+        return [list(block[0]) if block else [] for block in blocks]
+
+    def _note_header(self, table, header):
+        if ROW_ID in header:
+            self._id_cols[table] = header.index(ROW_ID) + 1
+        else:
+            self._id_cols.pop(table, None)
+
+    def append_rows(self, table, rows):
+        self._call(self.worksheet(table).append_rows, [[str(x) for x in row] for row in rows])
+
+    def update_rows(self, table, updates):
+        data = [
+            {"range": f"{rowcol_to_a1(row, col)}:{rowcol_to_a1(row, col + len(values) - 1)}", "values": [list(values)]}
+            for row, col, values in updates
+        ]
+        self._call(self.worksheet(table).batch_update, data)
+
+    def delete_rows(self, table, row_indexes):
+        # Bottom-up, so earlier deletes don't shift the rows still to go
+        ws = self.worksheet(table)
+        deletes = [
+            {"deleteDimension": {"range": {
+                "sheetId": ws.id, "dimension": "ROWS",
+                "startIndex": start - 1, "endIndex": end,
+            }}}
+            for start, end in row_ranges(row_indexes)
+        ]
+        self._call(self.sh.batch_update, {"requests": deletes})
+
+    def set_header(self, table, header):
+        self._call(self.worksheet(table).update, values=[list(header)], range_name="A1")
+        self._note_header(table, header)
+
+    def write_column(self, table, col, cells):
+        # One range per run of consecutive rows, all in one request
+        data = [
+            {"range": f"{rowcol_to_a1(start, col)}:{rowcol_to_a1(end, col)}",
+             "values": [[cells[row]] for row in range(start, end + 1)]}
+            for start, end in row_ranges(cells)
+        ]
+        self._call(self.worksheet(table).batch_update, data)
+
+    def locate_rows(self, table, hints):
+        # Check the ID cells at the hinted rows first (one small read); only
+        # if one has moved or gone is the whole ID column fetched.
+        ws = self.worksheet(table)
+        if table not in self._id_cols:
+            self._note_header(table, self._call(ws.row_values, 1))
+        col = self._id_cols.get(table)
+        if col is None:
+            return {}
+        checked = [(row_id, row) for row_id, row in hints.items() if row]
+        cells = self._call(ws.batch_get, [rowcol_to_a1(row, col) for _, row in checked]) if checked else []
+        found = {
+            row_id: row for (row_id, row), cell in zip(checked, cells)
+            if cell and cell[0] and cell[0][0] == row_id
+        }
+        if len(found) < len(hints):
+            column = self._call(ws.col_values, col)
+            where = {value: row_index for row_index, value in enumerate(column, start=1) if row_index > 1}
+            found = {row_id: where[row_id] for row_id in hints if row_id in where}
+        return found
+
+    def tables(self):
+        if self._metadata_stale():
+            self._refresh_metadata()
+        return list(self._titles)
+
+    def create_table(self, name, header):
+        ws = self._call(self.sh.add_worksheet, title=name, rows="1000", cols=str(max(10, len(header))))
+        self._handles[name] = ws
+        self._titles.append(name)
+        self._call(ws.append_row, list(header))
+        self._note_header(name, header)
+
+    def delete_company(self, name):
+        self._call(self.sh.del_worksheet, self.worksheet(name))
+        self._handles.pop(name, None)
+        self._id_cols.pop(name, None)
+        self._titles.remove(name)
+
+
+# --- Local SQLite backend ---
+class SQLiteStorage(Storage):
+    """Tables kept in one SQLite file, one SQL table per sheet.
+
+    Columns are stored positionally (c0, c1, ...) with the sheet header kept
+    in the ``_tables`` registry, so headers can change like on a sheet. The
+    row ID column is indexed, so ``locate_rows`` looks IDs up instead of
+    reading the column; a few rows are found by position with the rowid
+    tree, many with one pass over it.
+    """
+
+    # Above this many rows, one pass over every rowid beats a lookup per row
+    few_rows = 32
+
+    def __init__(self, path, ledger="Sheet1"):
+        self.store_id = f"sqlite:{os.path.abspath(path)}"
+        self.ledger = ledger
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        with self._tx() as cur:
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS _tables ("
+                "name TEXT PRIMARY KEY, sql_name TEXT UNIQUE, header TEXT, position INTEGER)"
+            )
+            # Files from before: party/item and date indexes nothing used
+            for (name,) in cur.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND name GLOB 't[0-9]*_c[0-9]*'"
+            ).fetchall():
+                cur.execute(f"DROP INDEX {name}")
+            for sql_name, header in cur.execute("SELECT sql_name, header FROM _tables").fetchall():
+                self._index_row_ids(cur, sql_name, json.loads(header))
+        if self._meta(ledger) is None:
+            self._create(ledger, LEDGER_HEADER)
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            cur = self.conn.cursor()
+            try:
+                yield cur
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                raise StorageError(str(e)) from e
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    def _meta(self, table):
+        with self._tx() as cur:
+            row = cur.execute("SELECT sql_name, header FROM _tables WHERE name = ?", (table,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def _table(self, table):
+        meta = self._meta(table)
+        if meta is None:
+            raise StorageError(f"No such table: {table}")
+        return meta
+
+    def _create(self, table, header):
+        with self._tx() as cur:
+            next_id = cur.execute("SELECT COALESCE(MAX(rowid), 0) + 1 FROM _tables").fetchone()[0]
+            sql_name = f"t{next_id}"
+            cols = ", ".join(f"c{i} TEXT" for i in range(len(header)))
+            cur.execute(f"CREATE TABLE {sql_name} (_row INTEGER PRIMARY KEY AUTOINCREMENT, {cols})")
+            self._index_row_ids(cur, sql_name, header)
+            cur.execute(
+                "INSERT INTO _tables (name, sql_name, header, position) VALUES (?, ?, ?, ?)",
+                (table, sql_name, json.dumps(header), next_id),
+            )
+
+    def _index_row_ids(self, cur, sql_name, header):
+        if ROW_ID in header:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {sql_name}_row_id ON {sql_name} (c{header.index(ROW_ID)})")
+
+    def _widen(self, cur, table, sql_name, header, width):
+        if width <= len(header):
+            return header
+        for i in range(len(header), width):
+            cur.execute(f"ALTER TABLE {sql_name} ADD COLUMN c{i} TEXT")
+        header = header + [""] * (width - len(header))
+        cur.execute("UPDATE _tables SET header = ? WHERE name = ?", (json.dumps(header), table))
+        return header
+
+    def _row_ids(self, cur, sql_name, row_indexes):
+        # Sheet row -> _row: a step down the rowid tree each for a few rows
+        if len(row_indexes) <= self.few_rows:
+            found = [
+                cur.execute(f"SELECT _row FROM {sql_name} ORDER BY _row LIMIT 1 OFFSET ?", (row_index - 2,)).fetchone()
+                if row_index >= 2 else None
+                for row_index in row_indexes
+            ]
+            if None in found:
+                raise StorageError("Row out of range")
+            return [hit[0] for hit in found]
+        ids = [r[0] for r in cur.execute(f"SELECT _row FROM {sql_name} ORDER BY _row")]
+        try:
+            return [ids[row_index - 2] for row_index in row_indexes]
+        except IndexError:
+            raise StorageError("Row out of range") from None
+
+    def read(self, table):
+        sql_name, header = self._table(table)
+        cols = ", ".join(f"c{i}" for i in range(len(header)))
+        with self._tx() as cur:
+            rows = cur.execute(f"SELECT {cols} FROM {sql_name} ORDER BY _row").fetchall()
+        return [list(header)] + [["" if v is None else v for v in row] for row in rows]
+
+    def read_rows(self, table, row_indexes):
+        sql_name, header = self._table(table)
+        cols = ", ".join(f"c{i}" for i in range(len(header)))
+        with self._tx() as cur:
+            found = [
+                cur.execute(f"SELECT {cols} FROM {sql_name} ORDER BY _row LIMIT 1 OFFSET ?", (row - 2,)).fetchone()
+                if row >= 2 else tuple(header)
+                for row in row_indexes
+            ]
+        return [["" if v is None else v for v in row] if row else [] for row in found]
+
+    def append_rows(self, table, rows):
+        sql_name, header = self._table(table)
+        rows = [[str(x) for x in row] for row in rows]
+        with self._tx() as cur:
+            header = self._widen(cur, table, sql_name, header, max((len(r) for r in rows), default=0))
+            for row in rows:
+                cols = ", ".join(f"c{i}" for i in range(len(row)))
+                marks = ", ".join("?" for _ in row)
+                cur.execute(f"INSERT INTO {sql_name} ({cols}) VALUES ({marks})", row)
+
+    def update_rows(self, table, updates):
+        sql_name, header = self._table(table)
+        with self._tx() as cur:
+            width = max((col - 1 + len(values) for _, col, values in updates), default=0)
+            self._widen(cur, table, sql_name, header, width)
+            ids = self._row_ids(cur, sql_name, [row for row, _, _ in updates])
+            for row_id, (_, col, values) in zip(ids, updates):
+                sets = ", ".join(f"c{col - 1 + i} = ?" for i in range(len(values)))
+                cur.execute(f"UPDATE {sql_name} SET {sets} WHERE _row = ?", [str(v) for v in values] + [row_id])
+
+    def delete_rows(self, table, row_indexes):
+        sql_name, _ = self._table(table)
+        with self._tx() as cur:
+            ids = self._row_ids(cur, sql_name, sorted(set(row_indexes)))
+            cur.executemany(f"DELETE FROM {sql_name} WHERE _row = ?", [(i,) for i in ids])
+
+    def set_header(self, table, header):
+        sql_name, old = self._table(table)
+        with self._tx() as cur:
+            self._widen(cur, table, sql_name, old, len(header))
+            cur.execute("UPDATE _tables SET header = ? WHERE name = ?", (json.dumps(list(header)), table))
+            self._index_row_ids(cur, sql_name, list(header))
+
+    def locate_rows(self, table, hints):
+        sql_name, header = self._table(table)
+        if ROW_ID not in header:
+            return {}
+        col = f"c{header.index(ROW_ID)}"
+        with self._tx() as cur:
+            # IDs through the index, then each one's position among the rows
+            found = {}
+            for row_id in hints:
+                hit = cur.execute(f"SELECT _row FROM {sql_name} WHERE {col} = ? LIMIT 1", (row_id,)).fetchone()
+                if hit:
+                    found[row_id] = hit[0]
+            if len(found) > self.few_rows:
+                order = {r[0]: row_index for row_index, r in enumerate(cur.execute(f"SELECT _row FROM {sql_name} ORDER BY _row"), start=2)}
+                return {row_id: order[row] for row_id, row in found.items()}
+            return {
+                row_id: cur.execute(f"SELECT COUNT(*) FROM {sql_name} WHERE _row < ?", (row,)).fetchone()[0] + 2
+                for row_id, row in found.items()
+            }
+
+    def tables(self):
+        with self._tx() as cur:
+            return [r[0] for r in cur.execute("SELECT name FROM _tables ORDER BY position")]
+
+    def create_table(self, name, header):
+        if self._meta(name) is not None:
+            raise StorageError(f"Table '{name}' already exists")
+        self._create(name, list(header))
+
+    def delete_company(self, name):
+        sql_name, _ = self._table(name)
+        with self._tx() as cur:
+            cur.execute(f"DROP TABLE {sql_name}")
+            cur.execute("DELETE FROM _tables WHERE name = ?", (name,))
+
+
+# --- Build the configured backend ---
+def open_storage(config, service_account=None):
+    """Open storage from the ``[storage]`` settings.
+
+    ``backend = "sheets"`` (default) uses the Google spreadsheet
+    ``sheet_key``; ``backend = "sqlite"`` uses the file at ``sqlite_path``.
+    Sheets requests are paced to ``reads_per_minute`` / ``writes_per_minute``.
+    """
+    started = time.perf_counter()
+    backend = config.get("backend", "sheets")
+    if backend == "sqlite":
+        storage = SQLiteStorage(config.get("sqlite_path", "business.db"))
+    elif backend == "sheets":
+        from google.oauth2.service_account import Credentials
+
+        scope = ["https://www.googleapis.com/auth/spreadsheets"]
+        credentials = Credentials.from_service_account_info(service_account, scopes=scope)
+        gc = gspread.authorize(credentials)
+        pool_size = config.get("http_pool_size", 10)
+        session = getattr(getattr(gc, "http_client", gc), "session", None)
+        if session is not None:
+            # Keep-alive connections shared by every session's requests
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+        storage = GoogleSheetsStorage(
+            gc.open_by_key(config.get("sheet_key", DEFAULT_SHEET_KEY)),
+            metadata_ttl=config.get("metadata_ttl", 300),
+            scheduler=RequestScheduler(
+                reads_per_minute=config.get("reads_per_minute", 60),
+                writes_per_minute=config.get("writes_per_minute", 60),
+                reserve=config.get("background_reserve", 0.2),
+            ),
+        )
+    else:
+        raise ValueError(f"Unknown storage backend: {backend}")
+    storage.startup_seconds = time.perf_counter() - started
+    return storage
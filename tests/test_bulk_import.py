@@ -0,0 +1,54 @@
+"""write_in_chunks: a retried chunk doesn't write rows twice."""
+import pytest
+
+from bulk_import import write_in_chunks
+from storage import ROW_ID, StorageError
+
+HEADER = ["Party", "Amount", ROW_ID]
+
+
+class LossyStorage:
+    """Appends rows, but loses the response of the calls listed in ``lose``."""
+
+    def __init__(self, lose=(), fail=()):
+        self.rows = [list(HEADER)]
+        self.lose = set(lose)
+        self.fail = set(fail)
+        self.calls = 0
+
+    def append_rows(self, table, rows):
+        self.calls += 1
+        if self.calls in self.fail:
+            raise StorageError("connection reset")
+        self.rows.extend(rows)
+        if self.calls in self.lose:
+            raise StorageError("response lost")
+
+    def locate_rows(self, table, hints):
+        where = {row[2]: i for i, row in enumerate(self.rows, start=1) if i > 1}
+        return {row_id: where[row_id] for row_id in hints if row_id in where}
+
+
+ROWS = [[f"Party {i}", str(i), f"id{i}"] for i in range(5)]
+
+
+def _ids(storage):
+    return [row[2] for row in storage.rows[1:]]
+
+
+def test_chunk_written_before_its_response_was_lost_is_not_repeated():
+    storage = LossyStorage(lose={1})
+    assert write_in_chunks(storage, "Sheet1", ROWS, id_col=2, chunk_rows=3, min_interval=0) == 5
+    assert _ids(storage) == [f"id{i}" for i in range(5)]
+
+
+def test_chunk_that_failed_before_writing_is_sent_again():
+    storage = LossyStorage(fail={2})
+    write_in_chunks(storage, "Sheet1", ROWS, id_col=2, chunk_rows=3, min_interval=0)
+    assert _ids(storage) == [f"id{i}" for i in range(5)]
+
+
+def test_gives_up_after_max_attempts():
+    storage = LossyStorage(fail={1, 2})
+    with pytest.raises(StorageError):
+        write_in_chunks(storage, "Sheet1", ROWS, id_col=2, chunk_rows=3, min_interval=0, max_attempts=2)
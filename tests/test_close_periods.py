@@ -0,0 +1,89 @@
+"""close_periods: archived rows land once, rollups match the archive, and a stopped run can be repeated."""
+from datetime import date
+
+import pytest
+
+from ledger_partitions import ROLLUP_TABLE, Rollups, archive_table, close_periods
+from storage import ROW_ID, SQLiteStorage, StorageError
+
+TODAY = date(2026, 3, 15)
+
+
+def _row(party, day, balance, row_id):
+    return [party, day, str(balance), "0", str(balance), row_id]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "ledger.db"))
+    storage.append_rows(storage.ledger, [
+        _row("Alpha", "2026-01-05", 100, "a1"),
+        _row("Bravo", "2026-01-20", 50, "b1"),
+        _row("Alpha", "2026-02-02", -30, "a2"),
+        _row("Alpha", "2026-03-01", 10, "a3"),
+    ])
+    return storage
+
+
+def _ids(storage, table):
+    values = storage.read(table)
+    col = values[0].index(ROW_ID)
+    return [row[col] for row in values[1:]]
+
+
+def _nets(storage):
+    rollups = Rollups(storage.read(ROLLUP_TABLE))
+    return {key: round(net, 2) for key, net in rollups.nets.items()}, dict(rollups.entries)
+
+
+def test_an_interrupted_run_can_be_repeated(storage):
+    delete_rows = storage.delete_rows
+
+    def fail_on_ledger(table, rows):
+        if table == storage.ledger:
+            raise StorageError("quota exceeded")
+        delete_rows(table, rows)
+
+    storage.delete_rows = fail_on_ledger
+    with pytest.raises(StorageError):
+        close_periods(storage, TODAY)
+    # Archived, but still in the ledger too
+    assert _ids(storage, archive_table("2026-01")) == ["a1", "b1"]
+    assert _ids(storage, storage.ledger) == ["a1", "b1", "a2", "a3"]
+
+    storage.delete_rows = delete_rows
+    assert close_periods(storage, TODAY) == {"2026-01": 2, "2026-02": 1}
+    assert _ids(storage, archive_table("2026-01")) == ["a1", "b1"]
+    assert _ids(storage, archive_table("2026-02")) == ["a2"]
+    assert _ids(storage, storage.ledger) == ["a3"]
+    assert _nets(storage) == (
+        {("Alpha", "2026-01"): 100, ("Bravo", "2026-01"): 50, ("Alpha", "2026-02"): -30},
+        {("Alpha", "2026-01"): 1, ("Bravo", "2026-01"): 1, ("Alpha", "2026-02"): 1},
+    )
+
+
+def test_rows_are_laid_out_by_the_existing_archive_header(storage):
+    # An archive from an older layout: other column order, no Payment column
+    storage.create_table(archive_table("2026-01"), ["Date", "Party", "Balance", "Amount", ROW_ID])
+    storage.append_rows(archive_table("2026-01"), [["2026-01-02", "Charlie", "5", "5", "c1"]])
+    close_periods(storage, TODAY)
+    values = storage.read(archive_table("2026-01"))
+    assert values[0] == ["Date", "Party", "Balance", "Amount", ROW_ID, "Payment"]
+    assert values[1:] == [
+        ["2026-01-02", "Charlie", "5", "5", "c1", ""],
+        ["2026-01-05", "Alpha", "100", "100", "a1", "0"],
+        ["2026-01-20", "Bravo", "50", "50", "b1", "0"],
+    ]
+    assert _nets(storage)[0][("Charlie", "2026-01")] == 5
+
+
+def test_a_periods_rollup_is_rebuilt_from_the_whole_archive(storage):
+    close_periods(storage, TODAY)
+    # A backdated entry for a closed period, added after it was archived
+    storage.append_rows(storage.ledger, [_row("Alpha", "2026-01-25", 7, "a4")])
+    assert close_periods(storage, TODAY) == {"2026-01": 1}
+    nets, entries = _nets(storage)
+    assert nets == {("Alpha", "2026-01"): 107, ("Bravo", "2026-01"): 50, ("Alpha", "2026-02"): -30}
+    assert entries[("Alpha", "2026-01")] == 2
+    # One rollup row per party and period, old ones replaced
+    assert len(storage.read(ROLLUP_TABLE)) == 1 + 3
@@ -0,0 +1,38 @@
+"""LocalSnapshots: the saved-copy listing is read from disk once, then kept by saves."""
+import pyarrow.parquet as pq
+
+from local_snapshots import LocalSnapshots
+
+VALUES = [["Party", "Amount"], ["Alpha", "10"], ["Bravo", "5"]]
+
+
+def _flush(snapshots):
+    snapshots._writer.submit(lambda: None).result()
+
+
+def test_listing_reads_files_once_and_follows_saves(tmp_path, monkeypatch):
+    LocalSnapshots(str(tmp_path), "book")._save("Sheet1", VALUES, 100.0)
+
+    snapshots = LocalSnapshots(str(tmp_path), "book")
+    reads = []
+    real = pq.read_metadata
+    monkeypatch.setattr(pq, "read_metadata", lambda path: reads.append(path) or real(path))
+    assert snapshots.tables()["Sheet1"]["rows"] == 2
+    snapshots.tables()
+    assert len(reads) == 1
+
+    snapshots.save_later("Acme", [["item"], ["soap"]])
+    snapshots.save_later("Sheet1", VALUES + [["Charlie", "1"]])
+    _flush(snapshots)
+    saved = snapshots.tables()
+    assert len(reads) == 1
+    assert {name: info["rows"] for name, info in saved.items()} == {"Acme": 1, "Sheet1": 3}
+    assert saved == LocalSnapshots(str(tmp_path), "book").tables()
+
+
+def test_unchanged_copy_is_not_written_again(tmp_path):
+    snapshots = LocalSnapshots(str(tmp_path), "book")
+    snapshots.save_later("Sheet1", VALUES)
+    snapshots.save_later("Sheet1", [list(row) for row in VALUES])
+    _flush(snapshots)
+    assert (snapshots.metrics["saved"], snapshots.metrics["skipped"]) == (1, 1)
@@ -0,0 +1,23 @@
+"""Bulk statement export: every party gets its own ZIP entry."""
+import io
+import zipfile
+
+from pdf_export import StatementCache, zip_entry_names
+
+ROWS = [("2026-01-01", "100", "0", "100")]
+
+
+def test_names_that_clean_to_the_same_entry_are_numbered():
+    entries = zip_entry_names(["A/B", "A:B", "a_b", "C"])
+    assert entries == {
+        "A/B": "A_B_records.pdf",
+        "A:B": "A_B_records (2).pdf",
+        "a_b": "a_b_records (3).pdf",
+        "C": "C_records.pdf",
+    }
+
+
+def test_zip_keeps_a_statement_per_party():
+    data = StatementCache().statements_zip({"A/B": ROWS, "A:B": ROWS}, max_workers=1)
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == ["A_B_records.pdf", "A_B_records (2).pdf"]
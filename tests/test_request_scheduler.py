@@ -0,0 +1,65 @@
+"""RequestScheduler: coalesced reads, copies only for followers, 429 retries."""
+import threading
+import time
+
+import gspread
+import requests
+
+import request_scheduler
+from request_scheduler import RequestScheduler
+
+
+def _rate_limited():
+    response = requests.Response()
+    response.status_code = 429
+    response._content = b'{"error": {"code": 429, "message": "quota"}}'
+    return gspread.exceptions.APIError(response)
+
+
+def test_identical_reads_in_flight_are_sent_once_with_private_copies():
+    scheduler = RequestScheduler(reads_per_minute=600)
+    calls = []
+    release = threading.Event()
+
+    def read():
+        calls.append(1)
+        release.wait(5)
+        return [["a", "b"]]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(scheduler.run("get_all_values", "T", read)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert scheduler.stats()["coalesced"] == 3
+    results[0][0][0] = "changed"
+    assert all(r == [["a", "b"]] for r in results[1:])
+    assert len({id(r) for r in results}) == 4
+
+
+def test_a_read_nobody_joined_is_not_copied(monkeypatch):
+    copies = []
+    monkeypatch.setattr(request_scheduler, "_copy", lambda result: copies.append(result) or result)
+    scheduler = RequestScheduler(reads_per_minute=600)
+    values = [["a"]]
+    assert scheduler.run("get_all_values", "T", lambda: values) is values
+    assert copies == []
+
+
+def test_rate_limited_request_is_retried():
+    scheduler = RequestScheduler(reads_per_minute=600, reserve=0, base_delay=0.05)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _rate_limited()
+        return [["ok"]]
+
+    assert scheduler.run("get_all_values", "T", flaky) == [["ok"]]
+    assert scheduler.stats()["rate_limited"] == 2
@@ -0,0 +1,52 @@
+"""SearchIndex: cached prefix rankings stay equal to a fresh index's."""
+import random
+
+from search_index import SearchIndex
+
+QUERIES = ["a", "al", "b", "br", "alpha", "cha", "d", "z"]
+
+
+def _names(n, seed):
+    rnd = random.Random(seed)
+    first = ["Alpha", "Alder", "Bravo", "Brand", "Charlie", "Chalk", "Delta", "Dune"]
+    last = ["Traders", "Stores", "Alpha", "Brothers", "Mart", "Dairy"]
+    return [f"{rnd.choice(first)} {rnd.choice(last)} {rnd.randint(1, n)}" for _ in range(n)]
+
+
+def _results(index, limit=5):
+    return {q: index.search(q, limit) for q in QUERIES}
+
+
+def test_ranking_is_by_tier_then_usage():
+    index = SearchIndex(["Bravo Alpha"] * 5 + ["Alpha Stores", "Alpha Traders", "Alpha Traders"])
+    assert index.search("alpha") == ["Alpha Traders", "Alpha Stores", "Bravo Alpha"]
+
+
+def test_cached_prefixes_follow_adds_and_discards():
+    names = _names(400, seed=1)
+    index = SearchIndex(names)
+    _results(index)
+    assert set(QUERIES) <= set(index.top)
+    current = list(names)
+    for name in _names(200, seed=2) + names[:50]:
+        index.add(name)
+        current.append(name)
+    for name in names[50:150]:
+        index.discard(name)
+        current.remove(name)
+    assert _results(index) == _results(SearchIndex(current))
+
+
+def test_limits_above_the_cached_size_are_ranked_in_full():
+    names = _names(400, seed=3)
+    index = SearchIndex(names)
+    wide = index.search("a", limit=SearchIndex.top_k + 10)
+    assert len(wide) == SearchIndex.top_k + 10
+    assert wide[:5] == index.search("a")
+
+
+def test_number_of_cached_prefixes_is_bounded(monkeypatch):
+    monkeypatch.setattr(SearchIndex, "max_prefixes", 3)
+    index = SearchIndex(_names(100, seed=4))
+    _results(index)
+    assert len(index.top) == 3
@@ -0,0 +1,217 @@
+"""Derived objects kept in step through the SnapshotCache hooks must match a rebuild."""
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from ledger_index import LedgerIndex
+from row_index import RowIdIndex
+from schema import LEDGER_SCHEMA, STOCK_SCHEMA, TypedTable
+from search_index import ColumnSearchIndex
+from snapshot_cache import SnapshotCache
+from stock_index import StockIndex
+
+KEY = ("sheet", "Sheet1")
+LEDGER = [
+    ["Party", "Date", "Amount", "Payment", "Balance", "Row ID"],
+    ["Alpha", "2026-01-01", "100", "0", "100", "a1"],
+    ["Bravo", "2026-01-02", "50", "0", "50", "b1"],
+    ["Alpha", "2026-01-03", "0", "30", "-30", "a2"],
+]
+STOCK = [
+    ["item", "date", "current_stock", "new_stock", "sold_qty", "final_stock", "Row ID"],
+    ["Soap", "2026-01-01", "0", "10", "2", "8", "s1"],
+    ["Rice", "2026-01-01", "0", "5", "1", "4", "r1"],
+    ["Soap", "2026-01-02", "8", "0", "3", "5", "s2"],
+]
+
+
+def _ledger_state(index):
+    return index.positions, {party: round(b, 2) for party, b in index.balances.items()}
+
+
+def _row_id_state(index):
+    return index.ids, index.positions
+
+
+def _search_state(index):
+    return +index.counts, index.sorted_names, index.sorted_words
+
+
+def _stock_state(index):
+    entries = {item: [(day, final) for day, _, final in rows] for item, rows in index.entries.items()}
+    return entries, +index.received, +index.sold
+
+
+def _typed_state(table):
+    frame = table.frame.copy()
+    for col in frame.columns:
+        if isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype(str)
+    return frame.to_dict("list"), table.issues
+
+
+DERIVED = [
+    ("ledger_index", LedgerIndex, _ledger_state, LEDGER),
+    ("row_ids", RowIdIndex, _row_id_state, LEDGER),
+    ("party_search", lambda v: ColumnSearchIndex(v, "Party"), _search_state, LEDGER),
+    ("typed", lambda v: TypedTable(v, LEDGER_SCHEMA), _typed_state, LEDGER),
+    ("stock_index", StockIndex, _stock_state, STOCK),
+    ("typed_stock", lambda v: TypedTable(v, STOCK_SCHEMA), _typed_state, STOCK),
+]
+
+
+def _cache(values):
+    cache = SnapshotCache(ttl=60)
+    cache.get(KEY, lambda: [list(row) for row in values])
+    return cache
+
+
+def _expire(cache):
+    cache._entries[KEY]["loaded_at"] -= 120
+
+
+def _check(cache, name, builder, state):
+    values = cache.get(KEY, lambda: pytest.fail("snapshot should be cached"))
+    assert state(cache.derived(KEY, name, builder)) == state(builder(values))
+
+
+def _extra(values, n):
+    # Rows shaped like the table's own, with fresh names and IDs
+    template = values[1]
+    return [[f"New {i}"] + template[1:-1] + [f"n{i}"] for i in range(n)]
+
+
+@pytest.mark.parametrize("name, builder, state, values", DERIVED, ids=[d[0] for d in DERIVED])
+def test_append(name, builder, state, values):
+    cache = _cache(values)
+    cache.derived(KEY, name, builder)
+    for row in _extra(values, 2):
+        assert cache.apply_append(KEY, row)
+    _check(cache, name, builder, state)
+
+
+@pytest.mark.parametrize("name, builder, state, values", DERIVED, ids=[d[0] for d in DERIVED])
+def test_extend_from_delta_refresh(name, builder, state, values):
+    cache = _cache(values)
+    cache.derived(KEY, name, builder)
+    _expire(cache)
+    new_rows = _extra(values, 3)
+    cache.get(KEY, lambda: pytest.fail("refresh should be used"), refresh=lambda v: new_rows)
+    assert cache.stats()["refreshes"] == 1
+    _check(cache, name, builder, state)
+
+
+@pytest.mark.parametrize("name, builder, state, values", DERIVED, ids=[d[0] for d in DERIVED])
+def test_update(name, builder, state, values):
+    cache = _cache(values)
+    cache.derived(KEY, name, builder)
+    # Same name, new figures; then a row moved to another name
+    assert cache.apply_update(KEY, 0, 3, values[1][2:5])
+    assert cache.apply_update(KEY, 1, 1, [values[1][0]])
+    _check(cache, name, builder, state)
+
+
+@pytest.mark.parametrize("name, builder, state, values", DERIVED, ids=[d[0] for d in DERIVED])
+def test_delete(name, builder, state, values):
+    cache = _cache(values)
+    cache.derived(KEY, name, builder)
+    assert cache.apply_delete(KEY, 0)
+    for row in _extra(values, 2):
+        cache.apply_append(KEY, row)
+    assert cache.apply_delete(KEY, 1)
+    _check(cache, name, builder, state)
+
+
+def test_ledger_positions_after_refresh_point_at_the_right_rows():
+    cache = _cache(LEDGER)
+    cache.derived(KEY, "ledger_index", LedgerIndex)
+    cache.derived(KEY, "row_ids", RowIdIndex)
+    _expire(cache)
+    new_rows = [["Charlie", "2026-01-04", "10", "0", "10", "c1"], ["Delta", "2026-01-05", "20", "0", "20", "d1"]]
+    values = cache.get(KEY, lambda: None, refresh=lambda v: new_rows)
+    index = cache.derived(KEY, "ledger_index", LedgerIndex)
+    rows = cache.derived(KEY, "row_ids", RowIdIndex)
+    for party, row_id in [("Charlie", "c1"), ("Delta", "d1")]:
+        (position,) = index.rows(party)
+        assert values[position + 1][5] == row_id
+        assert rows.position(row_id) == position
+
+
+@pytest.mark.parametrize("change", ["append", "delete", "update"])
+def test_a_snapshot_handed_out_is_not_changed_by_later_writes(change):
+    cache = _cache(LEDGER)
+    snapshot = cache.snapshot(KEY)
+    frame = snapshot.derived("typed", lambda v: TypedTable(v, LEDGER_SCHEMA)).frame
+    index = snapshot.derived("ledger_index", LedgerIndex)
+    before = (list(snapshot.values), frame.copy(), _ledger_state(index))
+    if change == "append":
+        cache.apply_append(KEY, ["Alpha", "2026-01-04", "5", "0", "5", "a3"])
+    elif change == "delete":
+        cache.apply_delete(KEY, 0)
+    else:
+        cache.apply_update(KEY, 0, 1, ["Bravo"])
+    # Another session changed the table; this rerun's view still agrees with itself
+    assert snapshot.values == before[0]
+    assert snapshot.derived("typed", pytest.fail).frame.equals(before[1])
+    assert _ledger_state(snapshot.derived("ledger_index", pytest.fail)) == before[2]
+    assert list(frame.iloc[index.rows("Alpha")]["Row ID"]) == ["a1", "a2"]
+    assert cache.snapshot(KEY) is not snapshot
+
+
+def test_a_slow_build_does_not_hold_the_cache_lock():
+    cache = _cache(LEDGER)
+    other = ("sheet", "Other")
+    cache.get(other, lambda: [["Party"]])
+    started, release = threading.Event(), threading.Event()
+
+    def slow_builder(values):
+        started.set()
+        release.wait(5)
+        return LedgerIndex(values)
+
+    builder = threading.Thread(target=cache.derived, args=(KEY, "ledger_index", slow_builder))
+    builder.start()
+    assert started.wait(5)
+    try:
+        # Other tables, version polls and writes carry on while it builds
+        waited = time.monotonic()
+        assert cache.get(other, pytest.fail) == [["Party"]]
+        cache.version("sheet")
+        assert cache.apply_append(other, ["Alpha"])
+        assert time.monotonic() - waited < 1
+    finally:
+        release.set()
+        builder.join()
+    assert cache.derived(KEY, "ledger_index", pytest.fail).rows("Alpha") == [0, 2]
+
+
+def test_a_write_at_a_moved_position_drops_the_entry_instead():
+    cache = _cache(LEDGER)
+    # Position 1 came from a snapshot taken before row 0 was deleted elsewhere
+    cache.apply_delete(KEY, 0)
+    version = cache.version("sheet")
+    assert not cache.apply_delete(KEY, 1, expect=lambda row: "b1" in row)
+    assert cache.snapshot(KEY) is None
+    assert cache.version("sheet") > version
+    cache = _cache(LEDGER)
+    assert cache.apply_update(KEY, 1, 1, ["Charlie"], expect=lambda row: "b1" in row)
+    assert cache.snapshot(KEY).values[2][0] == "Charlie"
+
+
+def test_typed_frame_is_put_together_on_read_after_a_run_of_changes():
+    values = [list(row) for row in LEDGER]
+    table = TypedTable(values, LEDGER_SCHEMA)
+    for row in _extra(LEDGER, 5):
+        table = table.on_append(row)
+        values.append(row)
+    table = table.on_update(1, values[2], ["Echo", "2026-01-02", "x", "0", "50", "b1"])
+    values[2] = ["Echo", "2026-01-02", "x", "0", "50", "b1"]
+    table = table.on_delete(0, values.pop(1))
+    table = table.on_append(["Foxtrot", "bad date", "1", "0", "1", "f1"])
+    values.append(["Foxtrot", "bad date", "1", "0", "1", "f1"])
+    assert table._built is None
+    rebuilt = TypedTable(values, LEDGER_SCHEMA)
+    assert _typed_state(table)[0] == _typed_state(rebuilt)[0]
+    assert sorted(table.issues) == sorted(rebuilt.issues)
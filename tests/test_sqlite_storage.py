@@ -0,0 +1,62 @@
+"""SQLiteStorage: rows are found by ID through the index, and by position, however many are asked for."""
+import sqlite3
+
+import pytest
+
+from storage import LEDGER_HEADER, SQLiteStorage, StorageError
+
+
+def _row(i):
+    return ["Alpha", "2026-01-01", str(i), "0", str(i), f"r{i}"]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "ledger.db"))
+    storage.append_rows(storage.ledger, [_row(i) for i in range(100)])
+    # Gaps in _row, as deletes leave them
+    storage.delete_rows(storage.ledger, [2, 5, 50])
+    return storage
+
+
+def _expected(storage):
+    return {row[5]: row_index for row_index, row in enumerate(storage.read(storage.ledger), start=1) if row_index > 1}
+
+
+@pytest.mark.parametrize("count", [1, SQLiteStorage.few_rows + 1])
+def test_locate_rows_after_deletes(storage, count):
+    expected = _expected(storage)
+    wanted = list(expected)[-count:] + ["gone"]
+    assert storage.locate_rows(storage.ledger, dict.fromkeys(wanted)) == {row_id: expected[row_id] for row_id in wanted[:-1]}
+
+
+def test_row_ids_are_looked_up_through_the_index(storage):
+    sql_name, _ = storage._table(storage.ledger)
+    plan = storage.conn.execute(f"EXPLAIN QUERY PLAN SELECT _row FROM {sql_name} WHERE c5 = ?", ("r7",)).fetchall()
+    assert any(f"{sql_name}_row_id" in step[-1] for step in plan)
+
+
+@pytest.mark.parametrize("rows", [[2, 60], list(range(2, 2 + SQLiteStorage.few_rows + 1))])
+def test_updates_and_deletes_by_position(storage, rows):
+    before = storage.read(storage.ledger)
+    storage.update_rows(storage.ledger, [(row, 1, ["Bravo"]) for row in rows])
+    after = storage.read(storage.ledger)
+    assert [r[0] for i, r in enumerate(after, start=1) if i in rows] == ["Bravo"] * len(rows)
+    storage.delete_rows(storage.ledger, rows)
+    assert storage.read(storage.ledger) == [r for i, r in enumerate(before, start=1) if i not in rows]
+    with pytest.raises(StorageError):
+        storage.update_rows(storage.ledger, [(len(before) + 5, 1, ["x"])])
+
+
+def test_old_files_lose_unused_indexes_and_gain_the_row_id_one(tmp_path):
+    path = str(tmp_path / "old.db")
+    SQLiteStorage(path)
+    conn = sqlite3.connect(path)
+    conn.execute("DROP INDEX t1_row_id")
+    conn.execute("CREATE INDEX t1_c0 ON t1 (c0)")
+    conn.commit()
+    conn.close()
+    storage = SQLiteStorage(path)
+    names = {r[0] for r in storage.conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert "t1_c0" not in names and "t1_row_id" in names
+    assert storage.read(storage.ledger) == [LEDGER_HEADER]
@@ -0,0 +1,110 @@
+"""Stock roll-forward: which rows a save or delete rewrites, and with what figures."""
+import pytest
+
+from row_index import RowIdIndex
+from schema import STOCK_SCHEMA, TypedTable
+from stock_rollforward import delete_stock_entry, plan_stock_delete, plan_stock_save, roll_forward
+from storage import STOCK_HEADER, SQLiteStorage
+
+# (date, current, new, sold, final) of one item, oldest first
+HISTORY = [
+    ("2026-01-01", 0, 10, 2, 8),
+    ("2026-01-02", 8, 0, 3, 5),
+    ("2026-01-03", 5, 0, 1, 4),
+]
+
+
+def _values(rows):
+    return [list(STOCK_HEADER)] + [
+        ["soap", day] + [str(n) for n in figures] + [f"s{i}"] for i, (day, *figures) in enumerate(rows)
+    ]
+
+
+def _frame(rows):
+    return TypedTable(_values(rows), STOCK_SCHEMA).frame
+
+
+@pytest.mark.parametrize("rows, sold, opening, new, updates, appends", [
+    pytest.param(
+        HISTORY[1:], {"2026-01-01": 1}, 0, 5,
+        [(0, "2026-01-02", [4, 0, 3, 1]), (1, "2026-01-03", [1, 0, 1, 0])],
+        [("2026-01-01", [0, 5, 1, 4])],
+        id="backdated insert rolls every later row",
+    ),
+    pytest.param(
+        # The third row is off, but the second already agrees, so it is left alone
+        HISTORY[:2] + [("2026-01-03", 99, 0, 1, 4)], {"2026-01-01": 0}, 0, 10,
+        [(0, "2026-01-01", [0, 10, 2, 8])], [],
+        id="stops at the first row that agrees",
+    ),
+    pytest.param(
+        HISTORY, {"2026-01-01": 0, "2026-01-03": 2}, 0, 10,
+        [(0, "2026-01-01", [0, 10, 2, 8]), (2, "2026-01-03", [5, 0, 3, 2])], [],
+        id="keeps going to the last touched row",
+    ),
+    pytest.param(
+        [HISTORY[0], ("", 8, 0, 1, 7)], {"2026-01-02": 3}, 8, 0,
+        [(1, "", [5, 0, 1, 4])], [("2026-01-02", [8, 0, 3, 5])],
+        id="undated rows stay last",
+    ),
+    pytest.param(HISTORY, {}, 0, 0, [], [], id="nothing sold or added"),
+])
+def test_plan_stock_save(rows, sold, opening, new, updates, appends):
+    assert plan_stock_save(_frame(rows), sold, opening, new) == (updates, appends)
+
+
+@pytest.mark.parametrize("index, updates", [
+    pytest.param(0, [(1, "2026-01-02", [0, 0, 3, -3]), (2, "2026-01-03", [-3, 0, 1, -4])], id="first row"),
+    pytest.param(1, [(2, "2026-01-03", [8, 0, 1, 7])], id="middle row"),
+    pytest.param(2, [], id="last row"),
+    pytest.param(7, [], id="not the item's row"),
+])
+def test_plan_stock_delete(index, updates):
+    assert plan_stock_delete(_frame(HISTORY), index) == updates
+
+
+@pytest.mark.parametrize("start, opening, touched, changed", [
+    pytest.param(0, 0, [], [], id="already in step"),
+    pytest.param(0, 2, [], [0, 1, 2], id="new opening runs to the end"),
+    pytest.param(1, 8, [2], [2], id="touched row past rows that agree"),
+    pytest.param(1, 6, [], [1, 2], id="from a later start"),
+])
+def test_roll_forward(start, opening, touched, changed):
+    history = [
+        {"index": i, "date": day, "current": c, "new": n, "sold": s, "final": f, "touched": i in touched}
+        for i, (day, c, n, s, f) in enumerate(HISTORY)
+    ]
+    assert [row["index"] for row in roll_forward(history, start, opening)] == changed
+    assert history[start]["current"] == opening
+    assert all(after["current"] == before["final"] for before, after in zip(history[start:], history[start + 1:]))
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "stock.db"))
+    storage.create_table("Acme", STOCK_HEADER)
+    storage.append_rows("Acme", _values(HISTORY)[1:])
+    return storage
+
+
+def _delete_first(storage):
+    values = _values(HISTORY)
+    return delete_stock_entry(storage, "Acme", values, _frame(HISTORY), 0, RowIdIndex(values))
+
+
+def test_deleting_the_first_entry_rolls_the_rest_forward(storage):
+    deleted, in_step, batch, results = _delete_first(storage)
+    assert (deleted, in_step, batch.stale) == (2, True, False)
+    assert all(r["ok"] for r in results)
+    assert storage.read("Acme")[1:] == [
+        ["soap", "2026-01-02", "0", "0", "3", "-3", "s1"],
+        ["soap", "2026-01-03", "-3", "0", "1", "-4", "s2"],
+    ]
+
+
+def test_a_later_row_edited_elsewhere_is_not_overwritten(storage):
+    storage.update_rows("Acme", [(4, 5, ["0"])])
+    deleted, in_step, batch, results = _delete_first(storage)
+    assert deleted == 2 and batch.stale
+    assert not any(r["ok"] for r in results)
+    assert storage.read("Acme")[2] == ["soap", "2026-01-03", "5", "0", "0", "4", "s2"]
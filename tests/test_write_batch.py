@@ -0,0 +1,57 @@
+"""WriteBatch: updates by row ID follow moved rows and refuse rows edited elsewhere."""
+import pytest
+
+from storage import SQLiteStorage, STOCK_HEADER
+from write_batch import CHANGED, WriteBatch
+
+TABLE = "Acme"
+ROWS = [
+    ["soap", "2026-01-01", "0", "10", "2", "8", "s1"],
+    ["soap", "2026-01-02", "8", "0", "3", "5", "s2"],
+    ["soap", "2026-01-03", "5", "0", "1", "4", "s3"],
+]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "stock.db"))
+    storage.create_table(TABLE, STOCK_HEADER)
+    storage.append_rows(TABLE, ROWS)
+    return storage
+
+
+def _save(storage, appends=()):
+    # Later rows re-opened with new figures, as worked out from ROWS
+    batch = WriteBatch(storage, TABLE)
+    batch.update(3, 3, ["9", "0", "3", "6"], row_id="s2", expect=ROWS[1])
+    batch.update(4, 3, ["6", "0", "1", "5"], row_id="s3", expect=ROWS[2])
+    for row in appends:
+        batch.append(row)
+    return batch, batch.flush()
+
+
+def test_rows_as_expected_are_written_in_one_read(storage):
+    batch, results = _save(storage)
+    assert all(r["ok"] for r in results) and not batch.stale
+    assert batch.api_calls == 2
+    assert storage.read(TABLE)[3][2:6] == ["6", "0", "1", "5"]
+
+
+def test_a_moved_row_is_written_where_it_is_now(storage):
+    storage.delete_rows(TABLE, [2])
+    batch, results = _save(storage)
+    assert all(r["ok"] for r in results) and batch.stale
+    assert [row[6] for row in storage.read(TABLE)[1:]] == ["s2", "s3"]
+    assert storage.read(TABLE)[2][2:6] == ["6", "0", "1", "5"]
+
+
+def test_a_row_edited_elsewhere_stops_the_whole_batch(storage):
+    # Another device changed what was sold that day
+    storage.update_rows(TABLE, [(3, 5, ["4"])])
+    before = storage.read(TABLE)
+    batch, results = _save(storage, appends=[["soap", "2026-01-04", "4", "0", "1", "3", "s4"]])
+    assert batch.stale
+    assert [(r["op"], r["ok"], r["error"]) for r in results] == [
+        ("update", False, CHANGED), ("update", False, CHANGED), ("append", False, CHANGED),
+    ]
+    assert storage.read(TABLE) == before
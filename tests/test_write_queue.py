@@ -0,0 +1,194 @@
+"""WriteQueue: reads don't wait on background writes, and never count a write twice."""
+import threading
+import time
+
+import pytest
+
+from storage import ROW_ID, StorageError
+from write_queue import WriteQueue
+
+HEADER = ["Party", "Amount", ROW_ID]
+
+
+class SlowStorage:
+    """In-memory tables whose append_rows can be held at chosen points."""
+
+    def __init__(self):
+        self.tables = {"Sheet1": [list(HEADER), ["Alpha", "10", "a1"]], "Sheet2": [list(HEADER)]}
+        self.before_write = threading.Event()
+        self.after_write = threading.Event()
+        self.before_write.set()
+        self.after_write.set()
+        self.calls = 0
+        self.error = None
+
+    def read(self, table):
+        return [list(row) for row in self.tables[table]]
+
+    def append_rows(self, table, rows):
+        self.calls += 1
+        if self.error:
+            raise StorageError(self.error)
+        self.before_write.wait(5)
+        self.tables[table].extend(list(row) for row in rows)
+        self.after_write.wait(5)
+
+    def locate_rows(self, table, hints):
+        col = self.tables[table][0].index(ROW_ID)
+        where = {row[col]: i for i, row in enumerate(self.tables[table], start=1) if i > 1}
+        return {row_id: where[row_id] for row_id in hints if row_id in where}
+
+    def delete_rows(self, table, rows):
+        for row in sorted(rows, reverse=True):
+            del self.tables[table][row - 1]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    storage = SlowStorage()
+    q = WriteQueue(storage, path=str(tmp_path / "queue.db"), base_delay=0.01)
+    yield q
+    storage.before_write.set()
+    storage.after_write.set()
+
+
+def _wait_for(check, timeout=5):
+    end = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.01)
+
+
+def _timed_read(queue, table="Sheet1"):
+    started = time.monotonic()
+    values = queue.read_through(table, queue.storage.read)
+    return values, time.monotonic() - started
+
+
+def test_read_does_not_wait_for_a_write_on_the_network(queue):
+    queue.storage.before_write.clear()
+    queue.append("Sheet1", ["Bravo", "5", "b1"])
+    _wait_for(lambda: queue.storage.calls == 1)
+    values, seconds = _timed_read(queue)
+    assert seconds < 0.5
+    assert [row[2] for row in values[1:]] == ["a1", "b1"]
+
+
+def test_write_landed_but_not_yet_removed_is_counted_once(queue):
+    queue.storage.after_write.clear()
+    queue.append("Sheet1", ["Bravo", "5", "b1"])
+    _wait_for(lambda: len(queue.storage.tables["Sheet1"]) == 3)
+    values, _ = _timed_read(queue)
+    assert [row[2] for row in values[1:]] == ["a1", "b1"]
+
+
+def test_deletes_by_id_are_applied_once(queue):
+    queue.storage.before_write.clear()
+    queue.append("Sheet1", ["Bravo", "5", "b1"])
+    queue.delete("Sheet1", {"a1": 2})
+    values, _ = _timed_read(queue)
+    assert [row[2] for row in values[1:]] == ["b1"]
+
+
+def test_gate_holds_the_worker_back_from_one_table(queue):
+    with queue.gate("Sheet1"):
+        queue.append("Sheet1", ["Bravo", "5", "b1"])
+        time.sleep(0.2)
+        assert queue.storage.calls == 0
+    _wait_for(lambda: queue.stats()["depth"] == 0)
+    assert queue.storage.tables["Sheet1"][-1][2] == "b1"
+
+
+def test_gate_waits_for_a_batch_already_on_its_way(queue):
+    queue.storage.after_write.clear()
+    queue.append("Sheet1", ["Bravo", "5", "b1"])
+    _wait_for(lambda: queue.storage.calls == 1)
+    threading.Timer(0.2, queue.storage.after_write.set).start()
+    with queue.gate("Sheet1"):
+        assert queue.stats()["depth"] == 0
+
+
+def test_when_settled_skips_a_table_with_pending_writes(queue):
+    queue.storage.before_write.clear()
+    queue.append("Sheet1", ["Bravo", "5", "b1"])
+    assert queue.when_settled("Sheet1", lambda: "read") is None
+    queue.storage.before_write.set()
+    _wait_for(lambda: queue.stats()["depth"] == 0)
+    assert queue.when_settled("Sheet1", lambda: "read") == "read"
+
+
+def test_drain_waits_for_a_tables_pending_writes(queue):
+    queue.storage.before_write.clear()
+    queue.append("Sheet1", ["Bravo", "5", "b1"])
+    assert queue.drain("Sheet1", timeout=0.2) is False
+    queue.storage.before_write.set()
+    assert queue.drain("Sheet1", timeout=5)
+    assert queue.stats()["depth"] == 0
+
+
+def test_parked_writes_are_listed_and_retried_per_table(tmp_path):
+    storage = SlowStorage()
+    storage.error = "quota exceeded"
+    failed = []
+    q = WriteQueue(storage, path=str(tmp_path / "queue.db"), base_delay=0.01, max_attempts=2, on_failed=failed.append)
+    q.append("Sheet1", ["Bravo", "5", "b1"])
+    q.append("Sheet2", ["Charlie", "7", "c1"])
+    _wait_for(lambda: q.stats()["parked"] == 2)
+    assert failed == ["Sheet1", "Sheet2"]
+    parked = q.failed()
+    assert [(op["table"], op["payload"], op["error"]) for op in parked] == [
+        ("Sheet1", ["Bravo", "5", "b1"], "quota exceeded"),
+        ("Sheet2", ["Charlie", "7", "c1"], "quota exceeded"),
+    ]
+    # Parked ops are left out of reads until retried
+    assert [row[2] for row in q.read_through("Sheet1", storage.read)[1:]] == ["a1"]
+
+    storage.error = None
+    q.retry_failed("Sheet1")
+    _wait_for(lambda: q.stats()["depth"] == 0)
+    assert storage.tables["Sheet1"][-1][2] == "b1"
+    assert [op["table"] for op in q.failed()] == ["Sheet2"]
+
+
+def test_a_retried_append_that_had_landed_is_not_written_twice(queue):
+    # The rows land but the response is lost
+    storage = queue.storage
+    append_rows = storage.append_rows
+
+    def lost_response(table, rows):
+        append_rows(table, rows)
+        storage.append_rows = append_rows
+        raise StorageError("connection reset")
+
+    storage.append_rows = lost_response
+    queue.append("Sheet1", ["Bravo", "5", "b1"], row_id="b1")
+    queue.append("Sheet1", ["Charlie", "7", "c1"], row_id="c1")
+    assert queue.drain("Sheet1", timeout=5)
+    assert [row[2] for row in storage.tables["Sheet1"][1:]] == ["a1", "b1", "c1"]
+    assert queue.stats()["retries"] == 1
+
+
+def test_an_append_sent_before_a_restart_is_checked_first(tmp_path):
+    path = str(tmp_path / "queue.db")
+    storage = SlowStorage()
+    storage.after_write.clear()
+    first = WriteQueue(storage, path=path, base_delay=0.01)
+    first.append("Sheet1", ["Bravo", "5", "b1"], row_id="b1")
+    # The row is written, then the process stops before the op is dropped
+    _wait_for(lambda: len(storage.tables["Sheet1"]) == 3)
+    second = WriteQueue(storage, path=path, base_delay=0.01)
+    storage.after_write.set()
+    assert second.drain("Sheet1", timeout=5)
+    assert [row[2] for row in storage.tables["Sheet1"][1:]] == ["a1", "b1"]
+
+
+def test_drain_cuts_a_retry_backoff_short(tmp_path):
+    storage = SlowStorage()
+    storage.error = "quota exceeded"
+    q = WriteQueue(storage, path=str(tmp_path / "queue.db"), base_delay=30, max_delay=30)
+    q.append("Sheet1", ["Bravo", "5", "b1"], row_id="b1")
+    _wait_for(lambda: q.stats()["retries"] == 1)
+    storage.error = None
+    started = time.monotonic()
+    assert q.drain("Sheet1", timeout=5)
+    assert time.monotonic() - started < 5
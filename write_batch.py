@@ -0,0 +1,131 @@
+from storage import StorageError
+
+CHANGED = "Row was changed elsewhere; reloaded, save again"
+
+
+# --- Same cells, ignoring blanks at the end (the sheet doesn't return them) ---
+def same_row(a, b):
+    a, b = [str(v) for v in a], [str(v) for v in b]
+    while a and a[-1] == "":
+        a.pop()
+    while b and b[-1] == "":
+        b.pop()
+    return a == b
+
+
+# --- Batched writes for one table ---
+class WriteBatch:
+    """Collects row updates and appended rows and sends them together.
+
+    ``flush()`` issues at most one ``update_rows`` and one ``append_rows``
+    call to the storage backend (one ``batch_update`` and one
+    ``append_rows`` on Google Sheets) and returns one result per queued
+    row, so a failure in either request is reported against the rows it
+    carried.
+
+    Updates queued with a ``row_id`` are first checked against the table
+    (one read of the target rows): a row that moved is written where it is
+    now, one that was deleted elsewhere is reported as failed, and either
+    case sets ``stale`` so the caller knows its snapshot is out of date.
+    An update queued with ``expect`` (the row as the caller last saw it)
+    also checks the row's cells: if another device edited one of them,
+    nothing in the batch is written, since its values were worked out
+    from the old ones.
+    """
+
+    def __init__(self, storage, table):
+        self.storage = storage
+        self.table = table
+        self.updates = []
+        self.appends = []
+        self.api_calls = 0
+        self.stale = False
+
+    def update(self, row_index, first_col, values, label=None, row_id=None, expect=None):
+        self.updates.append({
+            "row": (row_index, first_col, list(values)), "label": label or row_index,
+            "row_id": row_id, "expect": expect,
+        })
+
+    def append(self, row, label=None):
+        self.appends.append({"row": [str(x) for x in row], "label": label or row[0]})
+
+    def __len__(self):
+        return len(self.updates) + len(self.appends)
+
+    def flush(self):
+        results = []
+
+        if self.updates:
+            updates, results = self._locate(self.updates)
+            if updates:
+                rows = [u["row"] for u in updates]
+                results += self._send("update", updates, self.storage.update_rows, rows)
+
+        if self.appends and any(r["error"] == CHANGED for r in results):
+            results += [self._result("append", a, CHANGED) for a in self.appends]
+        elif self.appends:
+            rows = [a["row"] for a in self.appends]
+            results += self._send("append", self.appends, self.storage.append_rows, rows)
+
+        self.updates = []
+        self.appends = []
+        return results
+
+    def _locate(self, updates):
+        # Point updates made by row ID at the row's current position, reading
+        # the rows there; only IDs not found where expected are looked up
+        hints = {u["row_id"]: u["row"][0] for u in updates if u["row_id"]}
+        if not hints:
+            return updates, []
+        try:
+            current, cells = self._read(hints)
+        except StorageError as e:
+            return [], [self._result("update", u, str(e)) for u in updates]
+        if any(u["expect"] is not None and u["row_id"] in cells and not same_row(cells[u["row_id"]], u["expect"])
+               for u in updates):
+            self.stale = True
+            return [], [self._result("update", u, CHANGED) for u in updates]
+
+        ready, gone = [], []
+        for u in updates:
+            row_id = u["row_id"]
+            if row_id and row_id not in current:
+                self.stale = True
+                gone.append(self._result("update", u, "Row was deleted elsewhere"))
+                continue
+            if row_id and current[row_id] != u["row"][0]:
+                self.stale = True
+                u = dict(u, row=(current[row_id],) + u["row"][1:])
+            ready.append(u)
+        return ready, gone
+
+    def _read(self, hints):
+        self.api_calls += 1
+        rows = self.storage.read_rows(self.table, list(hints.values()))
+        cells = {row_id: found for row_id, found in zip(hints, rows) if row_id in found}
+        moved = [row_id for row_id in hints if row_id not in cells]
+        current = {row_id: hints[row_id] for row_id in cells}
+        if moved:
+            self.api_calls += 1
+            located = self.storage.locate_rows(self.table, dict.fromkeys(moved))
+            if located:
+                self.api_calls += 1
+                cells.update(zip(located, self.storage.read_rows(self.table, list(located.values()))))
+                current.update(located)
+        return current, cells
+
+    def _send(self, op, queued, call, rows):
+        self.api_calls += 1
+        try:
+            call(self.table, rows)
+            error = None
+        except StorageError as e:
+            error = str(e)
+        return [self._result(op, q, error) for q in queued]
+
+    def _result(self, op, queued, error):
+        return {
+            "label": queued["label"], "op": op, "row": queued["row"], "row_id": queued.get("row_id"),
+            "ok": error is None, "error": error,
+        }
@@ -0,0 +1,311 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from storage import ROW_ID, StorageError
+
+
+# --- Durable write-behind queue ---
+class WriteQueue:
+    """Accepts appends/deletes immediately and writes them in the background.
+
+    Pending operations are kept in a local SQLite file so they survive a
+    restart. A worker thread flushes them in order, coalescing consecutive
+    appends to the same table into one ``append_rows`` call and retrying
+    failures with jittered exponential backoff. An append that may have
+    landed before failing (a lost response, or a restart mid-write) is
+    checked by row ID before it is sent again. An operation that still
+    fails after ``max_attempts`` is parked as failed (and ``on_failed`` is
+    called) until it is retried by hand.
+
+    No lock is held while a batch is on the network. The batch is marked
+    in flight for its table instead: reads overlay pending ops in a way
+    that doesn't count an in-flight one twice, and ``gate(table)`` holds
+    the worker back from one table (e.g. while rows are moved out of it).
+    """
+
+    def __init__(self, storage, path="pending_writes.db", base_delay=1.0, max_delay=60.0,
+                 max_attempts=8, on_failed=None):
+        self.storage = storage
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.on_failed = on_failed
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ops ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, table_name TEXT, op TEXT, payload TEXT, "
+            "attempts INTEGER DEFAULT 0, failed INTEGER DEFAULT 0, created REAL, last_error TEXT, "
+            "row_id TEXT, sent INTEGER DEFAULT 0)"
+        )
+        # Files from before appends were checked on retry
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(ops)")}
+        for column, kind in [("row_id", "TEXT"), ("sent", "INTEGER DEFAULT 0")]:
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE ops ADD COLUMN {column} {kind}")
+        self.conn.commit()
+        self._db = threading.RLock()
+        # Tables with a batch on the network, and tables the worker must leave alone
+        self._state = threading.Condition()
+        self._in_flight = set()
+        self._gates = Counter()
+        self._wake = threading.Event()
+        self._hurry = threading.Event()
+        self.metrics = {"enqueued": 0, "flushed": 0, "flush_calls": 0, "retries": 0,
+                        "retry_sleep": 0.0, "failed": 0, "last_error": None}
+        self._worker = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        self._worker.start()
+
+    # --- Producer side ---
+    def append(self, table, row, row_id=None):
+        """Append ``row``; with its ``row_id`` a retry won't add it twice."""
+        self._put(table, "append", [str(x) for x in row], row_id)
+
+    def delete(self, table, hints):
+        """Delete rows by ID; ``hints`` maps each row ID to its last known row."""
+        self._put(table, "delete", {str(row_id): row for row_id, row in hints.items()})
+
+    def _put(self, table, op, payload, row_id=None):
+        with self._db:
+            self.conn.execute(
+                "INSERT INTO ops (table_name, op, payload, created, row_id) VALUES (?, ?, ?, ?, ?)",
+                (table, op, json.dumps(payload), time.time(), row_id),
+            )
+            self.conn.commit()
+            self.metrics["enqueued"] += 1
+        self._wake.set()
+
+    # --- Reads with pending writes applied ---
+    def read_through(self, table, reader):
+        """``reader(table)`` plus every pending op for ``table``, in order."""
+        return self.read_many_through([table], lambda tables: {table: reader(table)})[table]
+
+    def read_many_through(self, tables, reader):
+        """``reader(tables)`` ({table: values}) with each table's pending ops applied.
+
+        Pending ops are listed before the read, so an op written meanwhile
+        is either in the read or still listed; appends already in the read
+        (same row ID) are not added again and deletes by ID are harmless
+        to repeat. Only ops queued by row number, from before rows had IDs,
+        need the worker held back from their table during the read.
+        """
+        pending = {table: self._pending(table) for table in tables}
+        legacy = [t for t, ops in pending.items() if any(op == "delete" and not isinstance(p, dict) for op, p in ops)]
+        with ExitStack() as stack:
+            for table in legacy:
+                stack.enter_context(self.gate(table))
+                pending[table] = self._pending(table)
+            fetched = reader(tables)
+        for table, ops in pending.items():
+            self._apply(fetched[table], ops)
+        return fetched
+
+    def _apply(self, values, ops):
+        col = values[0].index(ROW_ID) if values and ROW_ID in values[0] else None
+        seen = {row[col] for row in values[1:] if col < len(row)} if col is not None else set()
+        for op, payload in ops:
+            if op == "append":
+                if col is None or col >= len(payload) or payload[col] not in seen:
+                    values.append(payload)
+            elif isinstance(payload, dict):
+                if col is not None:
+                    values[1:] = [row for row in values[1:] if col >= len(row) or row[col] not in payload]
+            else:
+                # Queued before rows had IDs: plain row numbers
+                for row_index in sorted(payload, reverse=True):
+                    if row_index - 1 < len(values):
+                        del values[row_index - 1]
+        return values
+
+    def when_settled(self, table, fn):
+        """``fn()`` with the worker held back from ``table``; None while it has pending writes."""
+        with self._state:
+            if table in self._in_flight:
+                return None
+            self._gates[table] += 1
+        try:
+            if self._pending(table):
+                return None
+            return fn()
+        finally:
+            self._release(table)
+
+    def _pending(self, table):
+        with self._db:
+            rows = self.conn.execute(
+                "SELECT op, payload FROM ops WHERE table_name = ? AND failed = 0 ORDER BY id", (table,)
+            ).fetchall()
+        return [(op, json.loads(payload)) for op, payload in rows]
+
+    def drain(self, table, timeout=30.0):
+        """Wait until ``table`` has no pending writes (parked ones aside); False on timeout."""
+        end = time.monotonic() + timeout
+        self._hurry.set()
+        self._wake.set()
+        with self._state:
+            while self._pending(table):
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._state.wait(min(remaining, 0.5))
+        return True
+
+    # --- Per-table gate ---
+    @contextmanager
+    def gate(self, table):
+        """Hold the worker back from ``table``; waits for a batch already on its way there."""
+        with self._state:
+            self._gates[table] += 1
+            self._state.wait_for(lambda: table not in self._in_flight)
+        try:
+            yield
+        finally:
+            self._release(table)
+
+    def _release(self, table):
+        with self._state:
+            self._gates[table] -= 1
+            if self._gates[table] <= 0:
+                del self._gates[table]
+        self._wake.set()
+
+    # --- Worker ---
+    def _run(self):
+        while True:
+            try:
+                wait = self._flush_next()
+            except Exception as e:  # keep the worker alive whatever happens
+                self.metrics["last_error"] = repr(e)
+                wait = self.base_delay
+            if wait is None:
+                self._wake.wait()
+                self._wake.clear()
+            elif wait > 0:
+                # Cut short by drain() only; other wakes would defeat the backoff
+                self._hurry.wait(wait)
+                self._hurry.clear()
+
+    def _flush_next(self):
+        """Write the next op (or run of appends) of a table that isn't gated; returns seconds to wait."""
+        with self._state, self._db:
+            gated = list(self._gates)
+            head = self.conn.execute(
+                "SELECT id, table_name, op, payload, attempts, row_id, sent FROM ops WHERE failed = 0 "
+                f"AND table_name NOT IN ({', '.join('?' * len(gated))}) ORDER BY id LIMIT 1",
+                gated,
+            ).fetchone()
+            if head is None:
+                return None
+            op_id, table, op, payload, attempts, row_id, sent = head
+            batch = [(op_id, json.loads(payload), row_id, sent)]
+            if op == "append":
+                for next_id, next_op, next_payload, next_row_id, next_sent in self.conn.execute(
+                    "SELECT id, op, payload, row_id, sent FROM ops WHERE failed = 0 AND table_name = ? AND id > ? "
+                    "ORDER BY id LIMIT 500",
+                    (table, op_id),
+                ):
+                    if next_op != "append":
+                        break
+                    batch.append((next_id, json.loads(next_payload), next_row_id, next_sent))
+            self._in_flight.add(table)
+
+        self.metrics["flush_calls"] += 1
+        try:
+            try:
+                if op == "append":
+                    self._append(table, batch)
+                else:
+                    self._delete(table, batch[0][1])
+            except StorageError as e:
+                return self._retry_later(op_id, table, attempts + 1, str(e))
+
+            with self._db:
+                self.conn.executemany("DELETE FROM ops WHERE id = ?", [(op[0],) for op in batch])
+                self.conn.commit()
+            self.metrics["flushed"] += len(batch)
+            return 0
+        finally:
+            with self._state:
+                self._in_flight.discard(table)
+                self._state.notify_all()
+
+    def _append(self, table, batch):
+        # A batch sent before may have landed though the call failed (or the
+        # process stopped before dropping it), so rows whose IDs are already
+        # in the table are left out; rows without an ID can only be resent
+        resent = {row_id for _, _, row_id, sent in batch if sent and row_id}
+        landed = self.storage.locate_rows(table, dict.fromkeys(resent)) if resent else {}
+        with self._db:
+            self.conn.executemany("UPDATE ops SET sent = 1 WHERE id = ?", [(op[0],) for op in batch])
+            self.conn.commit()
+        rows = [payload for _, payload, row_id, _ in batch if row_id not in landed]
+        if rows:
+            self.storage.append_rows(table, rows)
+
+    def _delete(self, table, payload):
+        # Rows are found by ID at flush time, so deletes made meanwhile
+        # (here or on another device) can't shift us onto the wrong row
+        if isinstance(payload, dict):
+            payload = list(self.storage.locate_rows(table, payload).values())
+        if payload:
+            self.storage.delete_rows(table, payload)
+
+    def _retry_later(self, op_id, table, attempts, error):
+        self.metrics["last_error"] = error
+        parked = attempts >= self.max_attempts
+        with self._db:
+            self.conn.execute(
+                "UPDATE ops SET failed = ?, attempts = ?, last_error = ? WHERE id = ?",
+                (int(parked), attempts, error, op_id),
+            )
+            self.conn.commit()
+        if parked:
+            self.metrics["failed"] += 1
+            if self.on_failed:
+                self.on_failed(table)
+            return 0
+        self.metrics["retries"] += 1
+        # Full jitter: anywhere between 0 and the exponential ceiling
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempts))
+        self.metrics["retry_sleep"] += delay
+        return delay
+
+    # --- Admin ---
+    def failed(self):
+        """Parked ops, oldest first, as dicts (table, op, payload, attempts, error, created)."""
+        with self._db:
+            rows = self.conn.execute(
+                "SELECT id, table_name, op, payload, attempts, last_error, created FROM ops WHERE failed = 1 ORDER BY id"
+            ).fetchall()
+        return [
+            {"id": op_id, "table": table, "op": op, "payload": json.loads(payload),
+             "attempts": attempts, "error": error, "created": created}
+            for op_id, table, op, payload, attempts, error, created in rows
+        ]
+
+    def retry_failed(self, table=None):
+        """Queue parked ops again: every table's, or only ``table``'s."""
+        with self._db:
+            self.conn.execute(
+                "UPDATE ops SET failed = 0, attempts = 0 WHERE failed = 1 AND (? IS NULL OR table_name = ?)",
+                (table, table),
+            )
+            self.conn.commit()
+        self._wake.set()
+
+    def stats(self):
+        with self._db:
+            depth, oldest = self.conn.execute(
+                "SELECT COUNT(*), MIN(created) FROM ops WHERE failed = 0"
+            ).fetchone()
+            failed = self.conn.execute("SELECT COUNT(*) FROM ops WHERE failed = 1").fetchone()[0]
+        return dict(
+            self.metrics,
+            depth=depth,
+            parked=failed,
+            oldest_age=round(time.time() - oldest, 1) if oldest else 0.0,
+        )